@@ -161,6 +161,15 @@ pipeline = lens_sie__source_inversion.make_pipeline(
     setup=setup, phase_folders=["beginner", dataset_label, dataset_name]
 )
 
+# When many jobs start at once, each compiles PyAutoLens's numba functions on its first likelihood evaluation, unless
+# they are loaded from numba's on-disk cache ('[numba] cache = True' in 'config/general.ini'). Instrumenting the
+# pipeline outputs the compile time of every numba function and whether it was a cache hit or miss to the file
+# 'numba.json' in every phase's output folder.
+
+from profiling import numba_util
+
+numba_util.instrument_pipeline(pipeline=pipeline)
+
 pipeline.run(dataset=imaging, mask=mask)
 
 ### BATCH SCRIPTS ###
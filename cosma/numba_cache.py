@@ -0,0 +1,159 @@
+import inspect
+import os
+
+# PyAutoLens uses numba to JIT compile its most expensive functions (light profiles, mass-profile deflections, the
+# PSF convolver, the mapper, the inversion utilities and the Fourier transformer). With 'cache=True' in the [numba]
+# section of 'config/general.ini', every compiled function is written to an on-disk cache so that later runs load it
+# instead of compiling it again.
+
+# On Cosma, every task of a batch starts with an empty cache, so all 16 tasks on a node compile the same functions at
+# the same time and write them to the same shared filesystem. This script builds the cache once, before the batch
+# runs, by calling every jitted code path our pipelines use on tiny synthetic data. Every task then starts hot.
+
+# The cache is written to the folder given by the environment variable 'NUMBA_CACHE_DIR', which must be exported to
+# the same folder in the batch script (see 'cosma/batch_cosma/example'). If it is not set, the folder below is used.
+
+cosma_username = "cosma_username"
+
+numba_cache_path = os.environ.setdefault(
+    "NUMBA_CACHE_DIR", "/cosma7/data/dp004/{}/numba_cache".format(cosma_username)
+)
+
+# Numba reads 'NUMBA_CACHE_DIR' when it is imported, so it must be set before autofit and autolens are imported.
+
+import autofit as af
+
+workspace_path = "{}/../".format(os.path.dirname(os.path.realpath(__file__)))
+config_path = workspace_path + "config"
+
+af.conf.instance = af.conf.Config(
+    config_path=config_path, output_path=workspace_path + "output"
+)
+
+import autolens as al
+
+from profiling import benchmark_util, numba_util
+from profiling.benchmark import benchmark_modules_from_dataset_label
+
+# The numba cache is specific to the CPU it is compiled on, so this script should be run on the same type of node as
+# the batch (e.g. as the first command of the batch script) and rerun whenever PyAutoLens is upgraded.
+
+# The benchmark stages in 'profiling/imaging' and 'profiling/interferometer' are run once at the points below, which
+# are chosen to be as small as possible because the compiled functions only depend on the types of their inputs, not
+# their sizes. Parameters which a benchmark's 'stages' function does not take are ignored. The imaging benchmarks use
+# the 'lsst' dataset, which is made by 'profiling/imaging/simulator/data_maker.py'.
+
+warm_points = dict(
+    imaging=dict(
+        data_resolution="lsst",
+        sub_size=2,
+        radius=1.0,
+        psf_shape_2d=(3, 3),
+        pixelization_shape_2d=(5, 5),
+        pixels=25,
+    ),
+    interferometer=dict(total_visibilities=10),
+)
+
+# The benchmarks only use a subset of the light and mass profiles, so every profile used by the pipelines is also
+# evaluated on a tiny grid.
+
+light_profiles = [
+    al.lp.EllipticalSersic(),
+    al.lp.SphericalSersic(),
+    al.lp.EllipticalExponential(),
+    al.lp.SphericalExponential(),
+    al.lp.EllipticalDevVaucouleurs(),
+    al.lp.EllipticalGaussian(),
+    al.lmp.EllipticalSersic(),
+    al.lmp.EllipticalExponential(),
+]
+
+mass_profiles = [
+    al.mp.EllipticalIsothermal(),
+    al.mp.SphericalIsothermal(),
+    al.mp.EllipticalPowerLaw(),
+    al.mp.EllipticalBrokenPowerLaw(),
+    al.mp.ExternalShear(),
+    al.mp.SphericalNFW(),
+    al.mp.SphericalTruncatedNFWMassToConcentration(),
+    al.lmp.EllipticalSersic(),
+    al.lmp.EllipticalExponential(),
+]
+
+
+def profile_stages(benchmark):
+
+    grid = al.grid.uniform(shape_2d=(5, 5), pixel_scales=0.2, sub_size=2)
+
+    for light_profile in light_profiles:
+        benchmark.stage(
+            name=light_profile.__class__.__name__ + "_profile_image",
+            func=lambda light_profile=light_profile: light_profile.profile_image_from_grid(
+                grid=grid
+            ),
+        )
+
+    for mass_profile in mass_profiles:
+        benchmark.stage(
+            name=mass_profile.__class__.__name__ + "_deflections",
+            func=lambda mass_profile=mass_profile: mass_profile.deflections_from_grid(
+                grid=grid
+            ),
+        )
+
+
+def point_from_stages(stages, point):
+    """Remove the parameters of a point which a benchmark's 'stages' function does not take."""
+
+    parameters = inspect.signature(stages).parameters
+
+    return {name: value for name, value in point.items() if name in parameters}
+
+
+if __name__ == "__main__":
+
+    print("Building the numba cache in " + numba_cache_path + "\n")
+
+    instrumentation = numba_util.NumbaInstrumentation()
+
+    with instrumentation:
+
+        profile_stages(
+            benchmark=benchmark_util.Benchmark(
+                name="profiles",
+                repeats=1,
+                warmup=0,
+                track_memory=False,
+                verbose=False,
+            )
+        )
+
+        for dataset_label, point in warm_points.items():
+
+            for module in benchmark_modules_from_dataset_label(
+                dataset_label=dataset_label
+            ):
+
+                print("Running " + module.__name__)
+
+                module.stages(
+                    benchmark=benchmark_util.Benchmark(
+                        name=module.__name__.split(".")[-1],
+                        repeats=1,
+                        warmup=0,
+                        track_memory=False,
+                        verbose=False,
+                    ),
+                    **point_from_stages(stages=module.stages, point=point)
+                )
+
+    instrumentation.output_to_json(
+        file_path=os.path.join(numba_cache_path, "numba_cache.json")
+    )
+
+    print()
+    print("Functions compiled = " + str(len(instrumentation.compilations)))
+    print("Cache hits = " + str(sum(instrumentation.cache_hits.values())))
+    print("Cache misses = " + str(sum(instrumentation.cache_misses.values())))
+    print("Compile time = {:.1f}s".format(instrumentation.total_compile_time))
@@ -1,6 +1,8 @@
 import autofit as af
 import autolens as al
 
+from preprocessing import uv_binning
+
 # In this pipeline, we'll perform a parametric source analysis which fits an image with a lens mass model and
 # source galaxy.
 
@@ -14,7 +16,8 @@ import autolens as al
 # Source Light: EllipticalSersic
 # Previous Pipelines: None
 # Prior Passing: None
-# Notes: None
+# Notes: If uv_bin_size is input, the visibilities are binned onto a uv-grid with cells of this size (in wavelengths)
+#        for this phase only (see 'preprocessing/uv_binning.py'), whereas later pipelines fit the full dataset.
 
 
 def make_pipeline(
@@ -26,6 +29,7 @@ def make_pipeline(
     positions_threshold=None,
     sub_size=2,
     evidence_tolerance=100.0,
+    uv_bin_size=None,
 ):
 
     ### SETUP PIPELINE & PHASE NAMES, TAGS AND PATHS ###
@@ -58,7 +62,8 @@ def make_pipeline(
     # In phase 1, we fit the lens galaxy's mass and source galaxy.
 
     phase1 = al.PhaseInterferometer(
-        phase_name="phase_1__lens_sie__source_sersic",
+        phase_name="phase_1__lens_sie__source_sersic"
+        + uv_binning.tag_from_uv_bin_size(uv_bin_size=uv_bin_size),
         phase_folders=phase_folders,
         real_space_mask=real_space_mask,
         galaxies=dict(
@@ -79,4 +84,10 @@ def make_pipeline(
     phase1.optimizer.sampling_efficiency = 0.2
     phase1.optimizer.evidence_tolerance = evidence_tolerance
 
+    # The parametric source only sets the initial lens model of the later pipelines, so it can fit the binned dataset.
+
+    phase1 = uv_binning.phase_with_binned_visibilities(
+        phase=phase1, uv_bin_size=uv_bin_size
+    )
+
     return al.PipelineDataset(pipeline_name, phase1)
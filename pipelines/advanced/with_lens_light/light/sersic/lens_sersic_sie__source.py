@@ -1,6 +1,8 @@
 import autofit as af
 import autolens as al
 
+from tools.tracing import tracing_util
+
 # In this pipeline, we fit the lens light of a strong lens using a single Sersic model.
 
 # The mass model and source are initialized using an already run 'source' pipeline. Although the lens light was
@@ -161,4 +163,8 @@ def make_pipeline(
         include_background_noise=setup.general.hyper_background_noise,
     )
 
+    # The lens mass is fixed in this phase, so its traced grids are cached after the first likelihood evaluation.
+
+    phase1 = tracing_util.phase_with_traced_grid_cache(phase=phase1)
+
     return al.PipelineDataset(pipeline_name, phase1)
@@ -1,6 +1,8 @@
 import autofit as af
 import autolens as al
 
+from tools.interpolation import interpolation_util
+
 ### PIPELINE DESCRIPTION ###
 
 # In this pipeline, we'll demonstrate deflection angle interpolation - which computes the deflection angles of a mass
@@ -19,6 +21,11 @@ import autolens as al
 
 # Phase names are tagged, ensuring phases using different interpolation grids have a unique output path.
 
+# If a 'max_deflection_error' is input, phase 2 instead uses an adaptive interpolation grid, which is refined around the
+# lens model of phase 1 only where its deflection angles curve (near the lens centre and critical curves) until they
+# are interpolated to within this error (in arc-seconds). See 'interpolation_util.py' and 'precision_adaptive.py' in
+# the 'autolens_workspace/tools/interpolation' folder.
+
 # We'll perform a basic analysis which fits a lensed source galaxy using a parametric light profile where
 # the lens's light is omitted. We will use a cored elliptical power-law mass profile, instead of an isothermal ellipsoid,
 # as this profile requires expensive numerica integration.
@@ -41,10 +48,12 @@ import autolens as al
 # Lens Mass: EllipticalIsothermal + ExternalShear
 # Source Light: EllipticalSersic
 # Prior Passing: Lens mass (model -> phase 1), source light (model -> phase 1)
-# Notes: Uses an interpolation pixel scale of 0.05"
+# Notes: Uses an interpolation pixel scale of 0.05", or an adaptive interpolation grid if max_deflection_error is input
 
 
-def make_pipeline(phase_folders=None, pixel_scale_interpolation_grid=0.05):
+def make_pipeline(
+    phase_folders=None, pixel_scale_interpolation_grid=0.05, max_deflection_error=None
+):
 
     ### SETUP PIPELINE & PHASE NAMES, TAGS AND PATHS ###
 
@@ -100,7 +109,10 @@ def make_pipeline(phase_folders=None, pixel_scale_interpolation_grid=0.05):
     #    mass profile.
 
     phase2 = al.PhaseImaging(
-        phase_name="phase_2__x2_source",
+        phase_name="phase_2__x2_source"
+        + interpolation_util.tag_from_max_deflection_error(
+            max_deflection_error=max_deflection_error
+        ),
         phase_folders=phase_folders,
         galaxies=dict(
             lens=al.GalaxyModel(
@@ -119,4 +131,10 @@ def make_pipeline(phase_folders=None, pixel_scale_interpolation_grid=0.05):
     phase2.optimizer.n_live_points = 50
     phase2.optimizer.sampling_efficiency = 0.3
 
+    # The adaptive interpolation grid is refined for the most likely lens mass of phase 1.
+
+    phase2 = interpolation_util.phase_with_adaptive_interpolation(
+        phase=phase2, max_deflection_error=max_deflection_error
+    )
+
     return al.PipelineDataset(pipeline_name, phase1, phase2)
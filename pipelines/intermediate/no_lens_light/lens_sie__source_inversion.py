@@ -1,6 +1,9 @@
 import autofit as af
 import autolens as al
 
+from tools.inversion import inversion_util
+from tools.tracing import tracing_util
+
 ### HYPER PIPELINE INTERFACE ###
 
 # This pipeline uses PyAutoLens's hyper-features and descriptions of these features is given below. Hyper-mode itself
@@ -262,6 +265,15 @@ def make_pipeline(
         inversion=False,
     )
 
+    # The lens mass is fixed in this phase, so its traced grids are cached after the first likelihood evaluation.
+
+    phase2 = tracing_util.phase_with_traced_grid_cache(phase=phase2)
+
+    # The lens mass is fixed and only the pixelization and regularization change, so every inversion whose pixelization
+    # repeats an earlier pixelization is recomputed for its new regularization coefficient in O(N^2).
+
+    phase2 = inversion_util.phase_with_fixed_geometry_inversion(phase=phase2)
+
     ### PHASE 3 ###
 
     # In phase 3, we fit the lens's mass and source galaxy using the magnification inversion, where we:
@@ -353,6 +365,15 @@ def make_pipeline(
         inversion=False,
     )
 
+    # The lens mass is fixed in this phase, so its traced grids are cached after the first likelihood evaluation.
+
+    phase4 = tracing_util.phase_with_traced_grid_cache(phase=phase4)
+
+    # The lens mass is fixed and only the pixelization and regularization change, so every inversion whose pixelization
+    # repeats an earlier pixelization is recomputed for its new regularization coefficient in O(N^2).
+
+    phase4 = inversion_util.phase_with_fixed_geometry_inversion(phase=phase4)
+
     ### PHASE 5 ###
 
     # In phase 5, we fit the lens's mass using the input pipeline pixelization & regularization, where we:
@@ -398,4 +419,8 @@ def make_pipeline(
         include_background_noise=setup.general.hyper_background_noise,
     )
 
+    # The 'inversion' hyper phase fixes the lens mass and fits only the pixelization and regularization.
+
+    phase5 = inversion_util.phase_with_fixed_geometry_inversion(phase=phase5)
+
     return al.PipelineDataset(pipeline_name, phase1, phase2, phase3, phase4, phase5)
@@ -0,0 +1,270 @@
+import numpy as np
+
+import autoarray as aa
+
+from tools import phase_util
+
+# An interferometer dataset can contain millions of visibilities, and the run-time of every likelihood evaluation of
+# an interferometer phase scales with their number. Many of these visibilities sample almost the same point in the
+# uv-plane (e.g. neighbouring integrations of the same baseline), so they carry almost the same information about the
+# lens model.
+
+# This module compresses an interferometer dataset by averaging its visibilities in bins, either cells of a regular
+# uv-grid or baseline-time bins, weighting every visibility by its inverse variance. The binned noise-map is
+# propagated so that the chi-squared of a model which is constant over every bin is unchanged.
+
+# Early parametric phases can then fit the binned dataset, which has orders of magnitude fewer visibilities, whilst the
+# final phases of a pipeline fit the full dataset. This is the interferometer analogue of the 'bin_up_factor' used by
+# imaging phases.
+
+
+def uv_bin_size_from_real_space_radius(real_space_radius, max_phase_error=0.1):
+    """Compute the size (in wavelengths) of the uv-grid cells for which the phase of a visibility of any source within
+    *real_space_radius* arc-seconds of the phase centre changes by at most *max_phase_error* radians within a cell.
+
+    Averaging visibilities in a cell assumes the model visibilities are constant over it, so this sets how much
+    smaller the cells must be for larger real-space masks.
+
+    Parameters
+    -----------
+    real_space_radius : float
+        The radius (arc-seconds) of the real-space mask the binned dataset is fitted using.
+    max_phase_error : float
+        The maximum change in the phase of a visibility (radians) over a uv-grid cell.
+    """
+    real_space_radius_radians = np.radians(real_space_radius / 3600.0)
+
+    return max_phase_error / (2.0 * np.pi * real_space_radius_radians)
+
+
+def uv_wavelengths_and_visibilities_folded_to_half_plane(uv_wavelengths, visibilities):
+    """Fold every visibility onto the half of the uv-plane with v >= 0, using the Hermitian symmetry of the visibilities
+    of a real image, V(-u, -v) = V*(u, v), so that the two visibilities of a baseline fall in the same bin."""
+
+    uv_wavelengths = np.array(uv_wavelengths, dtype="float64")
+    visibilities = np.array(visibilities, dtype="float64")
+
+    flip = (uv_wavelengths[:, 1] < 0.0) | (
+        (uv_wavelengths[:, 1] == 0.0) & (uv_wavelengths[:, 0] < 0.0)
+    )
+
+    uv_wavelengths[flip] *= -1.0
+    visibilities[flip, 1] *= -1.0
+
+    return uv_wavelengths, visibilities
+
+
+def bin_indexes_from_uv_wavelengths(uv_wavelengths, uv_bin_size):
+    """Compute the index of the uv-grid cell of size *uv_bin_size* (wavelengths) every visibility is in.
+
+    Only cells which contain a visibility are given an index, so the indexes run from 0 to the number of occupied
+    cells minus 1."""
+
+    cells = np.floor(np.asarray(uv_wavelengths) / uv_bin_size).astype("int64")
+
+    return np.unique(cells, axis=0, return_inverse=True)[1].reshape(-1)
+
+
+def bin_indexes_from_baselines_and_times(baselines, times, time_bin_size):
+    """Compute the index of the baseline-time bin every visibility is in, where the visibilities of every baseline are
+    averaged over intervals of *time_bin_size* (in the units of *times*, e.g. seconds).
+
+    Averaging in time along a baseline keeps the visibilities of different baselines and spectral windows separate,
+    which is the standard way interferometer data is averaged (e.g. the 'timebin' of CASA's split task). The baseline
+    of every visibility is not stored in an *al.interferometer* dataset, so must be loaded from the measurement set.
+
+    Parameters
+    -----------
+    baselines : ndarray
+        The integer index of the baseline (or baseline and spectral window) of every visibility.
+    times : ndarray
+        The time every visibility was observed at.
+    time_bin_size : float
+        The length of the time interval the visibilities of every baseline are averaged over.
+    """
+    time_bins = np.floor(
+        (np.asarray(times) - np.min(times)) / time_bin_size
+    ).astype("int64")
+
+    baselines_and_time_bins = np.stack(
+        [np.asarray(baselines, dtype="int64"), time_bins], axis=1
+    )
+
+    return np.unique(baselines_and_time_bins, axis=0, return_inverse=True)[
+        1
+    ].reshape(-1)
+
+
+def binned_interferometer_from_bin_indexes(
+    interferometer, bin_indexes, visibilities_mask=None
+):
+    """Bin an interferometer dataset, by averaging the visibilities which share a bin index weighted by their inverse
+    variances, w = 1 / sigma^2.
+
+    The real and imaginary components are binned separately:
+
+        V_bin = sum(w V) / sum(w)
+        sigma_bin = 1 / sqrt(sum(w))
+
+    which gives the binned visibilities the noise of the inverse-variance weighted mean. The uv-wavelengths of every
+    bin are the mean of its visibilities' uv-wavelengths, weighted by the sum of their real and imaginary weights.
+
+    Parameters
+    -----------
+    interferometer : al.interferometer
+        The dataset which is binned.
+    bin_indexes : ndarray
+        The bin of every visibility, which run from 0 to the number of bins minus 1 (see
+        *bin_indexes_from_uv_wavelengths* and *bin_indexes_from_baselines_and_times*).
+    visibilities_mask : ndarray or None
+        The (total_visibilities, 2) visibilities mask of the phase, where visibilities with either component masked
+        are removed before binning.
+    """
+
+    uv_wavelengths = np.asarray(interferometer.uv_wavelengths)
+    visibilities = np.asarray(interferometer.visibilities)
+    noise_map = np.asarray(interferometer.noise_map)
+    bin_indexes = np.asarray(bin_indexes)
+
+    if visibilities_mask is not None:
+        unmasked = ~np.any(np.asarray(visibilities_mask), axis=1)
+
+        uv_wavelengths = uv_wavelengths[unmasked]
+        visibilities = visibilities[unmasked]
+        noise_map = noise_map[unmasked]
+        bin_indexes = np.unique(bin_indexes[unmasked], return_inverse=True)[
+            1
+        ].reshape(-1)
+
+    total_bins = np.max(bin_indexes) + 1
+
+    weights = 1.0 / noise_map ** 2.0
+
+    weight_sums = np.stack(
+        [
+            np.bincount(
+                bin_indexes, weights=weights[:, component], minlength=total_bins
+            )
+            for component in (0, 1)
+        ],
+        axis=1,
+    )
+
+    binned_visibilities = (
+        np.stack(
+            [
+                np.bincount(
+                    bin_indexes,
+                    weights=weights[:, component] * visibilities[:, component],
+                    minlength=total_bins,
+                )
+                for component in (0, 1)
+            ],
+            axis=1,
+        )
+        / weight_sums
+    )
+
+    binned_noise_map = 1.0 / np.sqrt(weight_sums)
+
+    uv_weights = weights[:, 0] + weights[:, 1]
+    uv_weight_sums = weight_sums[:, 0] + weight_sums[:, 1]
+
+    binned_uv_wavelengths = (
+        np.stack(
+            [
+                np.bincount(
+                    bin_indexes,
+                    weights=uv_weights * uv_wavelengths[:, component],
+                    minlength=total_bins,
+                )
+                for component in (0, 1)
+            ],
+            axis=1,
+        )
+        / uv_weight_sums[:, None]
+    )
+
+    return aa.interferometer.manual(
+        visibilities=aa.visibilities.manual_1d(visibilities=binned_visibilities),
+        noise_map=aa.visibilities.manual_1d(visibilities=binned_noise_map),
+        uv_wavelengths=binned_uv_wavelengths,
+        primary_beam=interferometer.primary_beam,
+    )
+
+
+def binned_interferometer_from_uv_bin_size(
+    interferometer, uv_bin_size, visibilities_mask=None, fold_hermitian=True
+):
+    """Bin an interferometer dataset onto a regular uv-grid whose cells are *uv_bin_size* wavelengths across (see
+    *binned_interferometer_from_bin_indexes*).
+
+    If *fold_hermitian* is True, visibilities are first folded onto the half of the uv-plane with v >= 0, so that
+    visibilities at (u, v) and (-u, -v) are binned together.
+    """
+
+    if fold_hermitian:
+        uv_wavelengths, visibilities = uv_wavelengths_and_visibilities_folded_to_half_plane(
+            uv_wavelengths=interferometer.uv_wavelengths,
+            visibilities=interferometer.visibilities,
+        )
+
+        interferometer = aa.interferometer.manual(
+            visibilities=aa.visibilities.manual_1d(visibilities=visibilities),
+            noise_map=interferometer.noise_map,
+            uv_wavelengths=uv_wavelengths,
+            primary_beam=interferometer.primary_beam,
+        )
+
+    return binned_interferometer_from_bin_indexes(
+        interferometer=interferometer,
+        bin_indexes=bin_indexes_from_uv_wavelengths(
+            uv_wavelengths=interferometer.uv_wavelengths, uv_bin_size=uv_bin_size
+        ),
+        visibilities_mask=visibilities_mask,
+    )
+
+
+def tag_from_uv_bin_size(uv_bin_size):
+    """Tag a phase name with the uv-grid cell size its dataset is binned with, e.g. '__uv_bin_5000'. If the dataset is
+    not binned the tag is an empty string."""
+
+    if uv_bin_size is None:
+        return ""
+
+    return "__uv_bin_{:.0f}".format(uv_bin_size)
+
+
+def phase_with_binned_visibilities(phase, uv_bin_size, fold_hermitian=True):
+    """Make a phase fit its interferometer dataset binned onto a uv-grid with cells *uv_bin_size* wavelengths across,
+    by binning the dataset (and removing the visibilities its mask removes) when the phase is run.
+
+    All other phases of the pipeline, for example the final phases which are fitted to the full dataset, are
+    unchanged. If *uv_bin_size* is None, the phase is returned unchanged. For a phase extended with hyper phases, the
+    phase it extends fits the binned dataset and the extended phase is returned.
+    """
+
+    if uv_bin_size is None:
+        return phase
+
+    def make_analysis_wrapper(make_analysis):
+        def make_analysis_with_binned_visibilities(dataset, mask, *args, **kwargs):
+
+            binned_dataset = binned_interferometer_from_uv_bin_size(
+                interferometer=dataset,
+                uv_bin_size=uv_bin_size,
+                visibilities_mask=mask,
+                fold_hermitian=fold_hermitian,
+            )
+
+            binned_mask = np.full(
+                fill_value=False, shape=binned_dataset.visibilities.shape
+            )
+
+            return make_analysis(binned_dataset, binned_mask, *args, **kwargs)
+
+        return make_analysis_with_binned_visibilities
+
+    return phase_util.phase_with_method_wrapper(
+        phase=phase, method_name="make_analysis", method_wrapper=make_analysis_wrapper
+    )
@@ -0,0 +1,134 @@
+import importlib
+import os
+import sys
+
+from profiling import benchmark_util
+
+# Welcome to the PyAutoLens benchmark runner. This script discovers every benchmark in the profiling folder of the
+# dataset type chosen below (e.g. 'profiling/imaging'), runs all of its stages and outputs the run-time of every stage
+# to a .json file.
+
+# A benchmark is any profiling script which defines:
+
+# - A list 'benchmark_points', giving the parameters the benchmark is run for (e.g. dict(data_resolution="hst")).
+# - A function 'stages(benchmark, **point)', which times every stage (e.g. the mapper, the curvature matrix) using
+#   the 'stage' method of the benchmark.
+
+# Every stage is called 'warmup' times before it is timed, so that numba JIT compilation is not included in its
+# run-time, and then timed individually 'repeats' times so that the median and inter-quartile range (IQR) of its
+# run-time can be computed.
+
+dataset_label = "imaging"  # 'imaging' or 'interferometer'
+
+repeats = 10
+warmup = 1
+
+# If 'track_memory' is True, every stage is called once more to measure the memory it allocates and the peak resident
+# set size (RSS) of the process whilst it runs, which are output with its run-times. The peak RSS of the setup stages
+# of the interferometer benchmarks (e.g. preloading the Fourier transforms) gives the memory a job needs, for choosing
+# between the cosma and cordelia queues.
+
+track_memory = True
+
+# The run-times are output to the folder 'autolens_workspace/output/profiling/dataset_label/benchmark_name', with a
+# .json file per benchmark point (e.g. 'hst.json'). The results of every benchmark are also output together to the
+# file 'autolens_workspace/output/profiling/dataset_label/results.json'.
+
+workspace_path = "{}/../".format(os.path.dirname(os.path.realpath(__file__)))
+output_path = os.path.join(workspace_path, "output", "profiling", dataset_label)
+
+# Before upgrading PyAutoLens, copy the 'results.json' file of a run somewhere safe and set 'baseline_path' to it. After
+# the upgrade, the runner compares every stage (traced grids, mapper, blurred mapping matrix, curvature matrix,
+# reconstruction, the complete fit, etc.) to this baseline and flags every stage whose median run-time slowed down by
+# more than the fractional 'tolerance' (e.g. 0.1 = 10%), exiting with an error if any did.
+
+baseline_path = None
+tolerance = 0.1
+
+
+def benchmark_modules_from_dataset_label(dataset_label):
+    """Import every profiling script of a dataset type which defines a benchmark."""
+
+    benchmarks_path = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), dataset_label
+    )
+
+    modules = []
+
+    for file_name in sorted(os.listdir(benchmarks_path)):
+
+        if not file_name.endswith(".py") or file_name.startswith("__"):
+            continue
+
+        module = importlib.import_module(
+            "profiling.{}.{}".format(dataset_label, file_name[:-3])
+        )
+
+        if hasattr(module, "stages") and hasattr(module, "benchmark_points"):
+            modules.append(module)
+
+    return modules
+
+
+if __name__ == "__main__":
+
+    print("Number of repeats = " + str(repeats))
+    print("Number of warmup calls = " + str(warmup))
+    print()
+
+    benchmark_results = []
+
+    for module in benchmark_modules_from_dataset_label(dataset_label=dataset_label):
+
+        benchmark_name = module.__name__.split(".")[-1]
+
+        for point in module.benchmark_points:
+
+            print("Benchmark " + benchmark_name + " " + str(point) + "\n")
+
+            benchmark = benchmark_util.Benchmark(
+                name=benchmark_name,
+                repeats=repeats,
+                warmup=warmup,
+                track_memory=track_memory,
+            )
+
+            module.stages(benchmark=benchmark, **point)
+
+            benchmark_util.output_benchmark_to_json(
+                benchmark=benchmark,
+                point=point,
+                file_path=os.path.join(
+                    output_path,
+                    benchmark_name,
+                    benchmark_util.tag_from_point(point=point) + ".json",
+                ),
+            )
+
+            benchmark_results.append(dict(benchmark.dict, point=point))
+
+            print()
+
+    benchmark_util.output_results_to_json(
+        benchmark_results=benchmark_results,
+        file_path=os.path.join(output_path, "results.json"),
+    )
+
+    if baseline_path is not None:
+
+        regressions = benchmark_util.regressions_from_results(
+            results={"benchmarks": benchmark_results},
+            baseline_results=benchmark_util.load_benchmark_from_json(
+                file_path=baseline_path
+            ),
+            tolerance=tolerance,
+        )
+
+        print(
+            benchmark_util.regression_summary(
+                regressions=regressions, tolerance=tolerance
+            )
+        )
+
+        if len(regressions) > 0:
+            sys.exit(1)
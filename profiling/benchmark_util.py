@@ -0,0 +1,301 @@
+import json
+import os
+
+from profiling import profiling_util
+
+
+class Benchmark:
+    def __init__(
+        self,
+        name,
+        repeats=10,
+        warmup=1,
+        clock="perf_counter",
+        disable_gc=False,
+        track_memory=True,
+        verbose=True,
+    ):
+        """Times the stages of a profiling script (e.g. tracing grids, the mapper, the curvature matrix).
+
+        Every stage is called *warmup* times before it is timed, so that numba JIT compilation and caching is not
+        included in the run-time. It is then called *repeats* times, with every call timed individually so that
+        the median and inter-quartile range of the run-time can be computed.
+
+        If memory is tracked, every stage is called one further time to measure the memory it allocates (using
+        tracemalloc) and the peak resident set size (RSS) of the process whilst it runs. This call is not timed,
+        because tracemalloc slows down the stage.
+
+        A benchmark's *metadata* records the size of the calculation it performs (e.g. the number of sub-pixels and
+        source pixels), which a sweep uses to fit how the run-time of every stage scales.
+
+        Parameters
+        ----------
+        name : str
+            The name of the benchmark, which is typically the name of the profiling script.
+        repeats : int
+            The number of timed calls of every stage.
+        warmup : int
+            The number of un-timed calls of every stage performed before it is timed.
+        clock : str or func
+            The clock every stage is timed using (see *profiling_util.Timer*).
+        disable_gc : bool
+            If True, Python's garbage collector is disabled whilst every stage is timed.
+        track_memory : bool
+            If True, the memory used by every stage is measured.
+        verbose : bool
+            If True, the result of every stage is printed as it is computed.
+        """
+        self.name = name
+        self.repeats = repeats
+        self.warmup = warmup
+        self.clock = clock
+        self.disable_gc = disable_gc
+        self.track_memory = track_memory
+        self.verbose = verbose
+        self.stages = {}
+        self.memory = {}
+        self.metadata = {}
+
+    def stage(self, name, func):
+        """Time a stage of the benchmark, returning the value returned by *func* on its final call so that it can
+        be passed to the stages that follow it.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage.
+        func : func
+            A function taking no arguments which performs the calculation the stage times.
+        """
+        timer = profiling_util.Timer(
+            name=name,
+            repeats=self.repeats,
+            warmup=self.warmup,
+            clock=self.clock,
+            disable_gc=self.disable_gc,
+            verbose=self.verbose,
+        )
+
+        self.stages[name] = timer.time(func=func)
+
+        if self.track_memory:
+
+            tracker = profiling_util.MemoryTracker(name=name, verbose=self.verbose)
+            tracker.track(func=func)
+
+            self.memory[name] = tracker.result
+
+        return self.stages[name].value
+
+    def setup(self, name, func):
+        """Perform a setup stage of the benchmark (e.g. creating a masked dataset, which preloads its Fourier
+        transforms) once, measuring its run-time and memory on the same call. This is used for stages that are too
+        slow or memory intensive to repeat, and its run-time includes the overhead of tracking its memory.
+
+        Parameters
+        ----------
+        name : str
+            The name of the setup stage.
+        func : func
+            A function taking no arguments which performs the setup, whose return value is returned.
+        """
+        timer = profiling_util.Timer(name=name, repeats=1, clock=self.clock)
+
+        if self.track_memory:
+
+            tracker = profiling_util.MemoryTracker(name=name)
+
+            with tracker:
+                self.stages[name] = timer.time(func=func)
+
+            self.memory[name] = tracker.result
+
+        else:
+
+            self.stages[name] = timer.time(func=func)
+
+        if self.verbose:
+            print(self.stages[name])
+            if self.track_memory:
+                print(self.memory[name])
+
+        return self.stages[name].value
+
+    @property
+    def peak_rss_gb(self):
+        """The highest peak RSS of the process over every stage of the benchmark."""
+
+        rss_peaks = [
+            memory.rss_peak_gb
+            for memory in self.memory.values()
+            if memory.rss_peak_gb is not None
+        ]
+
+        if len(rss_peaks) == 0:
+            return None
+
+        return max(rss_peaks)
+
+    def stage_dict(self, name):
+
+        stage_dict = self.stages[name].dict
+
+        if name in self.memory:
+            stage_dict["memory"] = self.memory[name].dict
+
+        return stage_dict
+
+    @property
+    def dict(self):
+        return {
+            "benchmark": self.name,
+            "repeats": self.repeats,
+            "warmup": self.warmup,
+            "peak_rss_gb": self.peak_rss_gb,
+            "metadata": self.metadata,
+            "stages": {name: self.stage_dict(name=name) for name in self.stages},
+        }
+
+
+def tag_from_point(point):
+    """Tag a benchmark point (e.g. dict(data_resolution="hst", psf_shape_2d=(11, 11)) so it can be used as a file
+    name (e.g. 'hst__11x11')."""
+
+    def tag_from_value(value):
+        if isinstance(value, (tuple, list)):
+            return "x".join(str(entry) for entry in value)
+        return str(value)
+
+    return "__".join(tag_from_value(value=value) for value in point.values())
+
+
+def output_benchmark_to_json(benchmark, point, file_path):
+    """Output the stage run-times of a benchmark at one benchmark point to a .json file.
+
+    Parameters
+    ----------
+    benchmark : Benchmark
+        The benchmark whose stage run-times are output.
+    point : dict
+        The parameters the benchmark was run using (e.g. dict(data_resolution="hst")).
+    file_path : str
+        The path the .json file is output to.
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    results = benchmark.dict
+    results["point"] = point
+
+    with open(file_path, "w") as f:
+        json.dump(results, f, indent=4)
+
+
+def load_benchmark_from_json(file_path):
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+def output_results_to_json(benchmark_results, file_path):
+    """Output the results of every benchmark run by the benchmark runner to a single .json file, which can be used as
+    the baseline a later run is compared to.
+
+    Parameters
+    ----------
+    benchmark_results : [dict]
+        The dictionary of every benchmark (see *Benchmark.dict*), including the benchmark point it was run at.
+    file_path : str
+        The path the .json file is output to.
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    with open(file_path, "w") as f:
+        json.dump({"benchmarks": benchmark_results}, f, indent=4)
+
+
+def stage_medians_from_results(results):
+    """Map every (benchmark, benchmark point, stage) of a results file to the median run-time of that stage."""
+
+    stage_medians = {}
+
+    for benchmark in results["benchmarks"]:
+
+        tag = tag_from_point(point=benchmark["point"])
+
+        for name, stage in benchmark["stages"].items():
+            stage_medians[(benchmark["benchmark"], tag, name)] = stage["median"]
+
+    return stage_medians
+
+
+def regressions_from_results(results, baseline_results, tolerance=0.1):
+    """Compare the stage run-times of a benchmark run to a baseline run, returning every stage whose median
+    run-time has slowed down by more than a fractional tolerance.
+
+    Stages which are not in both runs (e.g. because a new stage was added to a profiling script) are not compared.
+
+    Parameters
+    ----------
+    results : dict
+        The results of the benchmark run, as loaded from the runner's .json file.
+    baseline_results : dict
+        The results of the baseline run the benchmark run is compared to.
+    tolerance : float
+        The fractional slow down above which a stage is flagged (e.g. 0.1 flags stages more than 10% slower).
+    """
+
+    medians = stage_medians_from_results(results=results)
+    baseline_medians = stage_medians_from_results(results=baseline_results)
+
+    regressions = []
+
+    for key, median in medians.items():
+
+        if key not in baseline_medians:
+            continue
+
+        baseline_median = baseline_medians[key]
+
+        if baseline_median <= 0.0:
+            continue
+
+        slowdown = median / baseline_median - 1.0
+
+        if slowdown > tolerance:
+            regressions.append(
+                {
+                    "benchmark": key[0],
+                    "point": key[1],
+                    "stage": key[2],
+                    "median": median,
+                    "baseline_median": baseline_median,
+                    "slowdown": slowdown,
+                }
+            )
+
+    return regressions
+
+
+def regression_summary(regressions, tolerance):
+
+    if len(regressions) == 0:
+        return "No stage slowed down by more than {:.0f}%.".format(100.0 * tolerance)
+
+    lines = [
+        "{} stage(s) slowed down by more than {:.0f}%:".format(
+            len(regressions), 100.0 * tolerance
+        )
+    ]
+
+    for regression in regressions:
+        lines.append(
+            "    {} [{}] {}: {:.6f}s -> {:.6f}s (+{:.1f}%)".format(
+                regression["benchmark"],
+                regression["point"],
+                regression["stage"],
+                regression["baseline_median"],
+                regression["median"],
+                100.0 * regression["slowdown"],
+            )
+        )
+
+    return "\n".join(lines)
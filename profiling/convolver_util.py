@@ -0,0 +1,347 @@
+import numba
+import numpy as np
+import scipy.fft
+from scipy import sparse
+
+from autoarray import decorator_util
+
+from profiling import inversion_util
+from profiling import transformer_util
+
+# The real-space convolver of PyAutoLens blurs every image pixel into the pixels of its PSF frame, so its cost grows with
+# the area of the PSF. Convolving via FFTs instead costs the same for every PSF shape, so for large PSFs it is faster.
+
+# The crossover is set by the constants below, in units of the cost of one real-space multiply-add. The FFT convolution
+# of one image costs 'fft_cost_constant' per pixel of the FFT grid per factor of log2(area), and the real-space
+# convolution of a mapping matrix also reads every entry of the dense matrix at a cost of 'dense_entry_cost'. They were
+# measured on a single core, where model images are faster via FFTs from PSFs of around 11 x 11 pixels, but mapping
+# matrices, whose columns only have a few non-zero values, only for PSFs over 81 x 81 pixels. The crossover is only
+# approximate, so run 'profiling/funcs/imaging/convolution_via_fft.py' to measure it for the PSF and mask of a dataset.
+
+fft_cost_constant = 0.5
+dense_entry_cost = 2.0
+
+convolver_backends = ["auto", "fft", "real_space"]
+
+
+def fft_shape_from_shape_and_kernel_shape(shape_2d, kernel_shape_2d):
+    """The shape of the FFT grid used to convolve a region of *shape_2d* pixels with a kernel without wrapping around
+    its edges, padded to a size whose FFT is fast."""
+
+    return tuple(
+        scipy.fft.next_fast_len(shape + kernel_shape - 1, real=True)
+        for shape, kernel_shape in zip(shape_2d, kernel_shape_2d)
+    )
+
+
+def fft_operations_from_fft_shape(fft_shape_2d):
+    """The approximate cost of convolving one array via an FFT grid of *fft_shape_2d*, in units of real-space
+    multiply-adds."""
+
+    fft_area = fft_shape_2d[0] * fft_shape_2d[1]
+
+    return fft_cost_constant * fft_area * np.log2(fft_area)
+
+
+class ConvolverFFT(object):
+    def __init__(self, convolver, backend="auto", columns_per_chunk=64):
+        """Convolve model images and mapping matrices with the PSF of a convolver via FFTs, giving the same result as
+        the real-space convolver.
+
+        The pixels of the mask (and its blurring region) are only a small region of the image, so the FFTs are
+        performed on the bounding box of the mask, padded by the PSF. The columns of a mapping matrix are scattered
+        into a stack of these boxes and convolved by one multi-column FFT, *columns_per_chunk* columns at a time to
+        bound the memory used.
+
+        If *backend* is 'auto', every convolution uses whichever of the FFT and real-space convolver is estimated to be
+        faster, where the real-space convolver costs one multiply-add per non-zero value per PSF pixel and the FFT
+        costs *fft_operations_from_fft_shape* per convolved image (see the constants at the top of this module). The
+        backend can be forced to 'fft' or 'real_space'.
+
+        Parameters
+        -----------
+        convolver : aa.convolver
+            The real-space convolver of a masked imaging dataset, whose mask, blurring mask and PSF are used.
+        backend : str
+            The convolver used, 'auto', 'fft' or 'real_space'.
+        columns_per_chunk : int
+            The number of mapping matrix columns convolved by each multi-column FFT.
+        """
+
+        if backend not in convolver_backends:
+            raise ValueError(
+                "The convolver backend must be one of {}, not {}".format(
+                    convolver_backends, backend
+                )
+            )
+
+        self.convolver = convolver
+        self.backend = backend
+        self.columns_per_chunk = columns_per_chunk
+
+        kernel = np.asarray(convolver.kernel.in_2d)
+
+        self.kernel_shape_2d = kernel.shape
+        self.kernel_area = kernel.shape[0] * kernel.shape[1]
+
+        mask = np.asarray(convolver.mask)
+
+        self.mask_coordinates = np.argwhere(~mask)
+
+        if convolver.blurring_mask is not None:
+            self.blurring_coordinates = np.argwhere(
+                ~np.asarray(convolver.blurring_mask)
+            )
+        else:
+            self.blurring_coordinates = np.zeros((0, 2), dtype="int")
+
+        coordinates = np.concatenate([self.mask_coordinates, self.blurring_coordinates])
+
+        self.box_origin = np.min(coordinates, axis=0)
+        self.box_shape_2d = tuple(np.max(coordinates, axis=0) - self.box_origin + 1)
+
+        self.fft_shape_2d = fft_shape_from_shape_and_kernel_shape(
+            shape_2d=self.box_shape_2d, kernel_shape_2d=self.kernel_shape_2d
+        )
+
+        self.kernel_fft = scipy.fft.rfft2(kernel, s=self.fft_shape_2d)
+
+        # The convolution of the box is offset by half the kernel in the FFT grid, so the masked pixels are read from
+        # these indexes.
+
+        half = np.array(self.kernel_shape_2d) // 2
+
+        self.mask_box_indexes = tuple((self.mask_coordinates - self.box_origin).T)
+        self.blurring_box_indexes = tuple(
+            (self.blurring_coordinates - self.box_origin).T
+        )
+        self.mask_fft_indexes = tuple(
+            (self.mask_coordinates - self.box_origin + half).T
+        )
+
+    @property
+    def fft_operations(self):
+        return fft_operations_from_fft_shape(fft_shape_2d=self.fft_shape_2d)
+
+    def use_fft_from_total_values_and_total_columns(
+        self, total_values, total_columns=1, total_entries=0
+    ):
+        """Whether the FFT convolver is used to convolve *total_columns* images with *total_values* non-zero values
+        between them, stored in a dense array of *total_entries* entries."""
+
+        if self.backend != "auto":
+            return self.backend == "fft"
+
+        real_space_operations = (
+            total_values * self.kernel_area + dense_entry_cost * total_entries
+        )
+
+        return total_columns * self.fft_operations < real_space_operations
+
+    @property
+    def use_fft_for_image(self):
+        return self.use_fft_from_total_values_and_total_columns(
+            total_values=self.mask_coordinates.shape[0]
+            + self.blurring_coordinates.shape[0]
+        )
+
+    def use_fft_from_mapping_matrix(self, mapping_matrix):
+        return self.use_fft_from_total_values_and_total_columns(
+            total_values=np.count_nonzero(mapping_matrix),
+            total_columns=mapping_matrix.shape[1],
+            total_entries=mapping_matrix.size,
+        )
+
+    def convolved_boxes_from_boxes(self, boxes):
+        """Convolve a stack of (columns, box_shape) images with the PSF via one multi-column FFT."""
+
+        return scipy.fft.irfft2(
+            scipy.fft.rfft2(boxes, s=self.fft_shape_2d, axes=(1, 2)) * self.kernel_fft,
+            s=self.fft_shape_2d,
+            axes=(1, 2),
+        )
+
+    def convolved_image_from_image_and_blurring_image(self, image, blurring_image):
+        """Convolve an image and blurring image with the PSF, returning the convolved image in the mask (see
+        *convolver.convolved_image_from_image_and_blurring_image*)."""
+
+        if not self.use_fft_for_image:
+            return self.convolver.convolved_image_from_image_and_blurring_image(
+                image=image, blurring_image=blurring_image
+            )
+
+        box = np.zeros((1,) + self.box_shape_2d)
+
+        box[(0,) + self.mask_box_indexes] = np.asarray(image.in_1d_binned)
+        box[(0,) + self.blurring_box_indexes] = np.asarray(blurring_image.in_1d_binned)
+
+        convolved_image = self.convolved_boxes_from_boxes(boxes=box)[
+            (0,) + self.mask_fft_indexes
+        ]
+
+        return self.convolver.mask.mapping.array_stored_1d_from_array_1d(
+            array_1d=convolved_image
+        )
+
+    def convolve_mapping_matrix(self, mapping_matrix):
+        """Convolve every column of a mapping matrix with the PSF (see *convolver.convolve_mapping_matrix*)."""
+
+        if not self.use_fft_from_mapping_matrix(mapping_matrix=mapping_matrix):
+            return self.convolver.convolve_mapping_matrix(mapping_matrix=mapping_matrix)
+
+        mapping_matrix = np.asarray(mapping_matrix)
+
+        total_columns = mapping_matrix.shape[1]
+
+        blurred_mapping_matrix = np.zeros(mapping_matrix.shape)
+
+        boxes = np.zeros((self.columns_per_chunk,) + self.box_shape_2d)
+
+        for column_start in range(0, total_columns, self.columns_per_chunk):
+
+            column_end = min(column_start + self.columns_per_chunk, total_columns)
+            columns = column_end - column_start
+
+            boxes[:] = 0.0
+            boxes[(slice(0, columns),) + self.mask_box_indexes] = mapping_matrix[
+                :, column_start:column_end
+            ].T
+
+            convolved_boxes = self.convolved_boxes_from_boxes(boxes=boxes[:columns])
+
+            blurred_mapping_matrix[:, column_start:column_end] = convolved_boxes[
+                (slice(None),) + self.mask_fft_indexes
+            ].T
+
+        return blurred_mapping_matrix
+
+
+def blurred_mapping_matrix_from_sparse_mapping_and_gather_tables(
+    image_pixel_starts,
+    source_indexes,
+    weights,
+    gather_starts,
+    gather_indexes,
+    gather_kernels,
+    pixels,
+):
+    """Blur the CSR mapping matrix of a mapper with a PSF, returning the dense (total_image_pixels,
+    total_source_pixels) blurred mapping matrix.
+
+    The gather tables are the CSR form of the PSF operator, where the entries of blurred image pixel i list the image
+    pixels whose PSF frames reach it and the PSF value they are blurred by. Every row of the blurred mapping matrix is
+    therefore summed from the sparse rows of the mapping matrix it gathers, which blurs all source pixel columns at
+    once, writes each row only once and loops over only the non-zero entries of the mapping matrix. Rows are
+    independent, so they are computed in parallel if the function is compiled with parallel=True."""
+
+    total_image_pixels = gather_starts.shape[0] - 1
+
+    blurred_mapping_matrix = np.zeros((total_image_pixels, pixels))
+
+    for blurred_index in numba.prange(total_image_pixels):
+        for gather in range(
+            gather_starts[blurred_index], gather_starts[blurred_index + 1]
+        ):
+
+            image_index = gather_indexes[gather]
+            kernel = gather_kernels[gather]
+
+            for entry in range(
+                image_pixel_starts[image_index], image_pixel_starts[image_index + 1]
+            ):
+                blurred_mapping_matrix[blurred_index, source_indexes[entry]] += (
+                    kernel * weights[entry]
+                )
+
+    return blurred_mapping_matrix
+
+
+blurred_mapping_matrix_from_sparse_mapping_and_gather_tables_jit = decorator_util.jit()(
+    blurred_mapping_matrix_from_sparse_mapping_and_gather_tables
+)
+
+blurred_mapping_matrix_from_sparse_mapping_and_gather_tables_parallel_jit = decorator_util.jit(
+    parallel=True
+)(blurred_mapping_matrix_from_sparse_mapping_and_gather_tables)
+
+
+class BatchedConvolver(object):
+    def __init__(self, convolver, parallel=False):
+        """Convolve every source pixel column of a mapping matrix with the PSF of a convolver at once, giving the same
+        blurred mapping matrix as *convolver.convolve_mapping_matrix*.
+
+        The real-space convolver loops over the mapping matrix column by column, checking every entry of every column
+        and scattering its non-zero values into the image pixels of their PSF frames. The batched convolver instead
+        precomputes, once per mask and PSF, the index and kernel tables of the image pixels every image pixel gathers
+        from (see *blurred_mapping_matrix_from_sparse_mapping_and_gather_tables*), so that every row of the blurred
+        mapping matrix is computed in one pass over the sparse mappings of the source pixels.
+
+        Parameters
+        -----------
+        convolver : aa.convolver
+            The real-space convolver of a masked imaging dataset, whose PSF frames are used.
+        parallel : bool
+            If True, the rows of the blurred mapping matrix are computed in parallel by numba's prange, using the
+            number of threads set by the environment variable NUMBA_NUM_THREADS.
+        """
+
+        self.parallel = parallel
+
+        gather_operator = inversion_util.sparse_psf_operator_from_convolver(
+            convolver=convolver
+        ).tocsr()
+
+        gather_operator.sort_indices()
+
+        self.gather_starts = gather_operator.indptr.astype("int64")
+        self.gather_indexes = gather_operator.indices.astype("int64")
+        self.gather_kernels = gather_operator.data.astype("float64")
+
+    @property
+    def blurred_mapping_matrix_jit(self):
+        if self.parallel:
+            return blurred_mapping_matrix_from_sparse_mapping_and_gather_tables_parallel_jit
+        return blurred_mapping_matrix_from_sparse_mapping_and_gather_tables_jit
+
+    def blurred_mapping_matrix_from_sparse_mapping(
+        self, image_pixel_starts, source_indexes, weights, pixels
+    ):
+        """Blur a mapping matrix given in CSR form (see *transformer_util.sparse_mapping_from_mapper*)."""
+
+        return self.blurred_mapping_matrix_jit(
+            image_pixel_starts=np.asarray(image_pixel_starts, dtype="int64"),
+            source_indexes=np.asarray(source_indexes, dtype="int64"),
+            weights=np.asarray(weights, dtype="float64"),
+            gather_starts=self.gather_starts,
+            gather_indexes=self.gather_indexes,
+            gather_kernels=self.gather_kernels,
+            pixels=pixels,
+        )
+
+    def convolve_mapping_matrix(self, mapping_matrix):
+        """Convolve every column of a dense or scipy sparse mapping matrix with the PSF (see
+        *convolver.convolve_mapping_matrix*)."""
+
+        sparse_mapping_matrix = sparse.csr_matrix(mapping_matrix)
+
+        return self.blurred_mapping_matrix_from_sparse_mapping(
+            image_pixel_starts=sparse_mapping_matrix.indptr,
+            source_indexes=sparse_mapping_matrix.indices,
+            weights=sparse_mapping_matrix.data,
+            pixels=sparse_mapping_matrix.shape[1],
+        )
+
+    def blurred_mapping_matrix_from_mapper(self, mapper):
+        """Compute the blurred mapping matrix of a mapper directly from its sub-pixel to source pixel mappings, without
+        forming its dense mapping matrix."""
+
+        image_pixel_starts, source_indexes, weights = transformer_util.sparse_mapping_from_mapper(
+            mapper=mapper
+        )
+
+        return self.blurred_mapping_matrix_from_sparse_mapping(
+            image_pixel_starts=image_pixel_starts,
+            source_indexes=source_indexes,
+            weights=weights,
+            pixels=mapper.pixels,
+        )
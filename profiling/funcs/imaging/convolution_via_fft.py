@@ -0,0 +1,164 @@
+import autolens as al
+
+import time
+
+import numpy as np
+
+from profiling import convolver_util
+
+print(
+    "Description: PSF convolution of model images and mapping matrices via FFTs, compared to the real-space convolver."
+)
+
+shape_2d = (200, 200)
+pixel_scales = 0.05
+sub_size = 2
+radius = 3.0
+pixelization_shape_2d = (30, 30)
+
+# The maximum error of the FFT convolution relative to the largest value of the real-space convolution.
+
+tolerance = 1.0e-8
+
+mask = al.mask.circular(
+    shape_2d=shape_2d, pixel_scales=pixel_scales, sub_size=sub_size, radius=radius
+)
+
+lens_galaxy = al.Galaxy(
+    redshift=0.5,
+    light=al.lp.EllipticalSersic(
+        centre=(0.0, 0.0),
+        axis_ratio=0.9,
+        phi=45.0,
+        intensity=0.5,
+        effective_radius=0.8,
+        sersic_index=4.0,
+    ),
+    mass=al.mp.EllipticalIsothermal(
+        centre=(0.0, 0.0), einstein_radius=1.6, axis_ratio=0.7, phi=45.0
+    ),
+)
+
+source_galaxy = al.Galaxy(
+    redshift=1.0,
+    light=al.lp.EllipticalSersic(
+        centre=(0.0, 0.0),
+        axis_ratio=0.8,
+        phi=60.0,
+        intensity=0.4,
+        effective_radius=0.5,
+        sersic_index=1.0,
+    ),
+)
+
+tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
+
+pixelization = al.pix.Rectangular(shape=pixelization_shape_2d)
+
+repeats = 3
+
+print("Circular mask radius = " + str(radius))
+print("Pixelization shape = " + str(pixelization_shape_2d) + "\n")
+print("Number of repeats = ", repeats)
+
+
+def time_func(func):
+
+    func()
+
+    start = time.time()
+    for i in range(repeats):
+        result = func()
+    return result, (time.time() - start) / repeats
+
+
+for psf_size in [5, 11, 21, 31, 51, 81]:
+
+    print()
+    print("########################")
+    print()
+    print("PSF shape = " + str((psf_size, psf_size)) + "\n")
+
+    psf = al.kernel.from_gaussian(
+        shape_2d=(psf_size, psf_size), sigma=0.05 * psf_size, pixel_scales=pixel_scales
+    )
+
+    simulator = al.simulator.imaging(
+        shape_2d=shape_2d,
+        pixel_scales=pixel_scales,
+        sub_size=sub_size,
+        exposure_time=300.0,
+        psf=psf,
+        background_level=0.1,
+        add_noise=True,
+    )
+
+    imaging = simulator.from_tracer(tracer=tracer)
+
+    masked_imaging = al.masked.imaging(imaging=imaging, mask=mask)
+
+    convolver = masked_imaging.convolver
+
+    image = tracer.profile_image_from_grid(grid=masked_imaging.grid)
+    blurring_image = tracer.profile_image_from_grid(grid=masked_imaging.blurring_grid)
+
+    mapper = pixelization.mapper_from_grid_and_sparse_grid(
+        grid=tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[-1],
+        inversion_uses_border=True,
+    )
+
+    mapping_matrix = mapper.mapping_matrix
+
+    convolver_auto = convolver_util.ConvolverFFT(convolver=convolver, backend="auto")
+    convolver_fft = convolver_util.ConvolverFFT(convolver=convolver, backend="fft")
+
+    print("FFT shape = " + str(convolver_fft.fft_shape_2d))
+    print(
+        "Auto backend uses the FFT for images = {}, for mapping matrices = {}\n".format(
+            convolver_auto.use_fft_for_image,
+            convolver_auto.use_fft_from_mapping_matrix(mapping_matrix=mapping_matrix),
+        )
+    )
+
+    convolved_image, diff = time_func(
+        func=lambda: convolver.convolved_image_from_image_and_blurring_image(
+            image=image, blurring_image=blurring_image
+        )
+    )
+    print("Time to convolve image in real space = {}".format(diff))
+
+    convolved_image_fft, diff = time_func(
+        func=lambda: convolver_fft.convolved_image_from_image_and_blurring_image(
+            image=image, blurring_image=blurring_image
+        )
+    )
+    print("Time to convolve image via FFT = {}".format(diff))
+
+    blurred_mapping_matrix, diff = time_func(
+        func=lambda: convolver.convolve_mapping_matrix(mapping_matrix=mapping_matrix)
+    )
+    print("Time to convolve mapping matrix in real space = {}".format(diff))
+
+    blurred_mapping_matrix_fft, diff = time_func(
+        func=lambda: convolver_fft.convolve_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        )
+    )
+    print("Time to convolve mapping matrix via FFT = {}".format(diff))
+
+    image_error = np.max(np.abs(convolved_image_fft - convolved_image)) / np.max(
+        np.abs(convolved_image)
+    )
+    mapping_matrix_error = np.max(
+        np.abs(blurred_mapping_matrix_fft - blurred_mapping_matrix)
+    ) / np.max(np.abs(blurred_mapping_matrix))
+
+    print("\nMaximum relative error of FFT convolved image = {}".format(image_error))
+    print(
+        "Maximum relative error of FFT blurred mapping matrix = {}".format(
+            mapping_matrix_error
+        )
+    )
+
+    assert image_error < tolerance
+    assert mapping_matrix_error < tolerance
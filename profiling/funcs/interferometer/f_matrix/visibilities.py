@@ -8,6 +8,8 @@ import numpy as np
 
 import pytest
 
+from profiling import profiling_util
+
 
 @numba.jit(nopython=True, cache=False, parallel=True)
 def curvature_matrix_from_transformed_mapping_matrix(
@@ -113,8 +115,6 @@ print("Real space sub grid size = " + str(real_space_sub_size))
 print("Real space circular mask radius = " + str(real_space_radius) + "\n")
 print("Number of points = " + str(real_space_grid.sub_shape_1d) + "\n")
 
-image_pixels = real_space_shape_2d[0] * real_space_shape_2d[1]
-
 lens_galaxy = al.Galaxy(
     redshift=0.5,
     mass=al.mp.EllipticalIsothermal(
@@ -148,11 +148,6 @@ for total_visibilities in [
     print()
     print("Number of visibilities = " + str(total_visibilities) + "\n")
 
-    shape_data = 8 * total_visibilities
-    shape_preloads = total_visibilities * image_pixels * 2
-
-    total_shape = shape_data + shape_preloads
-
     visibilities = al.visibilities.ones(shape_1d=(total_visibilities,))
     uv_wavelengths = np.ones(shape=(total_visibilities, 2))
 
@@ -162,11 +157,16 @@ for total_visibilities in [
         uv_wavelengths=uv_wavelengths,
     )
 
-    masked_interferometer = al.masked.interferometer(
-        interferometer=interferometer,
-        real_space_mask=real_space_mask,
-        visibilities_mask=np.full(fill_value=False, shape=(total_visibilities,)),
-    )
+    memory_tracker = profiling_util.MemoryTracker(name="Masked Interferometer")
+
+    with memory_tracker:
+        masked_interferometer = al.masked.interferometer(
+            interferometer=interferometer,
+            real_space_mask=real_space_mask,
+            visibilities_mask=np.full(fill_value=False, shape=(total_visibilities,)),
+        )
+
+    print("PreLoad Memory Use (GB) = {}".format(memory_tracker.result.rss_increase_gb))
 
     traced_grid = tracer.traced_grids_of_planes_from_grid(
         grid=masked_interferometer.grid
@@ -184,8 +184,17 @@ for total_visibilities in [
 
     mapping_matrix = mapper.mapping_matrix
 
-    transformed_mapping_matrices = masked_interferometer.transformer.transformed_mapping_matrices_from_mapping_matrix(
-        mapping_matrix=mapping_matrix
+    memory_tracker = profiling_util.MemoryTracker(name="Transformed Mapping Matrices")
+
+    with memory_tracker:
+        transformed_mapping_matrices = masked_interferometer.transformer.transformed_mapping_matrices_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        )
+
+    print(
+        "Transformed Mapping Matrices Memory Use (GB) = {}".format(
+            memory_tracker.result.rss_increase_gb
+        )
     )
 
     if total_visibilities == 100:
@@ -209,3 +218,18 @@ for total_visibilities in [
         )
     diff = time.time() - start
     print("Time to compute curvature matrix = {}".format(2.0 * diff / repeats))
+
+    memory_tracker = profiling_util.MemoryTracker(name="Curvature Matrix")
+
+    with memory_tracker:
+        curvature_matrix_from_transformed_mapping_matrix_updated(
+            transformed_mapping_matrix=transformed_mapping_matrices[0],
+            noise_map=masked_interferometer.noise_map[:, 0],
+        )
+
+    print(
+        "Curvature Matrix Peak Allocated Memory (GB) = {}".format(
+            memory_tracker.result.allocated_peak_gb
+        )
+    )
+    print("Peak Memory Use (GB) = {}".format(memory_tracker.result.rss_peak_gb))
@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+
+import pytest
+
+from profiling import inversion_util
+
+print(
+    "Description: curvature matrix via the numba loop and BLAS, checking they agree and timing both."
+)
+
+# The transformed mapping matrices are random, because the run-time of the curvature matrix only depends on their
+# shape. The real and imaginary curvature matrices are both computed, using the real and imaginary noise-maps.
+
+repeats = 3
+
+print("Number of repeats = ", repeats)
+
+crossovers = {}
+
+for source_pixels in [100, 400, 900, 1600]:
+
+    for total_visibilities in [100, 1000, 10000, 50000]:
+
+        print()
+        print("########################")
+        print()
+        print("Number of visibilities = " + str(total_visibilities))
+        print("Number of source pixels = " + str(source_pixels) + "\n")
+
+        transformed_mapping_matrices = [
+            np.random.uniform(
+                low=-1.0, high=1.0, size=(total_visibilities, source_pixels)
+            )
+            for component in (0, 1)
+        ]
+        noise_map = np.random.uniform(low=0.5, high=2.0, size=(total_visibilities, 2))
+
+        curvature_matrices = {}
+        run_times = {}
+
+        for backend in ["numba", "blas"]:
+
+            curvature_matrices[
+                backend
+            ] = inversion_util.curvature_matrices_from_transformed_mapping_matrices(
+                transformed_mapping_matrices=transformed_mapping_matrices,
+                noise_map=noise_map,
+                backend=backend,
+            )
+
+            start = time.time()
+            for i in range(repeats):
+                inversion_util.curvature_matrices_from_transformed_mapping_matrices(
+                    transformed_mapping_matrices=transformed_mapping_matrices,
+                    noise_map=noise_map,
+                    backend=backend,
+                )
+            run_times[backend] = (time.time() - start) / repeats
+
+            print(
+                "Time to compute real and imag curvature matrices via {} = {}".format(
+                    backend, run_times[backend]
+                )
+            )
+
+        for component in (0, 1):
+            assert curvature_matrices["numba"][component] == pytest.approx(
+                curvature_matrices["blas"][component], 1.0e-4
+            )
+
+        if run_times["blas"] < run_times["numba"]:
+            crossovers.setdefault(source_pixels, total_visibilities)
+
+print()
+print("########################")
+print()
+
+for source_pixels in [100, 400, 900, 1600]:
+    if source_pixels in crossovers:
+        print(
+            "Source pixels = {}: BLAS is faster from {} visibilities".format(
+                source_pixels, crossovers[source_pixels]
+            )
+        )
+    else:
+        print(
+            "Source pixels = {}: the numba loop is always faster".format(
+                source_pixels
+            )
+        )
@@ -0,0 +1,157 @@
+import autolens as al
+
+import time
+
+import numpy as np
+
+import pytest
+
+from profiling import profiling_util
+from profiling import transformer_util
+
+print(
+    "Description: preloaded transforms computed one chunk of visibilities at a time, within a memory budget."
+)
+
+real_space_shape_2d = (151, 151)
+real_space_pixel_scales = 0.05
+real_space_sub_size = 1
+real_space_radius = 3.0
+
+memory_budget_gb = 0.5
+
+real_space_mask = al.mask.circular(
+    shape_2d=real_space_shape_2d,
+    pixel_scales=real_space_pixel_scales,
+    radius=real_space_radius,
+)
+
+real_space_grid = al.grid.from_mask(mask=real_space_mask)
+real_space_grid_radians = real_space_grid.in_radians.in_1d_binned
+
+print("Real space sub grid size = " + str(real_space_sub_size))
+print("Real space circular mask radius = " + str(real_space_radius) + "\n")
+print("Number of points = " + str(real_space_grid.sub_shape_1d) + "\n")
+print("Memory budget (GB) = " + str(memory_budget_gb) + "\n")
+
+lens_galaxy = al.Galaxy(
+    redshift=0.5,
+    mass=al.mp.EllipticalIsothermal(
+        centre=(0.0, 0.0), einstein_radius=1.6, axis_ratio=0.7, phi=45.0
+    ),
+)
+
+pixelization = al.pix.VoronoiMagnification(shape=(30, 30))
+
+source_galaxy = al.Galaxy(
+    redshift=1.0,
+    light=al.lp.EllipticalSersic(
+        centre=(0.0, 0.0),
+        axis_ratio=0.8,
+        phi=60.0,
+        intensity=0.4,
+        effective_radius=0.5,
+        sersic_index=1.0,
+    ),
+)
+
+tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
+
+profile_image = tracer.profile_image_from_grid(grid=real_space_grid)
+
+tracer_inversion = al.Tracer.from_galaxies(
+    galaxies=[
+        lens_galaxy,
+        al.Galaxy(
+            redshift=1.0,
+            pixelization=pixelization,
+            regularization=al.reg.Constant(coefficient=1.0),
+        ),
+    ]
+)
+
+traced_grid = tracer_inversion.traced_grids_of_planes_from_grid(grid=real_space_grid)[
+    -1
+]
+traced_sparse_grid = tracer_inversion.traced_sparse_grids_of_planes_from_grid(
+    grid=real_space_grid
+)[-1]
+
+mapper = pixelization.mapper_from_grid_and_sparse_grid(
+    grid=traced_grid, sparse_grid=traced_sparse_grid, inversion_uses_border=True
+)
+
+repeats = 1
+
+print("Number of repeats = ", repeats)
+
+for total_visibilities in [100, 1000, 10000, 100000, 1000000]:
+
+    print()
+    print("########################")
+    print()
+    print("Number of visibilities = " + str(total_visibilities) + "\n")
+
+    uv_wavelengths = np.random.uniform(
+        low=-1.5e6, high=1.5e6, size=(total_visibilities, 2)
+    )
+    visibilities = al.visibilities.ones(shape_1d=(total_visibilities,))
+    noise_map = al.visibilities.ones(shape_1d=(total_visibilities,))
+
+    transformer_chunked = transformer_util.TransformerChunked(
+        uv_wavelengths=uv_wavelengths,
+        grid_radians=real_space_grid_radians,
+        memory_budget_gb=memory_budget_gb,
+    )
+
+    print(
+        "Visibilities per chunk = "
+        + str(transformer_chunked.visibilities_per_chunk_from_total_columns())
+    )
+
+    memory_tracker = profiling_util.MemoryTracker(name="Chunked Visibilities")
+
+    start = time.time()
+    with memory_tracker:
+        for i in range(repeats):
+            visibilities_chunked = transformer_chunked.visibilities_from_image(
+                image=profile_image
+            )
+    diff = time.time() - start
+    print("Time to compute visibilities via chunks = {}".format(diff / repeats))
+    print(
+        "Chunked Visibilities Peak Memory Use (GB) = {}".format(
+            memory_tracker.result.rss_peak_gb
+        )
+    )
+
+    if total_visibilities == 100:
+
+        transformer = al.transformer(
+            uv_wavelengths=uv_wavelengths,
+            grid_radians=real_space_grid_radians,
+            preload_transform=True,
+        )
+
+        assert visibilities_chunked == pytest.approx(
+            transformer.visibilities_from_image(image=profile_image), 1.0e-4
+        )
+
+    memory_tracker = profiling_util.MemoryTracker(name="Chunked Curvature Matrix")
+
+    start = time.time()
+    with memory_tracker:
+        data_vector, curvature_matrix = transformer_chunked.data_vector_and_curvature_matrix_from_mapping_matrix(
+            mapping_matrix=mapper.mapping_matrix,
+            visibilities=visibilities,
+            noise_map=noise_map,
+        )
+    diff = time.time() - start
+    print(
+        "Time to compute data vector and curvature matrix via chunks = {}".format(diff)
+    )
+    print(
+        "Chunked Curvature Matrix Peak Memory Use (GB) = {}".format(
+            memory_tracker.result.rss_peak_gb
+        )
+    )
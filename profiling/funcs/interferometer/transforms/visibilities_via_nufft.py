@@ -0,0 +1,121 @@
+import autolens as al
+
+import time
+
+import numpy as np
+
+from profiling import transformer_util
+
+print("Description: visibilities via the NUFFT transformer, compared to the direct transform.")
+
+real_space_shape_2d = (151, 151)
+real_space_pixel_scales = 0.05
+real_space_sub_size = 1
+real_space_radius = 3.0
+
+kernel = "exponential_semicircle"
+kernel_width = 7
+oversampling_factor = 2.0
+
+# The maximum error of the NUFFT visibilities relative to the largest visibility of the direct transform, which is
+# checked for the visibility numbers the direct transform can be computed for.
+
+tolerance = 1.0e-5
+direct_visibilities_limit = 10000
+
+real_space_mask = al.mask.circular(
+    shape_2d=real_space_shape_2d,
+    pixel_scales=real_space_pixel_scales,
+    radius=real_space_radius,
+)
+
+real_space_grid = al.grid.from_mask(mask=real_space_mask)
+real_space_grid_radians = real_space_grid.in_radians.in_1d_binned
+
+print("Real space sub grid size = " + str(real_space_sub_size))
+print("Real space circular mask radius = " + str(real_space_radius) + "\n")
+print("Number of points = " + str(real_space_grid.sub_shape_1d) + "\n")
+print("NUFFT kernel = " + kernel + ", width = " + str(kernel_width))
+print("NUFFT oversampling factor = " + str(oversampling_factor) + "\n")
+
+lens_galaxy = al.Galaxy(
+    redshift=0.5,
+    mass=al.mp.EllipticalIsothermal(
+        centre=(0.0, 0.0), einstein_radius=1.6, axis_ratio=0.7, phi=45.0
+    ),
+)
+
+source_galaxy = al.Galaxy(
+    redshift=1.0,
+    light=al.lp.EllipticalSersic(
+        centre=(0.0, 0.0),
+        axis_ratio=0.8,
+        phi=60.0,
+        intensity=0.4,
+        effective_radius=0.5,
+        sersic_index=1.0,
+    ),
+)
+
+tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
+
+profile_image = tracer.profile_image_from_grid(grid=real_space_grid)
+
+repeats = 3
+
+print("Number of repeats = ", repeats)
+
+for total_visibilities in [100, 1000, 10000, 100000, 1000000, 2000000]:
+
+    print()
+    print("########################")
+    print()
+    print("Number of visibilities = " + str(total_visibilities) + "\n")
+
+    # Uniform uv-wavelengths up to a baseline of 1.5 million wavelengths, typical of ALMA.
+
+    uv_wavelengths = np.random.uniform(
+        low=-1.5e6, high=1.5e6, size=(total_visibilities, 2)
+    )
+
+    start = time.time()
+    transformer_nufft = transformer_util.TransformerNUFFT(
+        uv_wavelengths=uv_wavelengths,
+        grid_radians=real_space_grid_radians,
+        kernel=kernel,
+        kernel_width=kernel_width,
+        oversampling_factor=oversampling_factor,
+    )
+    diff = time.time() - start
+    print("Time to setup NUFFT transformer = {}".format(diff))
+
+    transformer_nufft.visibilities_from_image(image=profile_image)
+
+    start = time.time()
+    for i in range(repeats):
+        visibilities_nufft = transformer_nufft.visibilities_from_image(
+            image=profile_image
+        )
+    diff = time.time() - start
+    print("Time to perform NUFFT = {}".format(diff / repeats))
+
+    if total_visibilities <= direct_visibilities_limit:
+
+        transformer = al.transformer(
+            uv_wavelengths=uv_wavelengths,
+            grid_radians=real_space_grid_radians,
+            preload_transform=False,
+        )
+
+        start = time.time()
+        visibilities = transformer.visibilities_from_image(image=profile_image)
+        diff = time.time() - start
+        print("Time to perform direct fourier transform = {}".format(diff))
+
+        error = np.max(np.abs(visibilities_nufft - visibilities)) / np.max(
+            np.abs(visibilities)
+        )
+
+        print("Maximum relative error of NUFFT = {}".format(error))
+
+        assert error < tolerance
@@ -9,6 +9,8 @@ import numpy as np
 
 import pytest
 
+from profiling import profiling_util
+
 
 @numba.jit(nopython=True, cache=False, parallel=True)
 def preload_real_transforms(grid_radians, uv_wavelengths):
@@ -65,8 +67,6 @@ print("Real space sub grid size = " + str(real_space_sub_size))
 print("Real space circular mask radius = " + str(real_space_radius) + "\n")
 print("Number of points = " + str(real_space_grid.sub_shape_1d) + "\n")
 
-image_pixels = real_space_shape_2d[0] * real_space_shape_2d[1]
-
 lens_galaxy = al.Galaxy(
     redshift=0.5,
     mass=al.mp.EllipticalIsothermal(
@@ -106,28 +106,23 @@ for total_visibilities in [
     print()
     print("Number of visibilities = " + str(total_visibilities) + "\n")
 
-    shape_data = 8 * total_visibilities
-    shape_preloads = total_visibilities * image_pixels * 2
-
-    total_shape = shape_data + shape_preloads
-
-    print("Data Memory Use (GB) = " + str(shape_data * 8e-9))
-    print("PreLoad Memory Use (GB) = " + str(shape_preloads * 8e-9))
-    print("Total Memory Use (GB) = " + str(total_shape * 8e-9))
-    print()
-
     visibilities = al.visibilities.ones(shape_1d=(total_visibilities,))
     uv_wavelengths = np.ones(shape=(total_visibilities, 2))
 
     start_overall = time.time()
 
+    memory_tracker = profiling_util.MemoryTracker(name="PreLoad Transforms")
+
     start = time.time()
-    preloaded_real_transforms = preload_real_transforms(
-        grid_radians=real_space_grid_radians, uv_wavelengths=uv_wavelengths
-    )
+    with memory_tracker:
+        preloaded_real_transforms = preload_real_transforms(
+            grid_radians=real_space_grid_radians, uv_wavelengths=uv_wavelengths
+        )
 
     diff = time.time() - start
     print("Time to PreLoad Transforms (1_iteration) = {}".format(diff / repeats))
+    print("PreLoad Memory Use (GB) = {}".format(memory_tracker.result.rss_increase_gb))
+    print("Peak Memory Use (GB) = {}".format(memory_tracker.result.rss_peak_gb))
 
     start = time.time()
     for i in range(repeats):
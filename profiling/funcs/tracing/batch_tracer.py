@@ -0,0 +1,146 @@
+import autolens as al
+
+import time
+
+import numpy as np
+
+from tools.tracing import tracing_util
+
+print(
+    "Description: traced grids of many mass models via the batch tracer, compared to one tracer per mass model."
+)
+
+shape_2d = (100, 100)
+pixel_scales = 0.05
+sub_size = 2
+radius = 3.0
+
+# The maximum difference between the traced grids of the batch tracer and the tracers.
+
+tolerance = 1.0e-8
+
+mask = al.mask.circular(
+    shape_2d=shape_2d, pixel_scales=pixel_scales, sub_size=sub_size, radius=radius
+)
+
+grid = al.grid.from_mask(mask=mask)
+
+print("Number of points = " + str(grid.sub_shape_1d) + "\n")
+
+mass_profile_classes = [al.mp.EllipticalIsothermal, al.mp.ExternalShear]
+
+batch_tracer = tracing_util.BatchTracer(
+    mass_profile_classes=mass_profile_classes, grid=grid
+)
+
+print("Parameters = " + str(batch_tracer.parameter_names) + "\n")
+
+repeats = 3
+
+print("Number of repeats = ", repeats)
+
+for total_models in [1, 10, 50, 200]:
+
+    print()
+    print("########################")
+    print()
+    print("Number of mass models = " + str(total_models) + "\n")
+
+    # Random mass models around an SIE + shear lens, such as the walkers of an Emcee ensemble.
+
+    mass_profiles_of_models = [
+        [
+            al.mp.EllipticalIsothermal(
+                centre=tuple(np.random.normal(loc=0.0, scale=0.05, size=2)),
+                axis_ratio=np.random.uniform(low=0.6, high=0.9),
+                phi=np.random.uniform(low=0.0, high=180.0),
+                einstein_radius=np.random.uniform(low=1.4, high=1.8),
+            ),
+            al.mp.ExternalShear(
+                magnitude=np.random.uniform(low=0.0, high=0.1),
+                phi=np.random.uniform(low=0.0, high=180.0),
+            ),
+        ]
+        for model_index in range(total_models)
+    ]
+
+    parameters = batch_tracer.parameters_from_mass_profiles(
+        mass_profiles_of_models=mass_profiles_of_models
+    )
+
+    start = time.time()
+    for i in range(repeats):
+        traced_grids = [
+            al.Tracer.from_galaxies(
+                galaxies=[
+                    al.Galaxy(
+                        redshift=0.5, mass=mass_profiles[0], shear=mass_profiles[1]
+                    ),
+                    al.Galaxy(redshift=1.0),
+                ]
+            ).traced_grids_of_planes_from_grid(grid=grid)[-1]
+            for mass_profiles in mass_profiles_of_models
+        ]
+    diff = time.time() - start
+    print("Time to trace grids via one tracer per model = {}".format(diff / repeats))
+
+    batch_tracer.traced_grids_from_parameters(parameters=parameters)
+
+    start = time.time()
+    for i in range(repeats):
+        batch_traced_grids = batch_tracer.traced_grids_from_parameters(
+            parameters=parameters
+        )
+    diff = time.time() - start
+    print("Time to trace grids via the batch tracer = {}".format(diff / repeats))
+
+    error = np.max(np.abs(batch_traced_grids - np.asarray(traced_grids)))
+
+    print("Maximum difference of batch traced grids = {}".format(error))
+
+    assert error < tolerance
+
+print()
+print("########################")
+print()
+print("Mass models centred on points of the grid\n")
+
+# Coordinates at the centre of a profile are moved out to its radial minimum, as they are by the mass profiles, so
+# the traced grids are finite and the same as the tracers'.
+
+mass_profiles_of_models = [
+    [
+        al.mp.EllipticalIsothermal(
+            centre=tuple(np.asarray(grid)[index]),
+            axis_ratio=0.8,
+            phi=45.0,
+            einstein_radius=1.6,
+        ),
+        al.mp.ExternalShear(magnitude=0.05, phi=30.0),
+    ]
+    for index in [0, grid.sub_shape_1d // 2]
+]
+
+parameters = batch_tracer.parameters_from_mass_profiles(
+    mass_profiles_of_models=mass_profiles_of_models
+)
+
+batch_traced_grids = batch_tracer.traced_grids_from_parameters(parameters=parameters)
+
+traced_grids = [
+    al.Tracer.from_galaxies(
+        galaxies=[
+            al.Galaxy(redshift=0.5, mass=mass_profiles[0], shear=mass_profiles[1]),
+            al.Galaxy(redshift=1.0),
+        ]
+    ).traced_grids_of_planes_from_grid(grid=grid)[-1]
+    for mass_profiles in mass_profiles_of_models
+]
+
+assert np.all(np.isfinite(batch_traced_grids))
+
+error = np.max(np.abs(batch_traced_grids - np.asarray(traced_grids)))
+
+print("Maximum difference of batch traced grids = {}".format(error))
+
+assert error < tolerance
@@ -0,0 +1,203 @@
+import os
+
+import autofit as af
+
+# Setup the config and output paths of the phases, as in 'test/integration'.
+
+workspace_path = "{}/../../../".format(os.path.dirname(os.path.realpath(__file__)))
+
+af.conf.instance = af.conf.Config(
+    config_path=workspace_path + "config",
+    output_path=workspace_path + "output/profiling/funcs",
+)
+
+import autolens as al
+
+import time
+
+import numpy as np
+
+from tools.tracing import tracing_util
+
+print(
+    "Description: traced grids of multi-plane tracers with many line-of-sight galaxies via the multi-plane tracer, "
+    "compared to the tracer."
+)
+
+shape_2d = (100, 100)
+pixel_scales = 0.05
+sub_size = 2
+radius = 3.0
+
+# The maximum difference between the traced grids of the multi-plane tracer and the tracer.
+
+tolerance = 1.0e-8
+
+mask = al.mask.circular(
+    shape_2d=shape_2d, pixel_scales=pixel_scales, sub_size=sub_size, radius=radius
+)
+
+grid = al.grid.from_mask(mask=mask)
+
+print("Number of points = " + str(grid.sub_shape_1d) + "\n")
+
+lens_galaxy = al.Galaxy(
+    redshift=0.5,
+    mass=al.mp.EllipticalIsothermal(
+        centre=(0.0, 0.0), einstein_radius=1.6, axis_ratio=0.7, phi=45.0
+    ),
+    shear=al.mp.ExternalShear(magnitude=0.05, phi=90.0),
+)
+
+source_galaxy = al.Galaxy(
+    redshift=2.0,
+    light=al.lp.EllipticalSersic(
+        centre=(0.1, 0.1),
+        axis_ratio=0.8,
+        phi=60.0,
+        intensity=1.0,
+        effective_radius=1.0,
+        sersic_index=2.5,
+    ),
+)
+
+repeats = 3
+
+print("Number of repeats = ", repeats)
+
+multi_plane_tracer = tracing_util.MultiPlaneTracer()
+
+for total_los_galaxies in [3, 6, 12, 16]:
+
+    print()
+    print("########################")
+    print()
+    print("Number of line-of-sight galaxies = " + str(total_los_galaxies) + "\n")
+
+    # Line-of-sight galaxies with SIS mass profiles (see 'simulators/imaging/lens_multi_plane.py'), every third of which
+    # has only a light profile and therefore no deflection angles.
+
+    los_galaxies = []
+
+    for los_index, redshift in enumerate(np.linspace(0.25, 1.75, total_los_galaxies)):
+
+        centre = tuple(np.random.uniform(low=-5.0, high=5.0, size=2))
+
+        profiles = dict(
+            light=al.lp.SphericalSersic(
+                centre=centre, intensity=0.3, effective_radius=0.3, sersic_index=2.0
+            )
+        )
+
+        if los_index % 3 != 2:
+            profiles["mass"] = al.mp.SphericalIsothermal(
+                centre=centre, einstein_radius=np.random.uniform(low=0.01, high=0.05)
+            )
+
+        los_galaxies.append(al.Galaxy(redshift=redshift, **profiles))
+
+    tracer = al.Tracer.from_galaxies(
+        galaxies=[lens_galaxy, source_galaxy] + los_galaxies
+    )
+
+    print("Number of planes = " + str(tracer.total_planes) + "\n")
+
+    start = time.time()
+    for i in range(repeats):
+        traced_grids = tracer.traced_grids_of_planes_from_grid(grid=grid)
+    diff = time.time() - start
+    print("Time to trace grids via the tracer = {}".format(diff / repeats))
+
+    start = time.time()
+    multi_plane_tracer.traced_grids_of_planes_from_tracer_and_grid(
+        tracer=tracer, grid=grid
+    )
+    diff = time.time() - start
+    print(
+        "Time to trace grids via the multi-plane tracer, including its scaling factors = {}".format(
+            diff
+        )
+    )
+
+    start = time.time()
+    for i in range(repeats):
+        multi_plane_traced_grids = multi_plane_tracer.traced_grids_of_planes_from_tracer_and_grid(
+            tracer=tracer, grid=grid
+        )
+    diff = time.time() - start
+    print("Time to trace grids via the multi-plane tracer = {}".format(diff / repeats))
+
+    error = max(
+        np.max(np.abs(np.asarray(multi_plane_traced_grid) - np.asarray(traced_grid)))
+        for multi_plane_traced_grid, traced_grid in zip(
+            multi_plane_traced_grids, traced_grids
+        )
+    )
+
+    print("Maximum difference of multi-plane traced grids = {}".format(error))
+
+    assert error < tolerance
+
+print()
+print("########################")
+print()
+print("Phase with the multi-plane tracer\n")
+
+# A phase fitting the last tracer with fixed galaxies, whose likelihood evaluations must trace the masked dataset's grid
+# via the multi-plane tracer and give the same likelihood as the phase without it.
+
+psf = al.kernel.from_gaussian(shape_2d=(11, 11), sigma=0.1, pixel_scales=pixel_scales)
+
+simulator = al.simulator.imaging(
+    shape_2d=shape_2d,
+    pixel_scales=pixel_scales,
+    sub_size=sub_size,
+    exposure_time=300.0,
+    psf=psf,
+    background_level=0.1,
+    add_noise=True,
+)
+
+imaging = simulator.from_tracer(tracer=tracer)
+
+galaxies = dict(lens=lens_galaxy, source=source_galaxy)
+
+for los_index, los_galaxy in enumerate(los_galaxies):
+    galaxies["los_" + str(los_index)] = los_galaxy
+
+phase = al.PhaseImaging(
+    phase_name="phase_multi_plane_tracer",
+    galaxies=galaxies,
+    sub_size=sub_size,
+    optimizer_class=af.MultiNest,
+)
+
+# The mask of the phase is smaller than the grid's, so that its blurring region is inside the image.
+
+phase_mask = al.mask.circular(
+    shape_2d=shape_2d, pixel_scales=pixel_scales, sub_size=sub_size, radius=2.0
+)
+
+analysis = phase.make_analysis(dataset=imaging, mask=phase_mask)
+
+instance = phase.model.instance_from_unit_vector([])
+
+figure_of_merit = analysis.fit(instance=instance)
+
+phase = tracing_util.phase_with_multi_plane_tracer(phase=phase)
+
+analysis = phase.make_analysis(dataset=imaging, mask=phase_mask)
+
+figure_of_merit_multi_plane = analysis.fit(instance=instance)
+
+print("Figure of merit via the tracer = {}".format(figure_of_merit))
+print(
+    "Figure of merit via the multi-plane tracer = {}".format(
+        figure_of_merit_multi_plane
+    )
+)
+
+assert len(analysis.multi_plane_tracer.buffers) > 0
+assert abs(figure_of_merit_multi_plane - figure_of_merit) < tolerance * abs(
+    figure_of_merit
+)
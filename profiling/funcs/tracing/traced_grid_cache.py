@@ -0,0 +1,146 @@
+import autolens as al
+
+import numpy as np
+
+from tools.tracing import tracing_util
+
+print(
+    "Description: keys and traced grids of the traced grid cache for mass profiles which do not store every parameter "
+    "they are constructed from."
+)
+
+shape_2d = (100, 100)
+pixel_scales = 0.05
+sub_size = 2
+radius = 3.0
+
+mask = al.mask.circular(
+    shape_2d=shape_2d, pixel_scales=pixel_scales, sub_size=sub_size, radius=radius
+)
+
+grid = al.grid.from_mask(mask=mask)
+
+# The mass_at_200 of this profile sets its kappa_s, scale_radius and truncation_radius, but is not stored under its own
+# name, so two profiles which differ only in it must still have different keys.
+
+mass_profiles = [
+    al.mp.SphericalTruncatedNFWMassToConcentration(
+        centre=(0.0, 0.0), mass_at_200=mass_at_200
+    )
+    for mass_at_200 in [1.0e9, 1.0e11]
+]
+
+keys = [
+    tracing_util.mass_profile_key_from_mass_profile(mass_profile=mass_profile)
+    for mass_profile in mass_profiles
+]
+
+print("Keys = {}\n".format(keys))
+
+assert None not in keys
+assert keys[0] != keys[1]
+
+tracers = [
+    al.Tracer.from_galaxies(
+        galaxies=[
+            al.Galaxy(redshift=0.5, mass=mass_profile),
+            al.Galaxy(redshift=1.0),
+        ]
+    )
+    for mass_profile in mass_profiles
+]
+
+cache = tracing_util.TracedGridCache()
+
+with tracing_util.traced_grid_cache_context(cache=cache):
+    traced_grids = [
+        tracer.traced_grids_of_planes_from_grid(grid=grid)[-1] for tracer in tracers
+    ]
+    traced_grids_cached = [
+        tracer.traced_grids_of_planes_from_grid(grid=grid)[-1] for tracer in tracers
+    ]
+
+print("Cache = {}".format(cache.dict))
+
+assert cache.misses == 2 and cache.hits == 2
+
+for tracer, traced_grid, traced_grid_cached in zip(
+    tracers, traced_grids, traced_grids_cached
+):
+
+    true_traced_grid = tracer.traced_grids_of_planes_from_grid(grid=grid)[-1]
+
+    assert np.array_equal(np.asarray(traced_grid), np.asarray(true_traced_grid))
+    assert np.array_equal(np.asarray(traced_grid_cached), np.asarray(true_traced_grid))
+
+assert np.max(np.abs(np.asarray(traced_grids[0]) - np.asarray(traced_grids[1]))) > 0.0
+
+# A parametric fit traces its grid and blurring grid only up to the last plane with a light profile (via
+# 'plane_index_limit'), which must also be cached, so a second fit of the same tracer is traced entirely from the cache.
+
+tracer = al.Tracer.from_galaxies(
+    galaxies=[
+        al.Galaxy(redshift=0.5, mass=mass_profiles[1]),
+        al.Galaxy(
+            redshift=1.0,
+            light=al.lp.EllipticalSersic(
+                centre=(0.1, 0.1), intensity=1.0, effective_radius=1.0
+            ),
+        ),
+    ]
+)
+
+psf = al.kernel.from_gaussian(shape_2d=(11, 11), sigma=0.1, pixel_scales=pixel_scales)
+
+simulator = al.simulator.imaging(
+    shape_2d=shape_2d,
+    pixel_scales=pixel_scales,
+    sub_size=sub_size,
+    exposure_time=300.0,
+    psf=psf,
+    background_level=0.1,
+    add_noise=True,
+)
+
+# The mask of the fit is smaller than the grid's, so that its blurring region is inside the image.
+
+masked_imaging = al.masked.imaging(
+    imaging=simulator.from_tracer(tracer=tracer),
+    mask=al.mask.circular(
+        shape_2d=shape_2d, pixel_scales=pixel_scales, sub_size=sub_size, radius=2.0
+    ),
+)
+
+true_fit = al.fit(masked_dataset=masked_imaging, tracer=tracer)
+
+cache = tracing_util.TracedGridCache()
+
+with tracing_util.traced_grid_cache_context(cache=cache):
+    fits = [al.fit(masked_dataset=masked_imaging, tracer=tracer) for i in range(2)]
+
+print("Cache after two fits = {}".format(cache.dict))
+
+assert cache.misses > 0 and cache.hits >= cache.misses and cache.uncached == 0
+
+for fit in fits:
+    assert fit.figure_of_merit == true_fit.figure_of_merit
+
+for plane_index_limit in range(tracer.total_planes):
+
+    with tracing_util.traced_grid_cache_context(cache=cache):
+        traced_grids_cached = tracer.traced_grids_of_planes_from_grid(
+            grid=grid, plane_index_limit=plane_index_limit
+        )
+
+    true_traced_grids = tracer.traced_grids_of_planes_from_grid(
+        grid=grid, plane_index_limit=plane_index_limit
+    )
+
+    assert len(traced_grids_cached) == len(true_traced_grids) == plane_index_limit + 1
+
+    for traced_grid_cached, true_traced_grid in zip(
+        traced_grids_cached, true_traced_grids
+    ):
+        assert np.array_equal(
+            np.asarray(traced_grid_cached), np.asarray(true_traced_grid)
+        )
@@ -1,25 +1,27 @@
-import time
-
 import autolens as al
 
+from profiling import benchmark_util
+from profiling import convolver_util
+from profiling import inversion_util
 from profiling.imaging.simulator import simulate_util
 
 import numpy as np
 
-repeats = 10
+# The stages of this benchmark are timed by the function 'stages' below, which is used both when this script is run
+# directly and by the benchmark runner 'profiling/benchmark.py'.
 
-print("Number of repeats = " + str(repeats))
-print()
+repeats = 10
+warmup = 1
 
 sub_size = 4
 radius = 3.6
 psf_shape_2d = (11, 11)
 pixelization_shape_2d = (20, 20)
 
-print("sub grid size = " + str(sub_size))
-print("circular mask radius = " + str(radius) + "\n")
-print("psf shape = " + str(psf_shape_2d) + "\n")
-print("pixelization shape = " + str(pixelization_shape_2d) + "\n")
+benchmark_points = [
+    dict(data_resolution=data_resolution)
+    for data_resolution in ["lsst", "euclid", "hst", "hst_up"]  # , 'ao']
+]
 
 lens_galaxy = al.Galaxy(
     redshift=0.5,
@@ -28,15 +30,15 @@ lens_galaxy = al.Galaxy(
     ),
 )
 
-pixelization = al.pix.Rectangular(shape=pixelization_shape_2d)
-
-source_galaxy = al.Galaxy(
-    redshift=1.0,
-    pixelization=pixelization,
-    regularization=al.reg.Constant(coefficient=1.0),
-)
 
-for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
+def stages(
+    benchmark,
+    data_resolution,
+    sub_size=sub_size,
+    radius=radius,
+    psf_shape_2d=psf_shape_2d,
+    pixelization_shape_2d=pixelization_shape_2d,
+):
 
     imaging = simulate_util.load_test_imaging(
         data_type="lens_sie__source_smooth",
@@ -53,107 +55,235 @@ for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
 
     masked_imaging = al.masked.imaging(imaging=imaging, mask=mask)
 
-    print(
-        "Rectangular Inversion fit run times for image type " + data_resolution + "\n"
+    pixelization = al.pix.Rectangular(shape=pixelization_shape_2d)
+
+    source_galaxy = al.Galaxy(
+        redshift=1.0,
+        pixelization=pixelization,
+        regularization=al.reg.Constant(coefficient=1.0),
     )
-    print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
 
-    start_overall = time.time()
+    if benchmark.verbose:
+        print(
+            "Rectangular Inversion fit run times for image type "
+            + data_resolution
+            + "\n"
+        )
+        print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
+
+    benchmark.metadata["image_pixels"] = masked_imaging.grid.shape_1d
+    benchmark.metadata["sub_pixels"] = masked_imaging.grid.sub_shape_1d
+    benchmark.metadata["psf_pixels"] = psf_shape_2d[0] * psf_shape_2d[1]
+    benchmark.metadata["source_pixels"] = (
+        pixelization_shape_2d[0] * pixelization_shape_2d[1]
+    )
 
     tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
 
-    start = time.time()
-    for i in range(repeats):
-        traced_grid = tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[
+    traced_grid = benchmark.stage(
+        name="traced_grids",
+        func=lambda: tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[
             -1
-        ]
-    diff = time.time() - start
-    print("Time to Setup Traced Grids = {}".format(diff / repeats))
+        ],
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        traced_sparse_grid = tracer.traced_sparse_grids_of_planes_from_grid(
+    traced_sparse_grid = benchmark.stage(
+        name="pixelization_grid",
+        func=lambda: tracer.traced_sparse_grids_of_planes_from_grid(
             grid=masked_imaging.grid
-        )[-1]
-
-    diff = time.time() - start
-    print("Time to Setup Pixelization Grid = {}".format(diff / repeats))
+        )[-1],
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        mapper = pixelization.mapper_from_grid_and_sparse_grid(
+    mapper = benchmark.stage(
+        name="mapper",
+        func=lambda: pixelization.mapper_from_grid_and_sparse_grid(
             grid=traced_grid, sparse_grid=traced_sparse_grid, inversion_uses_border=True
-        )
-    diff = time.time() - start
-    print("Time to create mapper (Border Relocation) = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        mapping_matrix = mapper.mapping_matrix
-    diff = time.time() - start
-    print("Time to compute mapping matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        blurred_mapping_matrix = masked_imaging.convolver.convolve_mapping_matrix(
+        ),
+    )
+
+    mapping_matrix = benchmark.stage(
+        name="mapping_matrix", func=lambda: mapper.mapping_matrix
+    )
+
+    blurred_mapping_matrix = benchmark.stage(
+        name="blurred_mapping_matrix",
+        func=lambda: masked_imaging.convolver.convolve_mapping_matrix(
             mapping_matrix=mapping_matrix
-        )
-    diff = time.time() - start
-    print("Time to compute blurred mapping matrix = {}".format(diff / repeats))
+        ),
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        data_vector = al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
+    # The same convolution via one multi-column FFT of every source pixel's column.
+
+    convolver_fft = benchmark.setup(
+        name="convolver_fft",
+        func=lambda: convolver_util.ConvolverFFT(
+            convolver=masked_imaging.convolver, backend="fft"
+        ),
+    )
+
+    benchmark.stage(
+        name="blurred_mapping_matrix_fft",
+        func=lambda: convolver_fft.convolve_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        ),
+    )
+
+    data_vector = benchmark.stage(
+        name="data_vector",
+        func=lambda: al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
             blurred_mapping_matrix=blurred_mapping_matrix,
             image=masked_imaging.image,
             noise_map=masked_imaging.noise_map,
-        )
-    diff = time.time() - start
-    print("Time to compute data vector = {}".format(diff / repeats))
+        ),
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        curvature_matrix = al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
+    curvature_matrix = benchmark.stage(
+        name="curvature_matrix",
+        func=lambda: al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
             blurred_mapping_matrix=blurred_mapping_matrix,
             noise_map=masked_imaging.noise_map,
-        )
-    diff = time.time() - start
-    print("Time to compute curvature matrix = {}".format(diff / repeats))
+        ),
+    )
+
+    # The same stages using the sparse (CSR / CSC) mapping and blurred mapping matrices, which hold only their
+    # non-zero entries.
+
+    sparse_mapping_matrix = benchmark.stage(
+        name="sparse_mapping_matrix",
+        func=lambda: inversion_util.sparse_mapping_matrix_from_mapper(mapper=mapper),
+    )
+
+    sparse_blurred_mapping_matrix = benchmark.stage(
+        name="sparse_blurred_mapping_matrix",
+        func=lambda: inversion_util.sparse_blurred_mapping_matrix_from_sparse_mapping_matrix(
+            sparse_mapping_matrix=sparse_mapping_matrix,
+            convolver=masked_imaging.convolver,
+        ),
+    )
+
+    benchmark.stage(
+        name="sparse_data_vector",
+        func=lambda: inversion_util.data_vector_from_sparse_blurred_mapping_matrix_and_data(
+            sparse_blurred_mapping_matrix=sparse_blurred_mapping_matrix,
+            image=masked_imaging.image,
+            noise_map=masked_imaging.noise_map,
+        ),
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        regularization_matrix = al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
+    benchmark.stage(
+        name="sparse_curvature_matrix",
+        func=lambda: inversion_util.curvature_matrix_from_sparse_blurred_mapping_matrix(
+            sparse_blurred_mapping_matrix=sparse_blurred_mapping_matrix,
+            noise_map=masked_imaging.noise_map,
+        ),
+    )
+
+    # The curvature matrix assembled directly from the mapper and the image pixel couplings, which are computed once
+    # per mask, PSF and noise-map and so are a setup stage.
+
+    pixel_couplings = benchmark.setup(
+        name="pixel_couplings",
+        func=lambda: inversion_util.PixelCouplings(
+            convolver=masked_imaging.convolver,
+            noise_map=masked_imaging.noise_map,
+            image=masked_imaging.image,
+        ),
+    )
+
+    benchmark.stage(
+        name="direct_data_vector",
+        func=lambda: pixel_couplings.data_vector_from_mapper(mapper=mapper),
+    )
+
+    benchmark.stage(
+        name="direct_curvature_matrix",
+        func=lambda: pixel_couplings.curvature_matrix_from_mapper(mapper=mapper),
+    )
+
+    benchmark.metadata["mapping_matrix_entries"] = sparse_mapping_matrix.nnz
+    benchmark.metadata["blurred_mapping_matrix_entries"] = (
+        sparse_blurred_mapping_matrix.nnz
+    )
+    benchmark.metadata["pixel_couplings_entries"] = pixel_couplings.couplings.nnz
+
+    regularization_matrix = benchmark.stage(
+        name="regularization_matrix",
+        func=lambda: al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
             coefficient=1.0,
             pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
             pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
+        ),
+    )
+
+    curvature_reg_matrix = benchmark.stage(
+        name="curvature_reg_matrix",
+        func=lambda: np.add(curvature_matrix, regularization_matrix),
+    )
+
+    reconstruction = benchmark.stage(
+        name="reconstruction",
+        func=lambda: np.linalg.solve(curvature_reg_matrix, data_vector),
+    )
+
+    # The log determinants of the curvature + regularization and regularization matrices used by the Bayesian
+    # evidence, which an inversion computes by factorising these matrices again after the solve above.
+
+    benchmark.stage(
+        name="log_det_terms",
+        func=lambda: [
+            2.0 * np.sum(np.log(np.diag(np.linalg.cholesky(matrix))))
+            for matrix in [curvature_reg_matrix, regularization_matrix]
+        ],
+    )
+
+    # The reconstruction and both log determinants from one Cholesky factorisation of each matrix, dense and banded.
+
+    for banded in [False, True]:
+
+        benchmark.stage(
+            name="cholesky_reconstruction_and_log_det_terms"
+            + ("_banded" if banded else ""),
+            func=lambda banded=banded: (
+                inversion_util.reconstruction_and_log_det_from_curvature_reg_matrix_and_data_vector(
+                    curvature_reg_matrix=curvature_reg_matrix,
+                    data_vector=data_vector,
+                    banded=banded,
+                ),
+                inversion_util.CholeskyFactor(
+                    matrix=regularization_matrix, banded=banded
+                ).log_det,
+            ),
         )
-    diff = time.time() - start
-    print("Time to compute reguarization matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        curvature_reg_matrix = np.add(curvature_matrix, regularization_matrix)
-    diff = time.time() - start
-    print("Time to compute curvature reguarization Matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        reconstruction = np.linalg.solve(curvature_reg_matrix, data_vector)
-    diff = time.time() - start
-    print("Time to peform reconstruction = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
+
+    benchmark.stage(
+        name="mapped_reconstruction",
+        func=lambda: al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
             mapping_matrix=blurred_mapping_matrix, reconstruction=reconstruction
-        )
-    diff = time.time() - start
-    print("Time to compute mapped reconstruction = {}".format(diff / repeats))
+        ),
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        al.fit(masked_dataset=masked_imaging, tracer=tracer)
-    diff = time.time() - start
-    print("Time to perform complete fit = {}".format(diff / repeats))
+    benchmark.stage(
+        name="fit", func=lambda: al.fit(masked_dataset=masked_imaging, tracer=tracer)
+    )
+
+
+if __name__ == "__main__":
 
+    print("Number of repeats = " + str(repeats))
+    print("Number of warmup calls = " + str(warmup))
     print()
+
+    print("sub grid size = " + str(sub_size))
+    print("circular mask radius = " + str(radius) + "\n")
+    print("psf shape = " + str(psf_shape_2d) + "\n")
+    print("pixelization shape = " + str(pixelization_shape_2d) + "\n")
+
+    for point in benchmark_points:
+
+        benchmark = benchmark_util.Benchmark(
+            name="inversion_rectangular_fit", repeats=repeats, warmup=warmup
+        )
+
+        stages(benchmark=benchmark, **point)
+
+        print()
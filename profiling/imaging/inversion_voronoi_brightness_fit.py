@@ -1,25 +1,26 @@
-import time
-
 import autolens as al
 
+from profiling import benchmark_util
+from profiling import inversion_util
 from profiling.imaging.simulator import simulate_util
 
 import numpy as np
 
-repeats = 10
+# The stages of this benchmark are timed by the function 'stages' below, which is used both when this script is run
+# directly and by the benchmark runner 'profiling/benchmark.py'.
 
-print("Number of repeats = " + str(repeats))
-print()
+repeats = 10
+warmup = 1
 
 sub_size = 4
 radius = 3.6
 psf_shape_2d = (11, 11)
 pixels = 500
 
-print("sub grid size = " + str(sub_size))
-print("circular mask radius = " + str(radius) + "\n")
-print("psf shape = " + str(psf_shape_2d) + "\n")
-print("pixels = " + str(pixels) + "\n")
+benchmark_points = [
+    dict(data_resolution=data_resolution)
+    for data_resolution in ["lsst", "euclid", "hst", "hst_up"]  # , 'ao']
+]
 
 lens_galaxy = al.Galaxy(
     redshift=0.5,
@@ -28,9 +29,15 @@ lens_galaxy = al.Galaxy(
     ),
 )
 
-pixelization = al.pix.VoronoiBrightnessImage(pixels=pixels)
 
-for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
+def stages(
+    benchmark,
+    data_resolution,
+    sub_size=sub_size,
+    radius=radius,
+    psf_shape_2d=psf_shape_2d,
+    pixels=pixels,
+):
 
     imaging = simulate_util.load_test_imaging(
         data_type="lens_sie__source_smooth",
@@ -47,6 +54,8 @@ for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
 
     masked_imaging = al.masked.imaging(imaging=imaging, mask=mask)
 
+    pixelization = al.pix.VoronoiBrightnessImage(pixels=pixels)
+
     source_galaxy = al.Galaxy(
         redshift=1.0,
         pixelization=pixelization,
@@ -55,117 +64,159 @@ for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
         hyper_galaxy_image=masked_imaging.image,
     )
 
-    print(
-        "Rectangular Inversion fit run times for image type " + data_resolution + "\n"
-    )
-    print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
+    if benchmark.verbose:
+        print(
+            "Voronoi Brightness Inversion fit run times for image type "
+            + data_resolution
+            + "\n"
+        )
+        print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
 
-    start_overall = time.time()
+    benchmark.metadata["image_pixels"] = masked_imaging.grid.shape_1d
+    benchmark.metadata["sub_pixels"] = masked_imaging.grid.sub_shape_1d
+    benchmark.metadata["psf_pixels"] = psf_shape_2d[0] * psf_shape_2d[1]
+    benchmark.metadata["source_pixels"] = pixels
 
     tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
 
-    start = time.time()
-    for i in range(repeats):
-        cluster_weight_map = pixelization.weight_map_from_hyper_image(
+    benchmark.stage(
+        name="cluster_weight_map",
+        func=lambda: pixelization.weight_map_from_hyper_image(
             hyper_image=masked_imaging.image
-        )
-    diff = time.time() - start
-    print("Time to Setup Cluster Weight Map = {}".format(diff / repeats))
+        ),
+    )
 
-    for i in range(repeats):
-        sparse_grid = pixelization.sparse_grid_from_grid(
+    benchmark.stage(
+        name="kmeans_clustering",
+        func=lambda: pixelization.sparse_grid_from_grid(
             grid=masked_imaging.grid, hyper_image=masked_imaging.image
-        )
-    diff = time.time() - start
-    print("Time to perform KMeans clustering = {}".format(diff / repeats))
+        ),
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        traced_grid = tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[
+    traced_grid = benchmark.stage(
+        name="traced_grids",
+        func=lambda: tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[
             -1
-        ]
-    diff = time.time() - start
-    print("Time to Setup Traced Grid = {}".format(diff / repeats))
+        ],
+    )
 
     traced_sparse_grid = tracer.traced_sparse_grids_of_planes_from_grid(
         grid=masked_imaging.grid
     )[-1]
 
-    start = time.time()
-    for i in range(repeats):
-        mapper = pixelization.mapper_from_grid_and_sparse_grid(
+    mapper = benchmark.stage(
+        name="mapper",
+        func=lambda: pixelization.mapper_from_grid_and_sparse_grid(
             grid=traced_grid, sparse_grid=traced_sparse_grid, inversion_uses_border=True
-        )
-    diff = time.time() - start
-    print("Time to create mapper (Border Relocation) = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        mapping_matrix = mapper.mapping_matrix
-    diff = time.time() - start
-    print("Time to compute mapping matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        blurred_mapping_matrix = masked_imaging.convolver.convolve_mapping_matrix(
+        ),
+    )
+
+    mapping_matrix = benchmark.stage(
+        name="mapping_matrix", func=lambda: mapper.mapping_matrix
+    )
+
+    blurred_mapping_matrix = benchmark.stage(
+        name="blurred_mapping_matrix",
+        func=lambda: masked_imaging.convolver.convolve_mapping_matrix(
             mapping_matrix=mapping_matrix
-        )
-    diff = time.time() - start
-    print("Time to compute blurred mapping matrix = {}".format(diff / repeats))
+        ),
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        data_vector = al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
+    data_vector = benchmark.stage(
+        name="data_vector",
+        func=lambda: al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
             blurred_mapping_matrix=blurred_mapping_matrix,
             image=masked_imaging.image,
             noise_map=masked_imaging.noise_map,
-        )
-    diff = time.time() - start
-    print("Time to compute data vector = {}".format(diff / repeats))
+        ),
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        curvature_matrix = al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
+    curvature_matrix = benchmark.stage(
+        name="curvature_matrix",
+        func=lambda: al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
             blurred_mapping_matrix=blurred_mapping_matrix,
             noise_map=masked_imaging.noise_map,
-        )
-    diff = time.time() - start
-    print("Time to compute curvature matrix = {}".format(diff / repeats))
+        ),
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        regularization_matrix = al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
+    regularization_matrix = benchmark.stage(
+        name="regularization_matrix",
+        func=lambda: al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
             coefficient=1.0,
             pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
             pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
+        ),
+    )
+
+    curvature_reg_matrix = benchmark.stage(
+        name="curvature_reg_matrix",
+        func=lambda: np.add(curvature_matrix, regularization_matrix),
+    )
+
+    reconstruction = benchmark.stage(
+        name="reconstruction",
+        func=lambda: np.linalg.solve(curvature_reg_matrix, data_vector),
+    )
+
+    # The log determinants of the curvature + regularization and regularization matrices used by the Bayesian
+    # evidence, which an inversion computes by factorising these matrices again after the solve above.
+
+    benchmark.stage(
+        name="log_det_terms",
+        func=lambda: [
+            2.0 * np.sum(np.log(np.diag(np.linalg.cholesky(matrix))))
+            for matrix in [curvature_reg_matrix, regularization_matrix]
+        ],
+    )
+
+    # The reconstruction and both log determinants from one Cholesky factorisation of each matrix, dense and banded.
+
+    for banded in [False, True]:
+
+        benchmark.stage(
+            name="cholesky_reconstruction_and_log_det_terms"
+            + ("_banded" if banded else ""),
+            func=lambda banded=banded: (
+                inversion_util.reconstruction_and_log_det_from_curvature_reg_matrix_and_data_vector(
+                    curvature_reg_matrix=curvature_reg_matrix,
+                    data_vector=data_vector,
+                    banded=banded,
+                ),
+                inversion_util.CholeskyFactor(
+                    matrix=regularization_matrix, banded=banded
+                ).log_det,
+            ),
         )
-    diff = time.time() - start
-    print("Time to compute reguarization matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        curvature_reg_matrix = np.add(curvature_matrix, regularization_matrix)
-    diff = time.time() - start
-    print("Time to compute curvature reguarization Matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        reconstruction = np.linalg.solve(curvature_reg_matrix, data_vector)
-    diff = time.time() - start
-    print("Time to peform reconstruction = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
+
+    benchmark.stage(
+        name="mapped_reconstruction",
+        func=lambda: al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
             mapping_matrix=blurred_mapping_matrix, reconstruction=reconstruction
-        )
-    diff = time.time() - start
-    print("Time to compute mapped reconstruction = {}".format(diff / repeats))
+        ),
+    )
+
+    benchmark.stage(
+        name="fit", func=lambda: al.fit(masked_dataset=masked_imaging, tracer=tracer)
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        al.fit(masked_dataset=masked_imaging, tracer=tracer)
-    diff = time.time() - start
-    print("Time to perform complete fit = {}".format(diff / repeats))
 
+if __name__ == "__main__":
+
+    print("Number of repeats = " + str(repeats))
+    print("Number of warmup calls = " + str(warmup))
     print()
+
+    print("sub grid size = " + str(sub_size))
+    print("circular mask radius = " + str(radius) + "\n")
+    print("psf shape = " + str(psf_shape_2d) + "\n")
+    print("pixels = " + str(pixels) + "\n")
+
+    for point in benchmark_points:
+
+        benchmark = benchmark_util.Benchmark(
+            name="inversion_voronoi_brightness_fit", repeats=repeats, warmup=warmup
+        )
+
+        stages(benchmark=benchmark, **point)
+
+        print()
@@ -1,25 +1,28 @@
-import time
-
 import autolens as al
 
+from profiling import benchmark_util
+from profiling import convolver_util
+from profiling import inversion_util
 from profiling.imaging.simulator import simulate_util
+from tools.inversion import inversion_util as fixed_geometry_inversion_util
 
 import numpy as np
 
-repeats = 10
+# The stages of this benchmark are timed by the function 'stages' below, which is used both when this script is run
+# directly and by the benchmark runner 'profiling/benchmark.py'.
 
-print("Number of repeats = " + str(repeats))
-print()
+repeats = 10
+warmup = 1
 
 sub_size = 4
 radius = 3.6
 psf_shape_2d = (11, 11)
 pixelization_shape_2d = (20, 20)
 
-print("sub grid size = " + str(sub_size))
-print("circular mask radius = " + str(radius) + "\n")
-print("psf shape = " + str(psf_shape_2d) + "\n")
-print("pixelization shape = " + str(pixelization_shape_2d) + "\n")
+benchmark_points = [
+    dict(data_resolution=data_resolution)
+    for data_resolution in ["lsst", "euclid", "hst", "hst_up"]  # , 'ao']
+]
 
 lens_galaxy = al.Galaxy(
     redshift=0.5,
@@ -28,15 +31,15 @@ lens_galaxy = al.Galaxy(
     ),
 )
 
-pixelization = al.pix.VoronoiMagnification(shape=pixelization_shape_2d)
-
-source_galaxy = al.Galaxy(
-    redshift=1.0,
-    pixelization=pixelization,
-    regularization=al.reg.Constant(coefficient=1.0),
-)
 
-for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
+def stages(
+    benchmark,
+    data_resolution,
+    sub_size=sub_size,
+    radius=radius,
+    psf_shape_2d=psf_shape_2d,
+    pixelization_shape_2d=pixelization_shape_2d,
+):
 
     imaging = simulate_util.load_test_imaging(
         data_type="lens_sie__source_smooth",
@@ -53,107 +56,223 @@ for data_resolution in ["lsst", "euclid", "hst", "hst_up"]:  # , 'ao']:
 
     masked_imaging = al.masked.imaging(imaging=imaging, mask=mask)
 
-    print(
-        "Rectangular Inversion fit run times for image type " + data_resolution + "\n"
+    pixelization = al.pix.VoronoiMagnification(shape=pixelization_shape_2d)
+
+    source_galaxy = al.Galaxy(
+        redshift=1.0,
+        pixelization=pixelization,
+        regularization=al.reg.Constant(coefficient=1.0),
     )
-    print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
 
-    start_overall = time.time()
+    if benchmark.verbose:
+        print(
+            "Voronoi Magnification Inversion fit run times for image type "
+            + data_resolution
+            + "\n"
+        )
+        print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
+
+    benchmark.metadata["image_pixels"] = masked_imaging.grid.shape_1d
+    benchmark.metadata["sub_pixels"] = masked_imaging.grid.sub_shape_1d
+    benchmark.metadata["psf_pixels"] = psf_shape_2d[0] * psf_shape_2d[1]
+    benchmark.metadata["source_pixels"] = (
+        pixelization_shape_2d[0] * pixelization_shape_2d[1]
+    )
 
     tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
 
-    start = time.time()
-    for i in range(repeats):
-        traced_grid = tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[
+    traced_grid = benchmark.stage(
+        name="traced_grids",
+        func=lambda: tracer.traced_grids_of_planes_from_grid(grid=masked_imaging.grid)[
             -1
-        ]
-    diff = time.time() - start
-    print("Time to Setup Traced Grid = {}".format(diff / repeats))
+        ],
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        traced_sparse_grid = tracer.traced_sparse_grids_of_planes_from_grid(
+    traced_sparse_grid = benchmark.stage(
+        name="pixelization_grid",
+        func=lambda: tracer.traced_sparse_grids_of_planes_from_grid(
             grid=masked_imaging.grid
-        )[-1]
-
-    diff = time.time() - start
-    print("Time to Setup Traced Sparse Grid = {}".format(diff / repeats))
+        )[-1],
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        mapper = pixelization.mapper_from_grid_and_sparse_grid(
+    mapper = benchmark.stage(
+        name="mapper",
+        func=lambda: pixelization.mapper_from_grid_and_sparse_grid(
             grid=traced_grid, sparse_grid=traced_sparse_grid, inversion_uses_border=True
-        )
-    diff = time.time() - start
-    print("Time to create mapper (Border Relocation) = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        mapping_matrix = mapper.mapping_matrix
-    diff = time.time() - start
-    print("Time to compute mapping matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        blurred_mapping_matrix = masked_imaging.convolver.convolve_mapping_matrix(
+        ),
+    )
+
+    mapping_matrix = benchmark.stage(
+        name="mapping_matrix", func=lambda: mapper.mapping_matrix
+    )
+
+    blurred_mapping_matrix = benchmark.stage(
+        name="blurred_mapping_matrix",
+        func=lambda: masked_imaging.convolver.convolve_mapping_matrix(
             mapping_matrix=mapping_matrix
+        ),
+    )
+
+    # The same blurred mapping matrix from the batched convolver, which blurs every source pixel column at once from
+    # gather tables computed once per mask and PSF, serially and in parallel.
+
+    for parallel in [False, True]:
+
+        batched_convolver = benchmark.setup(
+            name="batched_convolver" + ("_parallel" if parallel else ""),
+            func=lambda parallel=parallel: convolver_util.BatchedConvolver(
+                convolver=masked_imaging.convolver, parallel=parallel
+            ),
         )
-    diff = time.time() - start
-    print("Time to compute blurred mapping matrix = {}".format(diff / repeats))
 
-    start = time.time()
-    for i in range(repeats):
-        data_vector = al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
+        benchmark.stage(
+            name="blurred_mapping_matrix_batched" + ("_parallel" if parallel else ""),
+            func=lambda batched_convolver=batched_convolver: batched_convolver.convolve_mapping_matrix(
+                mapping_matrix=mapping_matrix
+            ),
+        )
+
+    data_vector = benchmark.stage(
+        name="data_vector",
+        func=lambda: al.util.inversion.data_vector_from_blurred_mapping_matrix_and_data(
             blurred_mapping_matrix=blurred_mapping_matrix,
             image=masked_imaging.image,
             noise_map=masked_imaging.noise_map,
-        )
-    diff = time.time() - start
-    print("Time to compute data vector = {}".format(diff / repeats))
+        ),
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        curvature_matrix = al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
+    curvature_matrix = benchmark.stage(
+        name="curvature_matrix",
+        func=lambda: al.util.inversion.curvature_matrix_from_blurred_mapping_matrix(
             blurred_mapping_matrix=blurred_mapping_matrix,
             noise_map=masked_imaging.noise_map,
+        ),
+    )
+
+    regularization_matrix = benchmark.stage(
+        name="regularization_matrix",
+        func=lambda: al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
+            coefficient=1.0,
+            pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
+            pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
+        ),
+    )
+
+    curvature_reg_matrix = benchmark.stage(
+        name="curvature_reg_matrix",
+        func=lambda: np.add(curvature_matrix, regularization_matrix),
+    )
+
+    reconstruction = benchmark.stage(
+        name="reconstruction",
+        func=lambda: np.linalg.solve(curvature_reg_matrix, data_vector),
+    )
+
+    # The log determinants of the curvature + regularization and regularization matrices used by the Bayesian
+    # evidence, which an inversion computes by factorising these matrices again after the solve above.
+
+    benchmark.stage(
+        name="log_det_terms",
+        func=lambda: [
+            2.0 * np.sum(np.log(np.diag(np.linalg.cholesky(matrix))))
+            for matrix in [curvature_reg_matrix, regularization_matrix]
+        ],
+    )
+
+    # The reconstruction and both log determinants from one Cholesky factorisation of each matrix, dense and banded.
+
+    for banded in [False, True]:
+
+        benchmark.stage(
+            name="cholesky_reconstruction_and_log_det_terms"
+            + ("_banded" if banded else ""),
+            func=lambda banded=banded: (
+                inversion_util.reconstruction_and_log_det_from_curvature_reg_matrix_and_data_vector(
+                    curvature_reg_matrix=curvature_reg_matrix,
+                    data_vector=data_vector,
+                    banded=banded,
+                ),
+                inversion_util.CholeskyFactor(
+                    matrix=regularization_matrix, banded=banded
+                ).log_det,
+            ),
         )
-    diff = time.time() - start
-    print("Time to compute curvature matrix = {}".format(diff / repeats))
 
-    start = time.time()
-    for i in range(repeats):
+    # When only the regularization coefficient changes between likelihood evaluations (e.g. hyper phases fitting the
+    # inversion of a fixed lens model), the regularization matrix, solve and log determinants must be recomputed for
+    # every coefficient. The fixed-geometry inversion instead eigendecomposes the inversion once (a setup stage) and
+    # then computes the evidence and reconstruction for a new coefficient in O(N) and O(N^2).
+
+    def regularization_coefficient_change(coefficient=2.0):
+
         regularization_matrix = al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
-            coefficient=1.0,
+            coefficient=coefficient,
             pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
             pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
         )
-    diff = time.time() - start
-    print("Time to compute reguarization matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        curvature_reg_matrix = np.add(curvature_matrix, regularization_matrix)
-    diff = time.time() - start
-    print("Time to compute curvature reguarization Matrix = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        reconstruction = np.linalg.solve(curvature_reg_matrix, data_vector)
-    diff = time.time() - start
-    print("Time to peform reconstruction = {}".format(diff / repeats))
-
-    start = time.time()
-    for i in range(repeats):
-        al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
-            mapping_matrix=blurred_mapping_matrix, reconstruction=reconstruction
+
+        return (
+            inversion_util.reconstruction_and_log_det_from_curvature_reg_matrix_and_data_vector(
+                curvature_reg_matrix=curvature_matrix + regularization_matrix,
+                data_vector=data_vector,
+            ),
+            inversion_util.CholeskyFactor(matrix=regularization_matrix).log_det,
         )
-    diff = time.time() - start
-    print("Time to compute mapped reconstruction = {}".format(diff / repeats))
 
-    start = time.time()
-    for i in range(repeats):
-        al.fit(masked_dataset=masked_imaging, tracer=tracer)
-    diff = time.time() - start
-    print("Time to perform complete fit = {}".format(diff / repeats))
+    benchmark.stage(
+        name="regularization_coefficient_change",
+        func=regularization_coefficient_change,
+    )
+
+    fixed_geometry_inversion = benchmark.setup(
+        name="fixed_geometry_inversion",
+        func=lambda: fixed_geometry_inversion_util.FixedGeometryInversion(
+            data_vector=data_vector,
+            curvature_matrix=curvature_matrix,
+            pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
+            pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
+            image=masked_imaging.image,
+            noise_map=masked_imaging.noise_map,
+        ),
+    )
+
+    benchmark.stage(
+        name="regularization_coefficient_change_fixed_geometry",
+        func=lambda: (
+            fixed_geometry_inversion.reconstruction_from_coefficient(coefficient=2.0),
+            fixed_geometry_inversion.evidence_from_coefficient(coefficient=2.0),
+        ),
+    )
+
+    benchmark.stage(
+        name="mapped_reconstruction",
+        func=lambda: al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
+            mapping_matrix=blurred_mapping_matrix, reconstruction=reconstruction
+        ),
+    )
+
+    benchmark.stage(
+        name="fit", func=lambda: al.fit(masked_dataset=masked_imaging, tracer=tracer)
+    )
 
+
+if __name__ == "__main__":
+
+    print("Number of repeats = " + str(repeats))
+    print("Number of warmup calls = " + str(warmup))
     print()
+
+    print("sub grid size = " + str(sub_size))
+    print("circular mask radius = " + str(radius) + "\n")
+    print("psf shape = " + str(psf_shape_2d) + "\n")
+    print("pixelization shape = " + str(pixelization_shape_2d) + "\n")
+
+    for point in benchmark_points:
+
+        benchmark = benchmark_util.Benchmark(
+            name="inversion_voronoi_magnification_fit", repeats=repeats, warmup=warmup
+        )
+
+        stages(benchmark=benchmark, **point)
+
+        print()
@@ -1,21 +1,28 @@
 import autolens as al
 
-import time
-
+from profiling import benchmark_util
+from profiling import convolver_util
 from profiling.imaging.simulator import simulate_util
+from tools.fitting import fitting_util
+
+import numpy as np
+
+# The stages of this benchmark are timed by the function 'stages' below, which is used both when this script is run
+# directly and by the benchmark runner 'profiling/benchmark.py'.
 
 repeats = 10
+warmup = 1
 
-print("Number of repeats = " + str(repeats))
-print()
+batch_size = 50
 
 sub_size = 4
 radius = 3.0
 psf_shape_2d = (21, 21)
 
-print("sub grid size = " + str(sub_size))
-print("circular mask radius = " + str(radius) + "\n")
-print("psf shape = " + str(psf_shape_2d) + "\n")
+benchmark_points = [
+    dict(data_resolution=data_resolution)
+    for data_resolution in ["lsst", "euclid", "hst", "hst_up", "ao"]
+]
 
 lens_galaxy = al.Galaxy(
     redshift=0.5,
@@ -44,7 +51,14 @@ source_galaxy = al.Galaxy(
     ),
 )
 
-for data_resolution in ["lsst", "euclid", "hst", "hst_up", "ao"]:
+
+def stages(
+    benchmark,
+    data_resolution,
+    sub_size=sub_size,
+    radius=radius,
+    psf_shape_2d=psf_shape_2d,
+):
 
     imaging = simulate_util.load_test_imaging(
         data_type="lens_sie__source_smooth",
@@ -61,39 +75,126 @@ for data_resolution in ["lsst", "euclid", "hst", "hst_up", "ao"]:
 
     masked_imaging = al.masked.imaging(imaging=imaging, mask=mask)
 
-    print("Light profile fit run times for image type " + data_resolution + "\n")
-    print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
+    if benchmark.verbose:
+        print("Light profile fit run times for image type " + data_resolution + "\n")
+        print("Number of points = " + str(masked_imaging.grid.sub_shape_1d) + "\n")
 
-    start_overall = time.time()
+    benchmark.metadata["image_pixels"] = masked_imaging.grid.shape_1d
+    benchmark.metadata["sub_pixels"] = masked_imaging.grid.sub_shape_1d
+    benchmark.metadata["blurring_pixels"] = masked_imaging.blurring_grid.shape_1d
+    benchmark.metadata["psf_pixels"] = psf_shape_2d[0] * psf_shape_2d[1]
 
-    start = time.time()
-    for i in range(repeats):
-        tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
-        profile_image = tracer.profile_image_from_grid(grid=masked_imaging.grid)
-    diff = time.time() - start
-    print("Time to create profile image = {}".format(diff / repeats))
+    tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
 
-    start = time.time()
-    for i in range(repeats):
-        blurring_profile_image = tracer.profile_image_from_grid(
-            grid=masked_imaging.blurring_grid
-        )
-    diff = time.time() - start
-    print("Time to create blurring profile image = {}".format(diff / repeats))
+    profile_image = benchmark.stage(
+        name="profile_image",
+        func=lambda: al.Tracer.from_galaxies(
+            galaxies=[lens_galaxy, source_galaxy]
+        ).profile_image_from_grid(grid=masked_imaging.grid),
+    )
+
+    blurring_profile_image = benchmark.stage(
+        name="blurring_profile_image",
+        func=lambda: tracer.profile_image_from_grid(grid=masked_imaging.blurring_grid),
+    )
+
+    benchmark.stage(
+        name="psf_convolution",
+        func=lambda: masked_imaging.convolver.convolved_image_from_image_and_blurring_image(
+            image=profile_image, blurring_image=blurring_profile_image
+        ),
+    )
+
+    # The same convolution via FFTs of the bounding box of the mask, whose setup computes the FFT of the PSF once per
+    # phase. The 'auto' backend picks whichever convolution is estimated to be faster for this PSF and mask.
+
+    convolver_fft = benchmark.setup(
+        name="convolver_fft",
+        func=lambda: convolver_util.ConvolverFFT(
+            convolver=masked_imaging.convolver, backend="fft"
+        ),
+    )
 
-    start = time.time()
-    for i in range(repeats):
-        blurred_profile_image = masked_imaging.convolver.convolved_image_from_image_and_blurring_image(
+    benchmark.stage(
+        name="psf_convolution_fft",
+        func=lambda: convolver_fft.convolved_image_from_image_and_blurring_image(
             image=profile_image, blurring_image=blurring_profile_image
+        ),
+    )
+
+    benchmark.metadata["psf_convolution_auto_uses_fft"] = convolver_util.ConvolverFFT(
+        convolver=masked_imaging.convolver
+    ).use_fft_for_image
+
+    benchmark.stage(
+        name="fit",
+        func=lambda: al.fit(
+            masked_dataset=masked_imaging,
+            tracer=al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy]),
+        ),
+    )
+
+    # The log likelihoods of a batch of tracers, e.g. the walkers of an Emcee ensemble, fitted one at a time and by the
+    # 'BatchFit' of 'tools/fitting/fitting_util.py', whose setup extracts the data, noise normalization and PSF once.
+
+    tracers = [
+        al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
+        for _ in range(batch_size)
+    ]
+
+    benchmark.stage(
+        name="fit_x{}".format(batch_size),
+        func=lambda: [
+            al.fit(masked_dataset=masked_imaging, tracer=tracer).figure_of_merit
+            for tracer in tracers
+        ],
+    )
+
+    batch_fit = benchmark.setup(
+        name="batch_fit",
+        func=lambda: fitting_util.BatchFit(masked_dataset=masked_imaging),
+    )
+
+    benchmark.stage(
+        name="batch_fit_x{}".format(batch_size),
+        func=lambda: batch_fit.log_likelihoods_from_tracers(tracers=tracers),
+    )
+
+    # Both stages compute the same figures of merit, whose largest difference is recorded.
+
+    benchmark.metadata["batch_fit_max_difference"] = float(
+        np.max(
+            np.abs(
+                batch_fit.log_likelihoods_from_tracers(tracers=tracers)
+                - np.asarray(
+                    [
+                        al.fit(
+                            masked_dataset=masked_imaging, tracer=tracer
+                        ).figure_of_merit
+                        for tracer in tracers
+                    ]
+                )
+            )
         )
-    diff = time.time() - start
-    print("Time to perform PSF Convolution = {}".format(diff / repeats))
+    )
+
 
-    start = time.time()
-    for i in range(repeats):
-        tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
-        al.fit(masked_dataset=masked_imaging, tracer=tracer)
-    diff = time.time() - start
-    print("Time to perform complete fit = {}".format(diff / repeats))
+if __name__ == "__main__":
 
+    print("Number of repeats = " + str(repeats))
+    print("Number of warmup calls = " + str(warmup))
     print()
+
+    print("sub grid size = " + str(sub_size))
+    print("circular mask radius = " + str(radius) + "\n")
+    print("psf shape = " + str(psf_shape_2d) + "\n")
+
+    for point in benchmark_points:
+
+        benchmark = benchmark_util.Benchmark(
+            name="profile_image_fit", repeats=repeats, warmup=warmup
+        )
+
+        stages(benchmark=benchmark, **point)
+
+        print()
@@ -1,62 +1,139 @@
 import autolens as al
 
+import tempfile
+
+from profiling import benchmark_util
+from profiling import transformer_util
+
 import numpy as np
-import time
+
+# The stages of this benchmark are timed by the function 'stages' below, which is used both when this script is run
+# directly and by the benchmark runner 'profiling/benchmark.py'.
 
 repeats = 1
+warmup = 1
 
-visibilities = 1000
 shape_2d = (100, 100)
-image_pixels = shape_2d[0] * shape_2d[1]
-source_pixels = 1000
-
-shape_data = 8 * visibilities
-shape_preloads = visibilities * image_pixels * 2
-shape_mapping_matrix = visibilities * source_pixels
-
-total_shape = shape_data + shape_preloads + shape_mapping_matrix
-
-print("Data Memory Use (GB) = " + str(shape_data * 8e-9))
-print("PreLoad Memory Use (GB) = " + str(shape_preloads * 8e-9))
-print("Mapping Matrix Memory Use (GB) = " + str(shape_mapping_matrix * 8e-9))
-print("Total Memory Use (GB) = " + str(total_shape * 8e-9))
-print()
-
-# Only delete this if the memory use looks... Okay
-# stop
-
-uv_wavelengths = np.ones(shape=(visibilities, 2))
-grid = al.grid.uniform(shape_2d=shape_2d, pixel_scales=0.05)
-image = al.array.ones(shape_2d=shape_2d, pixel_scales=0.05)
-
-transformer = al.transformer(
-    uv_wavelengths=uv_wavelengths, grid_radians=grid, preload_transform=False
-)
-
-start = time.time()
-for i in range(repeats):
-    transformer.real_visibilities_from_image(image=image)
-diff = time.time() - start
-print("Real Visibilities Time = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    transformer.imag_visibilities_from_image(image=image)
-diff = time.time() - start
-print("Imaginary Visibilities Time = {}".format(diff / repeats))
-
-transformer = al.transformer(
-    uv_wavelengths=uv_wavelengths, grid_radians=grid, preload_transform=True
-)
-
-start = time.time()
-for i in range(repeats):
-    transformer.real_visibilities_from_image(image=image)
-diff = time.time() - start
-print("Real Visibilities PreLoad Time = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    transformer.imag_visibilities_from_image(image=image)
-diff = time.time() - start
-print("Imaginary Visibilities PreLoad Time = {}".format(diff / repeats))
+
+benchmark_points = [
+    dict(total_visibilities=total_visibilities) for total_visibilities in [1000]
+]
+
+
+def stages(benchmark, total_visibilities):
+
+    uv_wavelengths = np.ones(shape=(total_visibilities, 2))
+    grid = al.grid.uniform(shape_2d=shape_2d, pixel_scales=0.05)
+    image = al.array.ones(shape_2d=shape_2d, pixel_scales=0.05)
+
+    transformer = al.transformer(
+        uv_wavelengths=uv_wavelengths, grid_radians=grid, preload_transform=False
+    )
+
+    benchmark.stage(
+        name="real_visibilities",
+        func=lambda: transformer.real_visibilities_from_image(image=image),
+    )
+
+    benchmark.stage(
+        name="imag_visibilities",
+        func=lambda: transformer.imag_visibilities_from_image(image=image),
+    )
+
+    # The fused transformer computes the real and imaginary visibilities in one pass, evaluating the phase once.
+
+    transformer_fused = transformer_util.TransformerFused(
+        uv_wavelengths=uv_wavelengths, grid_radians=grid, preload_transform=False
+    )
+
+    benchmark.stage(
+        name="visibilities_fused",
+        func=lambda: transformer_fused.visibilities_from_image(image=image),
+    )
+
+    # The memory used by the preloaded transforms is measured when the transformer is created.
+
+    transformer_preload = benchmark.setup(
+        name="preload_transforms",
+        func=lambda: al.transformer(
+            uv_wavelengths=uv_wavelengths, grid_radians=grid, preload_transform=True
+        ),
+    )
+
+    benchmark.stage(
+        name="real_visibilities_preload",
+        func=lambda: transformer_preload.real_visibilities_from_image(image=image),
+    )
+
+    benchmark.stage(
+        name="imag_visibilities_preload",
+        func=lambda: transformer_preload.imag_visibilities_from_image(image=image),
+    )
+
+    transformer_fused_preload = benchmark.setup(
+        name="preload_transforms_fused",
+        func=lambda: transformer_util.TransformerFused(
+            uv_wavelengths=uv_wavelengths, grid_radians=grid, preload_transform=True
+        ),
+    )
+
+    benchmark.stage(
+        name="visibilities_fused_preload",
+        func=lambda: transformer_fused_preload.visibilities_from_image(image=image),
+    )
+
+    transformer_nufft = benchmark.setup(
+        name="nufft_setup",
+        func=lambda: transformer_util.TransformerNUFFT(
+            uv_wavelengths=uv_wavelengths, grid_radians=grid
+        ),
+    )
+
+    benchmark.stage(
+        name="visibilities_nufft",
+        func=lambda: transformer_nufft.visibilities_from_image(image=image),
+    )
+
+    transformer_chunked = transformer_util.TransformerChunked(
+        uv_wavelengths=uv_wavelengths, grid_radians=grid, memory_budget_gb=0.1
+    )
+
+    benchmark.stage(
+        name="visibilities_chunked",
+        func=lambda: transformer_chunked.visibilities_from_image(image=image),
+    )
+
+    # The first transformer writes the preloaded transforms to the cache, every later one maps the cached file.
+
+    with tempfile.TemporaryDirectory() as cache_path:
+
+        benchmark.setup(
+            name="preload_transforms_cache_write",
+            func=lambda: transformer_util.TransformerPreloadCache(
+                uv_wavelengths=uv_wavelengths, grid_radians=grid, cache_path=cache_path
+            ),
+        )
+
+        benchmark.stage(
+            name="preload_transforms_cache_read",
+            func=lambda: transformer_util.TransformerPreloadCache(
+                uv_wavelengths=uv_wavelengths, grid_radians=grid, cache_path=cache_path
+            ),
+        )
+
+
+if __name__ == "__main__":
+
+    print("Number of repeats = " + str(repeats))
+    print("Number of warmup calls = " + str(warmup))
+    print()
+
+    for point in benchmark_points:
+
+        benchmark = benchmark_util.Benchmark(
+            name="fourier_transform", repeats=repeats, warmup=warmup
+        )
+
+        stages(benchmark=benchmark, **point)
+
+        print()
@@ -1,11 +1,17 @@
 import autolens as al
 
+from profiling import benchmark_util
+from profiling import inversion_util
+from profiling import transformer_util
+
 import numpy as np
-import time
+
+# The stages of this benchmark are timed by the function 'stages' below, which is used both when this script is run
+# directly and by the benchmark runner 'profiling/benchmark.py'.
 
 repeats = 1
+warmup = 1
 
-total_visibilities = 1000
 pixelization_shape_2d = (30, 30)
 
 real_space_shape_2d = (100, 100)
@@ -13,35 +19,9 @@ real_space_pixel_scales = 0.05
 real_space_sub_size = 1
 real_space_radius = 3.0
 
-image_pixels = real_space_shape_2d[0] * real_space_shape_2d[1]
-source_pixels = pixelization_shape_2d[0] * pixelization_shape_2d[1]
-
-shape_data = 8 * total_visibilities
-shape_preloads = total_visibilities * image_pixels * 2
-shape_mapping_matrix = total_visibilities * source_pixels
-
-total_shape = shape_data + shape_preloads + shape_mapping_matrix
-
-print("Data Memory Use (GB) = " + str(shape_data * 8e-9))
-print("PreLoad Memory Use (GB) = " + str(shape_preloads * 8e-9))
-print("Mapping Matrix Memory Use (GB) = " + str(shape_mapping_matrix * 8e-9))
-print("Total Memory Use (GB) = " + str(total_shape * 8e-9))
-print()
-
-# Only delete this if the memory use looks... Okay
-# stop
-
-visibilities = al.visibilities.ones(shape_1d=(total_visibilities,))
-uv_wavelengths = np.ones(shape=(total_visibilities, 2))
-noise_map = al.visibilities.ones(shape_1d=(total_visibilities,))
-
-interferometer = al.interferometer(
-    visibilities=visibilities, noise_map=noise_map, uv_wavelengths=uv_wavelengths
-)
-
-print("Real space sub grid size = " + str(real_space_sub_size))
-print("Real space circular mask radius = " + str(real_space_radius) + "\n")
-print("pixelization shape = " + str(pixelization_shape_2d) + "\n")
+benchmark_points = [
+    dict(total_visibilities=total_visibilities) for total_visibilities in [1000]
+]
 
 lens_galaxy = al.Galaxy(
     redshift=0.5,
@@ -65,153 +45,213 @@ mask = al.mask.circular(
     radius=real_space_radius,
 )
 
-masked_interferometer = al.masked.interferometer(
-    interferometer=interferometer,
-    real_space_mask=mask,
-    visibilities_mask=np.full(fill_value=False, shape=interferometer.data.shape),
-)
 
-print("Number of points = " + str(masked_interferometer.grid.sub_shape_1d) + "\n")
-print(
-    "Number of visibilities = "
-    + str(masked_interferometer.visibilities.shape_1d)
-    + "\n"
-)
+def stages(benchmark, total_visibilities):
 
-start_overall = time.time()
-
-tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
-
-start = time.time()
-for i in range(repeats):
-    traced_grid = tracer.traced_grids_of_planes_from_grid(
-        grid=masked_interferometer.grid
-    )[-1]
-diff = time.time() - start
-print("Time to Setup Traced Grid = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    traced_sparse_grid = tracer.traced_sparse_grids_of_planes_from_grid(
-        grid=masked_interferometer.grid
-    )[-1]
-
-diff = time.time() - start
-print("Time to Setup Traced Sparse Grid = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    mapper = pixelization.mapper_from_grid_and_sparse_grid(
-        grid=traced_grid, sparse_grid=traced_sparse_grid, inversion_uses_border=True
-    )
-diff = time.time() - start
-print("Time to create mapper (Border Relocation) = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    mapping_matrix = mapper.mapping_matrix
-diff = time.time() - start
-print("Time to compute mapping matrix = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    transformed_mapping_matrices = masked_interferometer.transformer.transformed_mapping_matrices_from_mapping_matrix(
-        mapping_matrix=mapping_matrix
-    )
-diff = time.time() - start
-print("Time to compute transformed mapping matrices = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    real_data_vector = al.util.inversion.data_vector_from_transformed_mapping_matrix_and_data(
-        transformed_mapping_matrix=transformed_mapping_matrices[0],
-        visibilities=masked_interferometer.visibilities[:, 0],
-        noise_map=masked_interferometer.noise_map[:, 0],
-    )
-diff = time.time() - start
-print("Time to compute real data vector = {}".format(diff / repeats))
-
-
-start = time.time()
-for i in range(repeats):
-    imag_data_vector = al.util.inversion.data_vector_from_transformed_mapping_matrix_and_data(
-        transformed_mapping_matrix=transformed_mapping_matrices[1],
-        visibilities=masked_interferometer.visibilities[:, 1],
-        noise_map=masked_interferometer.noise_map[:, 1],
-    )
-diff = time.time() - start
-print("Time to compute imaginary data vector = {}".format(diff / repeats))
-
-
-start = time.time()
-for i in range(repeats):
-    real_curvature_matrix = al.util.inversion.curvature_matrix_from_transformed_mapping_matrix(
-        transformed_mapping_matrix=transformed_mapping_matrices[0],
-        noise_map=noise_map[:, 0],
-    )
-diff = time.time() - start
-print("Time to compute real curvature matrix = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    imag_curvature_matrix = al.util.inversion.curvature_matrix_from_transformed_mapping_matrix(
-        transformed_mapping_matrix=transformed_mapping_matrices[1],
-        noise_map=noise_map[:, 1],
-    )
-diff = time.time() - start
-print("Time to compute imaginary curvature matrix = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    regularization_matrix = al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
-        coefficient=1.0,
-        pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
-        pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
-    )
-diff = time.time() - start
-print("Time to compute reguarization matrix = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    real_curvature_reg_matrix = np.add(real_curvature_matrix, regularization_matrix)
-    imag_curvature_reg_matrix = np.add(imag_curvature_matrix, regularization_matrix)
-    data_vector = np.add(real_data_vector, imag_data_vector)
-    curvature_reg_matrix = np.add(real_curvature_reg_matrix, imag_curvature_reg_matrix)
-diff = time.time() - start
-print("Time to compute curvature reguarization Matrices = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    reconstruction = np.linalg.solve(curvature_reg_matrix, data_vector)
-diff = time.time() - start
-print("Time to peform reconstruction = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    real_mapped_visibilities = al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
-        mapping_matrix=transformed_mapping_matrices[0], reconstruction=reconstruction
-    )
-diff = time.time() - start
-print(
-    "Time to compute mapped real visibility reconstruction = {}".format(diff / repeats)
-)
+    visibilities = al.visibilities.ones(shape_1d=(total_visibilities,))
+    uv_wavelengths = np.ones(shape=(total_visibilities, 2))
+    noise_map = al.visibilities.ones(shape_1d=(total_visibilities,))
 
-start = time.time()
-for i in range(repeats):
-    imag_mapped_visibilities = al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
-        mapping_matrix=transformed_mapping_matrices[1], reconstruction=reconstruction
+    interferometer = al.interferometer(
+        visibilities=visibilities, noise_map=noise_map, uv_wavelengths=uv_wavelengths
     )
-diff = time.time() - start
-print(
-    "Time to compute mapped imaginary visibility reconstruction = {}".format(
-        diff / repeats
+
+    # Creating the masked interferometer preloads its Fourier transforms, so their memory is measured here.
+
+    masked_interferometer = benchmark.setup(
+        name="masked_interferometer",
+        func=lambda: al.masked.interferometer(
+            interferometer=interferometer,
+            real_space_mask=mask,
+            visibilities_mask=np.full(fill_value=False, shape=interferometer.data.shape),
+        ),
     )
-)
 
-start = time.time()
-for i in range(repeats):
-    al.fit(masked_dataset=masked_interferometer, tracer=tracer)
-diff = time.time() - start
-print("Time to perform complete fit = {}".format(diff / repeats))
+    if benchmark.verbose:
+        print(
+            "Number of points = " + str(masked_interferometer.grid.sub_shape_1d) + "\n"
+        )
+        print(
+            "Number of visibilities = "
+            + str(masked_interferometer.visibilities.shape_1d)
+            + "\n"
+        )
+
+    tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
+
+    traced_grid = benchmark.stage(
+        name="traced_grids",
+        func=lambda: tracer.traced_grids_of_planes_from_grid(
+            grid=masked_interferometer.grid
+        )[-1],
+    )
+
+    traced_sparse_grid = benchmark.stage(
+        name="pixelization_grid",
+        func=lambda: tracer.traced_sparse_grids_of_planes_from_grid(
+            grid=masked_interferometer.grid
+        )[-1],
+    )
+
+    mapper = benchmark.stage(
+        name="mapper",
+        func=lambda: pixelization.mapper_from_grid_and_sparse_grid(
+            grid=traced_grid, sparse_grid=traced_sparse_grid, inversion_uses_border=True
+        ),
+    )
+
+    mapping_matrix = benchmark.stage(
+        name="mapping_matrix", func=lambda: mapper.mapping_matrix
+    )
+
+    transformed_mapping_matrices = benchmark.stage(
+        name="transformed_mapping_matrices",
+        func=lambda: masked_interferometer.transformer.transformed_mapping_matrices_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        ),
+    )
+
+    transformer_fused = transformer_util.TransformerFused(
+        uv_wavelengths=masked_interferometer.transformer.uv_wavelengths,
+        grid_radians=masked_interferometer.transformer.grid_radians,
+        preload_transform=False,
+    )
+
+    # The transformed mapping matrices computed from the mapper's sparse mappings, without the dense mapping matrix.
+
+    benchmark.stage(
+        name="transformed_mapping_matrices_sparse",
+        func=lambda: transformer_util.transformed_mapping_matrices_from_mapper(
+            transformer=masked_interferometer.transformer, mapper=mapper
+        ),
+    )
+
+    benchmark.stage(
+        name="transformed_mapping_matrices_fused",
+        func=lambda: transformer_fused.transformed_mapping_matrices_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        ),
+    )
+
+    real_data_vector = benchmark.stage(
+        name="real_data_vector",
+        func=lambda: al.util.inversion.data_vector_from_transformed_mapping_matrix_and_data(
+            transformed_mapping_matrix=transformed_mapping_matrices[0],
+            visibilities=masked_interferometer.visibilities[:, 0],
+            noise_map=masked_interferometer.noise_map[:, 0],
+        ),
+    )
+
+    imag_data_vector = benchmark.stage(
+        name="imag_data_vector",
+        func=lambda: al.util.inversion.data_vector_from_transformed_mapping_matrix_and_data(
+            transformed_mapping_matrix=transformed_mapping_matrices[1],
+            visibilities=masked_interferometer.visibilities[:, 1],
+            noise_map=masked_interferometer.noise_map[:, 1],
+        ),
+    )
+
+    real_curvature_matrix = benchmark.stage(
+        name="real_curvature_matrix",
+        func=lambda: al.util.inversion.curvature_matrix_from_transformed_mapping_matrix(
+            transformed_mapping_matrix=transformed_mapping_matrices[0],
+            noise_map=noise_map[:, 0],
+        ),
+    )
+
+    imag_curvature_matrix = benchmark.stage(
+        name="imag_curvature_matrix",
+        func=lambda: al.util.inversion.curvature_matrix_from_transformed_mapping_matrix(
+            transformed_mapping_matrix=transformed_mapping_matrices[1],
+            noise_map=noise_map[:, 1],
+        ),
+    )
+
+    benchmark.stage(
+        name="real_curvature_matrix_blas",
+        func=lambda: inversion_util.curvature_matrix_from_transformed_mapping_matrix(
+            transformed_mapping_matrix=transformed_mapping_matrices[0],
+            noise_map=noise_map[:, 0],
+            backend="blas",
+        ),
+    )
+
+    benchmark.stage(
+        name="imag_curvature_matrix_blas",
+        func=lambda: inversion_util.curvature_matrix_from_transformed_mapping_matrix(
+            transformed_mapping_matrix=transformed_mapping_matrices[1],
+            noise_map=noise_map[:, 1],
+            backend="blas",
+        ),
+    )
+
+    regularization_matrix = benchmark.stage(
+        name="regularization_matrix",
+        func=lambda: al.util.regularization.constant_regularization_matrix_from_pixel_neighbors(
+            coefficient=1.0,
+            pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
+            pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
+        ),
+    )
+
+    def curvature_reg_matrix_and_data_vector():
+
+        real_curvature_reg_matrix = np.add(real_curvature_matrix, regularization_matrix)
+        imag_curvature_reg_matrix = np.add(imag_curvature_matrix, regularization_matrix)
+        data_vector = np.add(real_data_vector, imag_data_vector)
+        curvature_reg_matrix = np.add(
+            real_curvature_reg_matrix, imag_curvature_reg_matrix
+        )
+
+        return curvature_reg_matrix, data_vector
+
+    curvature_reg_matrix, data_vector = benchmark.stage(
+        name="curvature_reg_matrix", func=curvature_reg_matrix_and_data_vector
+    )
+
+    reconstruction = benchmark.stage(
+        name="reconstruction",
+        func=lambda: np.linalg.solve(curvature_reg_matrix, data_vector),
+    )
+
+    benchmark.stage(
+        name="real_mapped_reconstruction",
+        func=lambda: al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
+            mapping_matrix=transformed_mapping_matrices[0],
+            reconstruction=reconstruction,
+        ),
+    )
+
+    benchmark.stage(
+        name="imag_mapped_reconstruction",
+        func=lambda: al.util.inversion.mapped_reconstructed_data_from_mapping_matrix_and_reconstruction(
+            mapping_matrix=transformed_mapping_matrices[1],
+            reconstruction=reconstruction,
+        ),
+    )
+
+    benchmark.stage(
+        name="fit",
+        func=lambda: al.fit(masked_dataset=masked_interferometer, tracer=tracer),
+    )
+
+
+if __name__ == "__main__":
+
+    print("Number of repeats = " + str(repeats))
+    print("Number of warmup calls = " + str(warmup))
+    print()
+
+    print("Real space sub grid size = " + str(real_space_sub_size))
+    print("Real space circular mask radius = " + str(real_space_radius) + "\n")
+    print("pixelization shape = " + str(pixelization_shape_2d) + "\n")
+
+    for point in benchmark_points:
+
+        benchmark = benchmark_util.Benchmark(
+            name="inversion_voronoi_magnification_fit", repeats=repeats, warmup=warmup
+        )
+
+        stages(benchmark=benchmark, **point)
 
-print()
+        print()
@@ -1,42 +1,23 @@
 import autolens as al
 
+from profiling import benchmark_util
+
 import numpy as np
-import time
 
-repeats = 5
+# The stages of this benchmark are timed by the function 'stages' below, which is used both when this script is run
+# directly and by the benchmark runner 'profiling/benchmark.py'.
 
-total_visibilities = 50000
+repeats = 5
+warmup = 1
 
 real_space_shape_2d = (151, 151)
 real_space_pixel_scales = 0.05
 real_space_sub_size = 1
 real_space_radius = 3.0
 
-image_pixels = real_space_shape_2d[0] * real_space_shape_2d[1]
-
-shape_data = 8 * total_visibilities
-shape_preloads = total_visibilities * image_pixels * 2
-
-total_shape = shape_data + shape_preloads
-
-print("Data Memory Use (GB) = " + str(shape_data * 8e-9))
-print("PreLoad Memory Use (GB) = " + str(shape_preloads * 8e-9))
-print("Total Memory Use (GB) = " + str(total_shape * 8e-9))
-print()
-
-# Only delete this if the memory use looks... Okay
-# stop
-
-visibilities = al.visibilities.ones(shape_1d=(total_visibilities,))
-uv_wavelengths = np.ones(shape=(total_visibilities, 2))
-noise_map = al.visibilities.ones(shape_1d=(total_visibilities,))
-
-interferometer = al.interferometer(
-    visibilities=visibilities, noise_map=noise_map, uv_wavelengths=uv_wavelengths
-)
-
-print("Real space sub grid size = " + str(real_space_sub_size))
-print("Real space circular mask radius = " + str(real_space_radius) + "\n")
+benchmark_points = [
+    dict(total_visibilities=total_visibilities) for total_visibilities in [50000]
+]
 
 lens_galaxy = al.Galaxy(
     redshift=0.5,
@@ -64,51 +45,86 @@ real_space_mask = al.mask.circular(
     radius=real_space_radius,
 )
 
-masked_interferometer = al.masked.interferometer(
-    interferometer=interferometer,
-    real_space_mask=real_space_mask,
-    visibilities_mask=np.full(fill_value=False, shape=total_visibilities),
-)
 
-print("Number of points = " + str(masked_interferometer.grid.sub_shape_1d) + "\n")
-print(
-    "Number of visibilities = "
-    + str(masked_interferometer.visibilities.shape_1d)
-    + "\n"
-)
+def stages(benchmark, total_visibilities):
 
-start_overall = time.time()
+    visibilities = al.visibilities.ones(shape_1d=(total_visibilities,))
+    uv_wavelengths = np.ones(shape=(total_visibilities, 2))
+    noise_map = al.visibilities.ones(shape_1d=(total_visibilities,))
 
-tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
+    interferometer = al.interferometer(
+        visibilities=visibilities, noise_map=noise_map, uv_wavelengths=uv_wavelengths
+    )
 
-start = time.time()
-for i in range(repeats):
-    traced_grid = tracer.traced_grids_of_planes_from_grid(
-        grid=masked_interferometer.grid
-    )[-1]
-diff = time.time() - start
-print("Time to Setup Traced Grid = {}".format(diff / repeats))
+    # Creating the masked interferometer preloads its Fourier transforms, so their memory is measured here.
 
-start = time.time()
-for i in range(repeats):
-    tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
-    profile_image = tracer.profile_image_from_grid(grid=masked_interferometer.grid)
-diff = time.time() - start
-print("Time to create profile image = {}".format(diff / repeats))
-
-start = time.time()
-for i in range(repeats):
-    visibilities = tracer.profile_visibilities_from_grid_and_transformer(
-        grid=masked_interferometer.grid, transformer=masked_interferometer.transformer
+    masked_interferometer = benchmark.setup(
+        name="masked_interferometer",
+        func=lambda: al.masked.interferometer(
+            interferometer=interferometer,
+            real_space_mask=real_space_mask,
+            visibilities_mask=np.full(fill_value=False, shape=total_visibilities),
+        ),
     )
-diff = time.time() - start
-print("Time to create profile visibilities = {}".format(diff / repeats))
 
-start = time.time()
-for i in range(repeats):
+    if benchmark.verbose:
+        print(
+            "Number of points = " + str(masked_interferometer.grid.sub_shape_1d) + "\n"
+        )
+        print(
+            "Number of visibilities = "
+            + str(masked_interferometer.visibilities.shape_1d)
+            + "\n"
+        )
+
     tracer = al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy])
-    al.fit(masked_dataset=masked_interferometer, tracer=tracer)
-diff = time.time() - start
-print("Time to perform complete fit = {}".format(diff / repeats))
 
-print()
+    benchmark.stage(
+        name="traced_grids",
+        func=lambda: tracer.traced_grids_of_planes_from_grid(
+            grid=masked_interferometer.grid
+        )[-1],
+    )
+
+    benchmark.stage(
+        name="profile_image",
+        func=lambda: al.Tracer.from_galaxies(
+            galaxies=[lens_galaxy, source_galaxy]
+        ).profile_image_from_grid(grid=masked_interferometer.grid),
+    )
+
+    benchmark.stage(
+        name="profile_visibilities",
+        func=lambda: tracer.profile_visibilities_from_grid_and_transformer(
+            grid=masked_interferometer.grid,
+            transformer=masked_interferometer.transformer,
+        ),
+    )
+
+    benchmark.stage(
+        name="fit",
+        func=lambda: al.fit(
+            masked_dataset=masked_interferometer,
+            tracer=al.Tracer.from_galaxies(galaxies=[lens_galaxy, source_galaxy]),
+        ),
+    )
+
+
+if __name__ == "__main__":
+
+    print("Number of repeats = " + str(repeats))
+    print("Number of warmup calls = " + str(warmup))
+    print()
+
+    print("Real space sub grid size = " + str(real_space_sub_size))
+    print("Real space circular mask radius = " + str(real_space_radius) + "\n")
+
+    for point in benchmark_points:
+
+        benchmark = benchmark_util.Benchmark(
+            name="profile_image_fit", repeats=repeats, warmup=warmup
+        )
+
+        stages(benchmark=benchmark, **point)
+
+        print()
@@ -0,0 +1,567 @@
+
+import numpy as np
+import scipy.linalg
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from autoarray import decorator_util
+from autoarray import exc
+from autoarray.util import inversion_util
+
+from profiling import transformer_util
+
+
+def curvature_matrix_from_transformed_mapping_matrix_via_blas(
+    transformed_mapping_matrix, noise_map
+):
+    """Compute the curvature matrix *F* from a transformed mapping matrix *f* and the 1D noise-map *sigma* as the
+    matrix product (f / sigma)^T (f / sigma), which is performed by BLAS (see Warren & Dye 2003).
+
+    This gives the same curvature matrix as the numba loop
+    *al.util.inversion.curvature_matrix_from_transformed_mapping_matrix*, but BLAS is blocked for the CPU cache and
+    uses the number of threads set by the environment variables OPENBLAS_NUM_THREADS or MKL_NUM_THREADS.
+
+    Parameters
+    -----------
+    transformed_mapping_matrix : ndarray
+        The matrix representing the transformed mappings between sub-grid pixels and pixelization pixels.
+    noise_map : ndarray
+        Flattened 1D array of the noise-map used by the inversion during the fit.
+    """
+
+    weighted_transformed_mapping_matrix = transformed_mapping_matrix / np.asarray(
+        noise_map
+    )[:, None]
+
+    return weighted_transformed_mapping_matrix.T @ weighted_transformed_mapping_matrix
+
+
+curvature_matrix_backends = {
+    "numba": inversion_util.curvature_matrix_from_transformed_mapping_matrix,
+    "blas": curvature_matrix_from_transformed_mapping_matrix_via_blas,
+}
+
+
+def curvature_matrix_from_transformed_mapping_matrix(
+    transformed_mapping_matrix, noise_map, backend="blas"
+):
+    """Compute the curvature matrix of the real or imaginary transformed mapping matrix of an interferometer
+    inversion, using either the numba loop ('numba') or BLAS ('blas').
+
+    'profiling/funcs/interferometer/f_matrix/visibilities_blas.py' checks both backends give the same curvature
+    matrix and times them over a range of visibility and source pixel numbers.
+    """
+
+    if backend not in curvature_matrix_backends:
+        raise ValueError(
+            "The curvature matrix backend must be one of {}, not {}".format(
+                list(curvature_matrix_backends.keys()), backend
+            )
+        )
+
+    return curvature_matrix_backends[backend](
+        transformed_mapping_matrix=transformed_mapping_matrix, noise_map=noise_map
+    )
+
+
+def curvature_matrices_from_transformed_mapping_matrices(
+    transformed_mapping_matrices, noise_map, backend="blas"
+):
+    """Compute the real and imaginary curvature matrices of an interferometer inversion from its real and imaginary
+    transformed mapping matrices and its (total_visibilities, 2) noise-map."""
+
+    return [
+        curvature_matrix_from_transformed_mapping_matrix(
+            transformed_mapping_matrix=transformed_mapping_matrices[component],
+            noise_map=noise_map[:, component],
+            backend=backend,
+        )
+        for component in (0, 1)
+    ]
+
+
+def sparse_mapping_matrix_from_mapper(mapper):
+    """Compute the (total_image_pixels, total_source_pixels) mapping matrix of a mapper as a scipy CSR matrix, which
+    holds only its non-zero entries (see *transformer_util.sparse_mapping_from_mapper*).
+
+    An image pixel maps to at most sub_size^2 source pixels, so for 20x20 to 50x50 pixelizations over 99% of the
+    entries of the dense *mapper.mapping_matrix* are zeros."""
+
+    image_pixel_starts, source_indexes, weights = transformer_util.sparse_mapping_from_mapper(
+        mapper=mapper
+    )
+
+    return sparse.csr_matrix(
+        (weights, source_indexes, image_pixel_starts),
+        shape=(mapper.grid.mask.pixels_in_mask, mapper.pixels),
+    )
+
+
+@decorator_util.jit()
+def sparse_blurred_mapping_matrix_jit(
+    source_pixel_starts,
+    image_indexes,
+    weights,
+    image_frame_1d_indexes,
+    image_frame_1d_kernels,
+    image_frame_1d_lengths,
+):
+    """Blur the columns of a CSC mapping matrix with the PSF frames of a convolver, returning the CSC arrays of the
+    blurred mapping matrix.
+
+    Every column is blurred into a dense scratch array of the image pixels, with the image pixels it reaches recorded
+    so that only they are written out and reset. The first pass counts the non-zero entries of every column, so the
+    output arrays are allocated once."""
+
+    total_image_pixels = image_frame_1d_lengths.shape[0]
+    total_source_pixels = source_pixel_starts.shape[0] - 1
+
+    scratch = np.zeros(total_image_pixels)
+    last_column = np.full(total_image_pixels, -1)
+    column_image_indexes = np.zeros(total_image_pixels, dtype=np.int64)
+
+    blurred_source_pixel_starts = np.zeros(total_source_pixels + 1, dtype=np.int64)
+
+    for source_index in range(total_source_pixels):
+
+        total_entries = 0
+
+        for entry in range(
+            source_pixel_starts[source_index], source_pixel_starts[source_index + 1]
+        ):
+            image_index = image_indexes[entry]
+
+            for kernel_index in range(image_frame_1d_lengths[image_index]):
+                vector_index = image_frame_1d_indexes[image_index, kernel_index]
+
+                if last_column[vector_index] != source_index:
+                    last_column[vector_index] = source_index
+                    total_entries += 1
+
+        blurred_source_pixel_starts[source_index + 1] = (
+            blurred_source_pixel_starts[source_index] + total_entries
+        )
+
+    blurred_image_indexes = np.zeros(
+        blurred_source_pixel_starts[total_source_pixels], dtype=np.int64
+    )
+    blurred_weights = np.zeros(blurred_source_pixel_starts[total_source_pixels])
+
+    last_column[:] = -1
+
+    for source_index in range(total_source_pixels):
+
+        total_entries = 0
+
+        for entry in range(
+            source_pixel_starts[source_index], source_pixel_starts[source_index + 1]
+        ):
+            image_index = image_indexes[entry]
+            weight = weights[entry]
+
+            for kernel_index in range(image_frame_1d_lengths[image_index]):
+                vector_index = image_frame_1d_indexes[image_index, kernel_index]
+
+                if last_column[vector_index] != source_index:
+                    last_column[vector_index] = source_index
+                    column_image_indexes[total_entries] = vector_index
+                    total_entries += 1
+
+                scratch[vector_index] += (
+                    weight * image_frame_1d_kernels[image_index, kernel_index]
+                )
+
+        start = blurred_source_pixel_starts[source_index]
+
+        for index in range(total_entries):
+            vector_index = column_image_indexes[index]
+            blurred_image_indexes[start + index] = vector_index
+            blurred_weights[start + index] = scratch[vector_index]
+            scratch[vector_index] = 0.0
+
+    return blurred_source_pixel_starts, blurred_image_indexes, blurred_weights
+
+
+def sparse_blurred_mapping_matrix_from_sparse_mapping_matrix(
+    sparse_mapping_matrix, convolver
+):
+    """Blur a sparse mapping matrix with the PSF of a convolver, giving the same matrix as
+    *convolver.convolve_mapping_matrix* as a scipy CSC matrix.
+
+    A blurred source pixel covers the image pixels of the source pixel convolved with the PSF, which is still a small
+    fraction of the mask, so the blurred mapping matrix is stored in compressed sparse column (CSC) form."""
+
+    sparse_mapping_matrix = sparse.csc_matrix(sparse_mapping_matrix)
+
+    blurred_source_pixel_starts, blurred_image_indexes, blurred_weights = sparse_blurred_mapping_matrix_jit(
+        source_pixel_starts=sparse_mapping_matrix.indptr.astype("int64"),
+        image_indexes=sparse_mapping_matrix.indices.astype("int64"),
+        weights=sparse_mapping_matrix.data.astype("float64"),
+        image_frame_1d_indexes=convolver.image_frame_1d_indexes,
+        image_frame_1d_kernels=convolver.image_frame_1d_kernels,
+        image_frame_1d_lengths=convolver.image_frame_1d_lengths,
+    )
+
+    return sparse.csc_matrix(
+        (blurred_weights, blurred_image_indexes, blurred_source_pixel_starts),
+        shape=sparse_mapping_matrix.shape,
+    )
+
+
+def data_vector_from_sparse_blurred_mapping_matrix_and_data(
+    sparse_blurred_mapping_matrix, image, noise_map
+):
+    """Compute the data vector *D* of an inversion from its sparse blurred mapping matrix *f*, which is
+    f^T (image / sigma^2), using only the non-zero entries of *f*."""
+
+    return sparse_blurred_mapping_matrix.T @ (
+        np.asarray(image) / np.asarray(noise_map) ** 2.0
+    )
+
+
+def curvature_matrix_from_sparse_blurred_mapping_matrix(
+    sparse_blurred_mapping_matrix, noise_map
+):
+    """Compute the curvature matrix *F* of an inversion from its sparse blurred mapping matrix *f*, which is
+    (f / sigma)^T (f / sigma).
+
+    The sparse product only multiplies source pixels whose blurred images overlap, which are the only non-zero entries
+    of *F*. It is returned as a dense array, which is added to the regularization matrix and solved as before."""
+
+    weighted_blurred_mapping_matrix = (
+        sparse.diags(1.0 / np.asarray(noise_map)) @ sparse_blurred_mapping_matrix
+    )
+
+    return (
+        weighted_blurred_mapping_matrix.T @ weighted_blurred_mapping_matrix
+    ).toarray()
+
+
+def mapped_reconstructed_data_from_sparse_mapping_matrix_and_reconstruction(
+    sparse_mapping_matrix, reconstruction
+):
+    """Map a reconstruction back to the image using a sparse (blurred) mapping matrix."""
+
+    return sparse_mapping_matrix @ reconstruction
+
+
+def sparse_operator_from_frames(
+    frame_1d_indexes, frame_1d_kernels, frame_1d_lengths, total_image_pixels
+):
+    """Compute the (total_image_pixels, total_frames) matrix whose column i is the PSF frame i of a convolver (e.g. its
+    *image_frame_1d_indexes*, *image_frame_1d_kernels* and *image_frame_1d_lengths*) as a scipy CSC matrix."""
+
+    lengths = np.asarray(frame_1d_lengths)
+    in_frame = np.arange(frame_1d_indexes.shape[1]) < lengths[:, None]
+
+    return sparse.csc_matrix(
+        (
+            np.asarray(frame_1d_kernels)[in_frame],
+            np.asarray(frame_1d_indexes)[in_frame],
+            np.concatenate([[0], np.cumsum(lengths)]),
+        ),
+        shape=(total_image_pixels, lengths.shape[0]),
+    )
+
+
+def sparse_psf_operator_from_convolver(convolver):
+    """Compute the (total_image_pixels, total_image_pixels) matrix which blurs an image in the mask with the PSF of a
+    convolver as a scipy CSC matrix, whose column i is the PSF frame of image pixel i."""
+
+    return sparse_operator_from_frames(
+        frame_1d_indexes=convolver.image_frame_1d_indexes,
+        frame_1d_kernels=convolver.image_frame_1d_kernels,
+        frame_1d_lengths=convolver.image_frame_1d_lengths,
+        total_image_pixels=convolver.image_frame_1d_lengths.shape[0],
+    )
+
+
+def sparse_blurring_psf_operator_from_convolver(convolver):
+    """Compute the (total_image_pixels, total_blurring_pixels) matrix which blurs an image in the blurring region of
+    the mask into the mask with the PSF of a convolver as a scipy CSC matrix, whose column i is the PSF frame of
+    blurring pixel i."""
+
+    return sparse_operator_from_frames(
+        frame_1d_indexes=convolver.blurring_frame_1d_indexes,
+        frame_1d_kernels=convolver.blurring_frame_1d_kernels,
+        frame_1d_lengths=convolver.blurring_frame_1d_lengths,
+        total_image_pixels=convolver.image_frame_1d_lengths.shape[0],
+    )
+
+
+@decorator_util.jit()
+def curvature_matrix_from_sparse_mapping_and_pixel_couplings_jit(
+    image_pixel_starts,
+    source_indexes,
+    weights,
+    coupling_starts,
+    coupling_indexes,
+    couplings,
+    pixels,
+):
+    """Assemble the curvature matrix F[s1, s2] = sum_ij M[i, s1] Q[i, j] M[j, s2] from the CSR mapping matrix *M* of a
+    mapper and the CSR image pixel couplings *Q*, looping over only their non-zero entries.
+
+    *Q* is symmetric, so only its couplings with j >= i are used and the off-diagonal couplings are counted twice,
+    by adding the transpose of the assembled matrix."""
+
+    curvature_matrix = np.zeros((pixels, pixels))
+
+    for image_index in range(image_pixel_starts.shape[0] - 1):
+        for coupling_entry in range(
+            coupling_starts[image_index], coupling_starts[image_index + 1]
+        ):
+            coupled_index = coupling_indexes[coupling_entry]
+
+            if coupled_index < image_index:
+                continue
+
+            coupling = couplings[coupling_entry]
+
+            if coupled_index == image_index:
+                coupling *= 0.5
+
+            for entry in range(
+                image_pixel_starts[image_index], image_pixel_starts[image_index + 1]
+            ):
+                source_index = source_indexes[entry]
+                value = weights[entry] * coupling
+
+                for coupled_entry in range(
+                    image_pixel_starts[coupled_index],
+                    image_pixel_starts[coupled_index + 1],
+                ):
+                    curvature_matrix[
+                        source_index, source_indexes[coupled_entry]
+                    ] += (value * weights[coupled_entry])
+
+    return curvature_matrix + curvature_matrix.T
+
+
+class PixelCouplings(object):
+    def __init__(self, convolver, noise_map, image=None):
+        """The PSF-weighted couplings between every pair of image pixels in a mask, which assemble the curvature
+        matrix of an inversion directly from its mapper without forming the blurred mapping matrix.
+
+        If *K* is the PSF operator of the mask and *N* the diagonal noise covariance, the curvature matrix is
+
+            F = M^T (K^T N^-1 K) M = M^T Q M
+
+        The couplings *Q* only depend on the mask, PSF and noise-map, which are fixed for a phase, so they are computed
+        once here and reused by every likelihood evaluation. Two image pixels are coupled if their PSF frames overlap,
+        so *Q* is sparse, and assembling *F* loops only over the non-zero entries of *Q* and the mapping matrix *M*
+        rather than computing the (total_image_pixels x total_source_pixels^2) product of the blurred mapping matrix.
+
+        If an image is input, K^T N^-1 image is also computed once, so that the data vector is M^T K^T N^-1 image.
+
+        Parameters
+        -----------
+        convolver : aa.convolver
+            The convolver of the masked imaging, whose PSF frames define *K*.
+        noise_map : ndarray
+            Flattened 1D array of the noise-map used by the inversion during the fit.
+        image : ndarray or None
+            Flattened 1D array of the image fitted by the inversion.
+        """
+
+        psf_operator = sparse_psf_operator_from_convolver(convolver=convolver)
+
+        weighted_psf_operator = (
+            sparse.diags(1.0 / np.asarray(noise_map)) @ psf_operator
+        )
+
+        self.couplings = sparse.csr_matrix(
+            weighted_psf_operator.T @ weighted_psf_operator
+        )
+
+        if image is not None:
+            self.blurred_weighted_image = psf_operator.T @ (
+                np.asarray(image) / np.asarray(noise_map) ** 2.0
+            )
+        else:
+            self.blurred_weighted_image = None
+
+    def curvature_matrix_from_mapper(self, mapper):
+        """Assemble the curvature matrix of a mapper directly from its sub-pixel to source pixel mappings."""
+
+        image_pixel_starts, source_indexes, weights = transformer_util.sparse_mapping_from_mapper(
+            mapper=mapper
+        )
+
+        return curvature_matrix_from_sparse_mapping_and_pixel_couplings_jit(
+            image_pixel_starts=image_pixel_starts,
+            source_indexes=source_indexes,
+            weights=weights,
+            coupling_starts=self.couplings.indptr,
+            coupling_indexes=self.couplings.indices,
+            couplings=self.couplings.data,
+            pixels=mapper.pixels,
+        )
+
+    def data_vector_from_mapper(self, mapper):
+        """Compute the data vector of a mapper, which is M^T K^T N^-1 image."""
+
+        return (
+            sparse_mapping_matrix_from_mapper(mapper=mapper).T
+            @ self.blurred_weighted_image
+        )
+
+
+def banded_permutation_from_matrix(matrix):
+    """Compute the reverse Cuthill-McKee ordering of the source pixels of a symmetric matrix (e.g. a curvature +
+    regularization matrix), which moves its non-zero entries as close to its diagonal as possible.
+
+    The regularization matrices of rectangular and Voronoi pixelizations only couple neighbouring source pixels, and
+    the curvature matrix only couples source pixels whose blurred images overlap, so after reordering the matrix is
+    banded with a bandwidth much smaller than its number of source pixels."""
+
+    return csgraph.reverse_cuthill_mckee(
+        sparse.csr_matrix(matrix), symmetric_mode=True
+    )
+
+
+def bandwidth_from_matrix_and_permutation(matrix, permutation):
+    """Compute the bandwidth of a matrix reordered by a permutation, without forming the reordered matrix."""
+
+    rows, columns = np.nonzero(matrix)
+
+    if rows.shape[0] == 0:
+        return 0
+
+    position = np.argsort(permutation)
+
+    return int(np.max(np.abs(position[rows] - position[columns])))
+
+
+class CholeskyFactor(object):
+    def __init__(
+        self, matrix, banded=False, permutation=None, max_bandwidth_fraction=0.25
+    ):
+        """A Cholesky factorisation of a symmetric positive-definite matrix (e.g. the curvature + regularization matrix
+        of an inversion), from which its linear solve, log determinant and errors are all computed.
+
+        An inversion's likelihood needs the reconstruction, solve(F + H, D), and the log determinants ln[det(F + H)]
+        and ln[det(H)] (see *Inversion.log_determinant_of_matrix_cholesky* in autoarray), so computing them via
+        *np.linalg.solve* and two calls to *np.linalg.cholesky* factorises F + H twice. Here it is factorised once.
+
+        If *banded* is True, the matrix is reordered by *banded_permutation_from_matrix* and factorised in banded form,
+        which costs O(N b^2) for bandwidth b instead of O(N^3). The ordering only depends on which source pixels are
+        coupled, so one computed for an earlier matrix of the same pixelization can be input as *permutation* (see
+        *CholeskyFactor.permutation*). If the bandwidth is over *max_bandwidth_fraction* of the matrix size the dense
+        factorisation is used instead.
+
+        Parameters
+        -----------
+        matrix : ndarray
+            The symmetric positive-definite matrix which is factorised.
+        banded : bool
+            Whether the matrix is reordered and factorised in banded form.
+        permutation : ndarray or None
+            The ordering of the source pixels used by the banded factorisation, which is computed if not input.
+        max_bandwidth_fraction : float
+            The largest bandwidth, as a fraction of the matrix size, for which the banded factorisation is used.
+        """
+
+        matrix = np.asarray(matrix)
+
+        self.pixels = matrix.shape[0]
+        self.permutation = None
+        self.bandwidth = None
+
+        if banded:
+
+            if permutation is None:
+                permutation = banded_permutation_from_matrix(matrix=matrix)
+
+            bandwidth = bandwidth_from_matrix_and_permutation(
+                matrix=matrix, permutation=permutation
+            )
+
+            if bandwidth <= max_bandwidth_fraction * self.pixels:
+                self.permutation = permutation
+                self.bandwidth = bandwidth
+
+        try:
+
+            if self.bandwidth is None:
+                self.factor = scipy.linalg.cholesky(matrix, lower=True)
+            else:
+                self.factor = scipy.linalg.cholesky_banded(
+                    self.banded_from_matrix(matrix=matrix), lower=True
+                )
+
+        except np.linalg.LinAlgError:
+            raise exc.InversionException()
+
+    @property
+    def is_banded(self):
+        return self.bandwidth is not None
+
+    def banded_from_matrix(self, matrix):
+        """Store the lower triangle of the reordered matrix in the lower banded form used by
+        *scipy.linalg.cholesky_banded*, where banded[k, j] = matrix[permutation[j + k], permutation[j]]."""
+
+        banded = np.zeros((self.bandwidth + 1, self.pixels))
+
+        for k in range(self.bandwidth + 1):
+            banded[k, : self.pixels - k] = matrix[
+                self.permutation[k:], self.permutation[: self.pixels - k]
+            ]
+
+        return banded
+
+    @property
+    def diagonal(self):
+        if self.is_banded:
+            return self.factor[0]
+        return np.diagonal(self.factor)
+
+    @property
+    def log_det(self):
+        """The log determinant of the matrix, which is twice the sum of the logs of the diagonal of its Cholesky
+        factor."""
+        return 2.0 * np.sum(np.log(self.diagonal))
+
+    def solve(self, vector):
+        """Solve matrix x = vector for x (e.g. the reconstruction from the data vector) using the factorisation."""
+
+        if not self.is_banded:
+            return scipy.linalg.cho_solve((self.factor, True), vector)
+
+        solution = np.zeros(np.shape(vector))
+        solution[self.permutation] = scipy.linalg.cho_solve_banded(
+            (self.factor, True), np.asarray(vector)[self.permutation]
+        )
+
+        return solution
+
+    @property
+    def errors_with_covariance(self):
+        """The inverse of the matrix, which for the curvature + regularization matrix is the covariance of the
+        reconstruction."""
+        return self.solve(vector=np.eye(self.pixels))
+
+    @property
+    def errors(self):
+        """The diagonal of the inverse of the matrix, which for the dense factor L is the sum of the squares of the
+        columns of L^-1, computed without forming the full inverse."""
+
+        if self.is_banded:
+            return np.diagonal(self.errors_with_covariance)
+
+        inverse_factor = scipy.linalg.solve_triangular(
+            self.factor, np.eye(self.pixels), lower=True
+        )
+
+        return np.sum(inverse_factor ** 2.0, axis=0)
+
+
+def reconstruction_and_log_det_from_curvature_reg_matrix_and_data_vector(
+    curvature_reg_matrix, data_vector, banded=False
+):
+    """Compute the reconstruction of an inversion and the log determinant of its curvature + regularization matrix
+    from one Cholesky factorisation (see *CholeskyFactor*)."""
+
+    cholesky_factor = CholeskyFactor(matrix=curvature_reg_matrix, banded=banded)
+
+    return cholesky_factor.solve(vector=data_vector), cholesky_factor.log_det
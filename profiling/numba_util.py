@@ -0,0 +1,262 @@
+import json
+import os
+import sys
+import time
+
+import numba
+
+try:
+    from numba.core.dispatcher import Dispatcher
+except ImportError:
+    from numba.dispatcher import Dispatcher
+
+from tools import phase_util
+
+package_names = (
+    "autoarray",
+    "autoastro",
+    "autogalaxy",
+    "autolens",
+    "profiling",
+    "tools",
+)
+
+
+def _dispatchers_from_namespace(namespace):
+    """The numba dispatchers among the values of a module's or class's namespace, including jitted static methods,
+    whose dispatcher is the function the staticmethod wraps."""
+
+    for attribute in list(namespace.values()):
+
+        if isinstance(attribute, staticmethod):
+            attribute = attribute.__func__
+
+        if isinstance(attribute, Dispatcher):
+            yield attribute
+
+
+def jitted_functions_from_package_names(package_names=package_names):
+    """Find every numba jitted function in the modules of the given packages which have been imported, returning a
+    dictionary mapping the function's full name (e.g. 'autoarray.util.inversion_util.curvature_matrix_...') to its
+    numba dispatcher.
+
+    Module-level functions and the jitted static methods of the classes defined in each module (e.g.
+    'autoarray.operators.convolver.Convolver.convolve_jit') are found. Only imported modules are searched, so this
+    should be called after the PyAutoLens modules used by an analysis have been imported. Functions jitted inside
+    other functions (e.g. the integrands of autoastro's 'jit_integrand') are not found.
+    """
+
+    jitted_functions = {}
+
+    for module_name, module in list(sys.modules.items()):
+
+        if module is None or module_name.split(".")[0] not in package_names:
+            continue
+
+        namespaces = [vars(module)] + [
+            vars(attribute)
+            for attribute in list(vars(module).values())
+            if isinstance(attribute, type)
+            and getattr(attribute, "__module__", None) == module_name
+        ]
+
+        for namespace in namespaces:
+
+            for dispatcher in _dispatchers_from_namespace(namespace=namespace):
+
+                name = "{}.{}".format(
+                    getattr(dispatcher.py_func, "__module__", module_name),
+                    dispatcher.py_func.__qualname__,
+                )
+
+                jitted_functions[name] = dispatcher
+
+    return jitted_functions
+
+
+def _cache_counts_from_dispatcher(dispatcher):
+
+    try:
+        stats = dispatcher.stats
+    except AttributeError:
+        return 0, 0
+
+    return sum(stats.cache_hits.values()), sum(stats.cache_misses.values())
+
+
+class NumbaInstrumentation:
+    def __init__(self, package_names=package_names):
+        """Records the time numba spends compiling every jitted function called within a block of code, and whether
+        each compilation was loaded from numba's on-disk cache (a cache hit) or compiled from scratch (a miss).
+
+        The compile time of a function is the time of its call to numba's compiler, which for a cache hit is the time
+        taken to load the function from the cache. Functions called with types they were already compiled for are
+        not compiled again and are therefore not included.
+
+        Parameters
+        ----------
+        package_names : (str,)
+            The packages whose jitted functions are instrumented.
+        """
+        self.package_names = package_names
+        self.compilations = {}
+        self.cache_hits = {}
+        self.cache_misses = {}
+        self.wall_time = None
+
+        self._jitted_functions = {}
+        self._cache_counts = {}
+        self._start = None
+
+    def _instrument_dispatcher(self, name, dispatcher):
+
+        dispatcher_compile = dispatcher.compile
+
+        def instrumented_compile(sig):
+
+            start = time.perf_counter()
+            result = dispatcher_compile(sig)
+
+            self.compilations.setdefault(name, []).append(
+                {"signature": str(sig), "compile_time": time.perf_counter() - start}
+            )
+
+            return result
+
+        dispatcher.compile = instrumented_compile
+
+    def __enter__(self):
+
+        self._jitted_functions = jitted_functions_from_package_names(
+            package_names=self.package_names
+        )
+
+        for name, dispatcher in self._jitted_functions.items():
+            self._cache_counts[name] = _cache_counts_from_dispatcher(
+                dispatcher=dispatcher
+            )
+            self._instrument_dispatcher(name=name, dispatcher=dispatcher)
+
+        self._start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.wall_time = time.perf_counter() - self._start
+
+        for name, dispatcher in self._jitted_functions.items():
+
+            # Removing the instance attribute restores the dispatcher's compile method.
+
+            if "compile" in vars(dispatcher):
+                del dispatcher.compile
+
+            cache_hits, cache_misses = _cache_counts_from_dispatcher(
+                dispatcher=dispatcher
+            )
+
+            self.cache_hits[name] = cache_hits - self._cache_counts[name][0]
+            self.cache_misses[name] = cache_misses - self._cache_counts[name][1]
+
+        return False
+
+    @property
+    def total_compile_time(self):
+        return sum(
+            compilation["compile_time"]
+            for compilations in self.compilations.values()
+            for compilation in compilations
+        )
+
+    @property
+    def dict(self):
+        return {
+            "numba_version": numba.__version__,
+            "wall_time": self.wall_time,
+            "total_compile_time": self.total_compile_time,
+            "total_cache_hits": sum(self.cache_hits.values()),
+            "total_cache_misses": sum(self.cache_misses.values()),
+            "functions": {
+                name: {
+                    "compile_time": sum(
+                        compilation["compile_time"] for compilation in compilations
+                    ),
+                    "cache_hits": self.cache_hits.get(name, 0),
+                    "cache_misses": self.cache_misses.get(name, 0),
+                    "compilations": compilations,
+                }
+                for name, compilations in self.compilations.items()
+            },
+        }
+
+    def output_to_json(self, file_path):
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        with open(file_path, "w") as f:
+            json.dump(self.dict, f, indent=4)
+
+
+def instrument_phase(phase, file_name="numba.json"):
+    """Instrument the first likelihood evaluation of a phase, recording the compile time and cache hit or miss of
+    every numba function it compiles and outputting them to a .json file in the phase's output folder.
+
+    The analysis a phase creates when it is run is wrapped, so the phase is otherwise unchanged and is returned (see
+    *phase_util.phase_with_method_wrapper*).
+
+    Parameters
+    ----------
+    phase : af.Phase
+        The phase whose first likelihood evaluation is instrumented. For a phase extended with hyper phases, the
+        phase it extends and the copies of it which its hyper phases run are instrumented.
+    file_name : str
+        The name of the .json file in the phase's output folder.
+    """
+
+    def make_analysis_wrapper(make_analysis):
+
+        paths = make_analysis.__self__.paths
+
+        def make_instrumented_analysis(*args, **kwargs):
+
+            analysis = make_analysis(*args, **kwargs)
+
+            fit = analysis.fit
+            instrumented = []
+
+            def instrumented_fit(instance):
+
+                if len(instrumented) > 0:
+                    return fit(instance)
+
+                instrumented.append(True)
+
+                instrumentation = NumbaInstrumentation()
+
+                try:
+                    with instrumentation:
+                        return fit(instance)
+                finally:
+                    instrumentation.output_to_json(
+                        file_path=os.path.join(paths.phase_output_path, file_name)
+                    )
+
+            analysis.fit = instrumented_fit
+
+            return analysis
+
+        return make_instrumented_analysis
+
+    return phase_util.phase_with_method_wrapper(
+        phase=phase, method_name="make_analysis", method_wrapper=make_analysis_wrapper
+    )
+
+
+def instrument_pipeline(pipeline, file_name="numba.json"):
+    """Instrument the first likelihood evaluation of every phase of a pipeline (see *instrument_phase*)."""
+
+    for phase in pipeline.phases:
+        instrument_phase(phase=phase, file_name=file_name)
+
+    return pipeline
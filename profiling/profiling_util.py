@@ -1,37 +1,390 @@
+import functools
+import gc
+import sys
 import time
+import tracemalloc
 
+import numpy as np
 
-def tick_toc_x1(func):
-    def wrapper():
-        start = time.time()
-        for _ in range(1):
-            func()
+clocks = {
+    "perf_counter": time.perf_counter,
+    "process_time": time.process_time,
+    "thread_time": time.thread_time,
+    "time": time.time,
+}
 
-        diff = time.time() - start
-        print("{}: {}".format(func.__name__, diff / 1.0))
 
-    return wrapper
+class TimingResult:
+    def __init__(self, name, samples, value=None):
+        """The run-times of a timed function or block of code, measured over many repeats.
 
+        Parameters
+        ----------
+        name : str
+            The name of the timed function or block of code.
+        samples : [float]
+            The run-time in seconds of every timed repeat.
+        value
+            The value returned by the final timed call of the function (None for a block of code).
+        """
+        self.name = name
+        self.samples = list(samples)
+        self.value = value
 
-def tick_toc_x10(func):
-    def wrapper():
-        start = time.time()
-        for _ in range(10):
-            func()
+    @property
+    def repeats(self):
+        return len(self.samples)
 
-        diff = time.time() - start
-        print("{}: {}".format(func.__name__, diff / 10.0))
+    @property
+    def total(self):
+        return float(np.sum(self.samples))
 
-    return wrapper
+    @property
+    def mean(self):
+        return float(np.mean(self.samples))
 
+    @property
+    def median(self):
+        return float(np.median(self.samples))
 
-def tick_toc_x20(func):
-    def wrapper():
-        start = time.time()
-        for _ in range(10):
-            func()
+    @property
+    def iqr(self):
+        return float(
+            np.percentile(self.samples, 75.0) - np.percentile(self.samples, 25.0)
+        )
 
-        diff = time.time() - start
-        print("{}: {}".format(func.__name__, diff / 20.0))
+    @property
+    def min(self):
+        return float(np.min(self.samples))
 
-    return wrapper
+    @property
+    def max(self):
+        return float(np.max(self.samples))
+
+    @property
+    def dict(self):
+        return {
+            "median": self.median,
+            "iqr": self.iqr,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "repeats": self.repeats,
+            "samples": self.samples,
+        }
+
+    def __str__(self):
+        return "{}: median = {:.6f}s, iqr = {:.6f}s".format(
+            self.name, self.median, self.iqr
+        )
+
+
+class Timer:
+    def __init__(
+        self,
+        name=None,
+        repeats=10,
+        warmup=0,
+        clock="perf_counter",
+        disable_gc=False,
+        verbose=False,
+    ):
+        """Times a function or a block of code, which is used for profiling the run-time of PyAutoLens.
+
+        Every call is timed individually, so that the median and spread of the run-time is available rather than only
+        the total. A timer can be used in three ways:
+
+        - As a decorator, where calling the decorated function performs the *warmup* and *repeats* calls and returns
+          a *TimingResult*:
+
+            @profiling_util.Timer(repeats=10, warmup=1)
+            def curvature_matrix():
+                ...
+
+            result = curvature_matrix()
+
+        - By passing it a function, via its *time* method:
+
+            result = profiling_util.Timer(repeats=10).time(func=curvature_matrix)
+
+        - As a context manager, where every entry of the *with* block adds one sample to its *result*:
+
+            timer = profiling_util.Timer(name="curvature_matrix")
+
+            for i in range(10):
+                with timer:
+                    ...
+
+        Parameters
+        ----------
+        name : str
+            The name of the timed function or block, which defaults to the name of a decorated function.
+        repeats : int
+            The number of timed calls of a function.
+        warmup : int
+            The number of un-timed calls of a function performed before it is timed (e.g. to omit numba JIT
+            compilation from its run-time).
+        clock : str or func
+            The clock used for timing, either a function returning a time in seconds or one of 'perf_counter',
+            'process_time', 'thread_time' or 'time'.
+        disable_gc : bool
+            If True, Python's garbage collector is disabled whilst timing, so its collections are not timed.
+        verbose : bool
+            If True, the timing result is printed after a function or block is timed.
+        """
+
+        if isinstance(clock, str):
+
+            if clock not in clocks:
+                raise ValueError(
+                    "The clock {} is not one of {}".format(clock, list(clocks.keys()))
+                )
+
+            clock = clocks[clock]
+
+        self.name = name
+        self.repeats = repeats
+        self.warmup = warmup
+        self.clock = clock
+        self.disable_gc = disable_gc
+        self.verbose = verbose
+
+        self.samples = []
+        self._start = None
+        self._gc_was_enabled = False
+
+    @property
+    def result(self):
+        return TimingResult(name=self.name, samples=self.samples)
+
+    def _disable_gc(self):
+        self._gc_was_enabled = gc.isenabled()
+        if self.disable_gc:
+            gc.disable()
+
+    def _enable_gc(self):
+        if self.disable_gc and self._gc_was_enabled:
+            gc.enable()
+
+    def time(self, func, *args, **kwargs):
+        """Time the calls of a function, returning a *TimingResult* which contains the run-time of every repeat and
+        the value returned by the function on its final call."""
+
+        for _ in range(self.warmup):
+            func(*args, **kwargs)
+
+        samples = []
+        value = None
+
+        self._disable_gc()
+
+        try:
+            for _ in range(self.repeats):
+                start = self.clock()
+                value = func(*args, **kwargs)
+                samples.append(self.clock() - start)
+        finally:
+            self._enable_gc()
+
+        result = TimingResult(
+            name=self.name or getattr(func, "__name__", None),
+            samples=samples,
+            value=value,
+        )
+
+        if self.verbose:
+            print(result)
+
+        return result
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.time(func, *args, **kwargs)
+
+        if self.name is None:
+            self.name = func.__name__
+
+        return wrapper
+
+    def __enter__(self):
+        self._disable_gc()
+        self._start = self.clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.samples.append(self.clock() - self._start)
+        self._enable_gc()
+
+        if self.verbose:
+            print(self.result)
+
+        return False
+
+
+def rss_gb():
+    """The current resident set size (RSS) of this process in GB, or None if it cannot be measured.
+
+    On Linux this is read from '/proc/self/status', which includes memory allocated outside of Python (e.g. by numba
+    and BLAS)."""
+    return _proc_status_gb(field="VmRSS")
+
+
+def peak_rss_gb():
+    """The peak resident set size (RSS) of this process in GB, since it started or since *reset_peak_rss* was last
+    called."""
+
+    peak = _proc_status_gb(field="VmHWM")
+
+    if peak is not None:
+        return peak
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS, but kilobytes on Linux.
+
+    if sys.platform == "darwin":
+        return max_rss * 1.0e-9
+
+    return max_rss * 1.0e-6
+
+
+def reset_peak_rss():
+    """Reset the peak RSS of this process to its current RSS, which is only possible on Linux. Returns whether the peak
+    was reset."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _proc_status_gb(field):
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return float(line.split()[1]) * 1.0e-6
+    except OSError:
+        return None
+
+    return None
+
+
+class MemoryResult:
+    def __init__(self, name, allocated_peak_gb, rss_peak_gb, rss_increase_gb):
+        """The memory used by a function or block of code.
+
+        Parameters
+        ----------
+        name : str
+            The name of the function or block of code.
+        allocated_peak_gb : float
+            The peak memory allocated by Python and NumPy during the call, measured using tracemalloc. Memory
+            allocated by numba compiled functions or BLAS is not included.
+        rss_peak_gb : float or None
+            The peak resident set size (RSS) of the process during the call, which includes all memory. On platforms
+            where the peak RSS cannot be reset this is the peak of the whole process.
+        rss_increase_gb : float or None
+            The increase in RSS after the call, which is memory the call left allocated (e.g. a returned matrix).
+        """
+        self.name = name
+        self.allocated_peak_gb = allocated_peak_gb
+        self.rss_peak_gb = rss_peak_gb
+        self.rss_increase_gb = rss_increase_gb
+
+    @property
+    def dict(self):
+        return {
+            "allocated_peak_gb": self.allocated_peak_gb,
+            "rss_peak_gb": self.rss_peak_gb,
+            "rss_increase_gb": self.rss_increase_gb,
+        }
+
+    def __str__(self):
+        return "{}: allocated peak = {:.4f} GB, RSS peak = {} GB".format(
+            self.name,
+            self.allocated_peak_gb,
+            "{:.4f}".format(self.rss_peak_gb) if self.rss_peak_gb is not None else "?",
+        )
+
+
+class MemoryTracker:
+    def __init__(self, name=None, verbose=False):
+        """Measures the memory used by a function or block of code, using tracemalloc for the memory allocated by
+        Python and NumPy and the resident set size (RSS) of the process for all memory, including that allocated by
+        numba. A tracker can be used as a context manager or by passing it a function via its *track* method.
+
+        tracemalloc slows down Python code, so memory should be tracked on a separate call to the one that is timed.
+
+        Parameters
+        ----------
+        name : str
+            The name of the tracked function or block.
+        verbose : bool
+            If True, the memory result is printed after a function or block is tracked.
+        """
+        self.name = name
+        self.verbose = verbose
+        self.result = None
+
+        self._started_tracemalloc = False
+        self._allocated_start = 0
+        self._rss_start = None
+
+    def track(self, func, *args, **kwargs):
+        """Track the memory of one call of a function, returning the value it returns. The memory used is available
+        as the tracker's *result*."""
+
+        if self.name is None:
+            self.name = getattr(func, "__name__", None)
+
+        with self:
+            return func(*args, **kwargs)
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+
+        self._allocated_start = tracemalloc.get_traced_memory()[0]
+
+        reset_peak_rss()
+        self._rss_start = rss_gb()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        allocated_peak = tracemalloc.get_traced_memory()[1] - self._allocated_start
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        rss_end = rss_gb()
+
+        if rss_end is not None and self._rss_start is not None:
+            rss_increase = rss_end - self._rss_start
+        else:
+            rss_increase = None
+
+        self.result = MemoryResult(
+            name=self.name,
+            allocated_peak_gb=allocated_peak * 1.0e-9,
+            rss_peak_gb=peak_rss_gb(),
+            rss_increase_gb=rss_increase,
+        )
+
+        if self.verbose:
+            print(self.result)
+
+        return False
@@ -0,0 +1,102 @@
+import json
+import os
+
+from profiling import benchmark_util
+from profiling import sweep_util
+
+# Welcome to the PyAutoLens scaling sweep. Whereas the benchmark runner ('profiling/benchmark.py') times every benchmark
+# at a few fixed settings, the sweep runs one benchmark over a grid of parameters (e.g. data resolution x sub-grid size
+# x PSF shape x source pixels x mask radius), showing how the run-time of every stage scales.
+
+# Every point of the grid is run in its own Python process, so that memory and caches from one point do not affect the
+# next. The median run-time of every stage at every point is output as a scaling table, and a power-law is fitted to
+# every stage giving its complexity exponent with respect to the number of sub-pixels, PSF pixels and source pixels.
+# This shows where stages like the PSF convolution or curvature matrix go superlinear, which informs the choice of
+# 'bin_up_factor' and 'sub_size' in a pipeline.
+
+# The benchmark that is swept, which must be in the 'profiling/imaging' folder.
+
+benchmark_name = "inversion_rectangular_fit"
+
+# The parameter grid, where every entry is a parameter of the benchmark's 'stages' function. Parameters which are
+# omitted use the default value in the benchmark script.
+
+parameter_grid = dict(
+    data_resolution=["lsst", "euclid", "hst"],
+    sub_size=[1, 2, 4],
+    psf_shape_2d=[(5, 5), (11, 11), (21, 21)],
+    pixelization_shape_2d=[(20, 20), (30, 30), (40, 40)],
+    radius=[2.0, 3.0],
+)
+
+# The sizes of the calculation which the run-time of every stage is fitted as a function of. These are taken from the
+# metadata the benchmark records at every point, and sizes a benchmark does not record (e.g. the source pixels of
+# 'profile_image_fit') are skipped.
+
+size_names = ["sub_pixels", "psf_pixels", "source_pixels"]
+
+repeats = 5
+warmup = 1
+track_memory = False
+
+# The sweep is output to the folder 'autolens_workspace/output/profiling/sweep/benchmark_name'.
+
+workspace_path = "{}/../".format(os.path.dirname(os.path.realpath(__file__)))
+output_path = os.path.join(
+    workspace_path, "output", "profiling", "sweep", benchmark_name
+)
+
+if __name__ == "__main__":
+
+    points = sweep_util.points_from_parameter_grid(parameter_grid=parameter_grid)
+
+    print("Number of sweep points = " + str(len(points)) + "\n")
+
+    benchmark_results = []
+
+    for point in points:
+
+        print("Sweep point " + str(point))
+
+        benchmark_results.append(
+            sweep_util.benchmark_in_process_from_point(
+                module_name="profiling.imaging." + benchmark_name,
+                point=point,
+                repeats=repeats,
+                warmup=warmup,
+                track_memory=track_memory,
+            )
+        )
+
+    benchmark_util.output_results_to_json(
+        benchmark_results=benchmark_results,
+        file_path=os.path.join(output_path, "results.json"),
+    )
+
+    rows = sweep_util.scaling_table_from_results(
+        benchmark_results=benchmark_results, size_names=size_names
+    )
+
+    sweep_util.output_scaling_table_to_csv(
+        rows=rows, file_path=os.path.join(output_path, "scaling_table.csv")
+    )
+
+    scaling_exponents = sweep_util.scaling_exponents_from_results(
+        benchmark_results=benchmark_results, size_names=size_names
+    )
+
+    with open(os.path.join(output_path, "scaling_exponents.json"), "w") as f:
+        json.dump(scaling_exponents, f, indent=4)
+
+    print()
+    print("Scaling exponents (run-time ~ size^exponent):\n")
+
+    for stage_name, exponents in scaling_exponents.items():
+        print(
+            stage_name
+            + ": "
+            + ", ".join(
+                "{} = {:.2f}".format(name, exponent)
+                for name, exponent in exponents.items()
+            )
+        )
@@ -0,0 +1,189 @@
+import importlib
+import itertools
+import multiprocessing
+import queue as queue_module
+
+import numpy as np
+
+from profiling import benchmark_util
+
+
+def points_from_parameter_grid(parameter_grid):
+    """Create every benchmark point of a parameter grid, which gives a list of values for every parameter of a
+    benchmark's 'stages' function.
+
+    For example, dict(data_resolution=["lsst", "hst"], sub_size=[1, 2]) gives the 4 points
+    [dict(data_resolution="lsst", sub_size=1), dict(data_resolution="lsst", sub_size=2), ...].
+    """
+    names = list(parameter_grid.keys())
+
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*[parameter_grid[name] for name in names])
+    ]
+
+
+def _run_benchmark_point(module_name, point, repeats, warmup, track_memory, queue):
+
+    module = importlib.import_module(module_name)
+
+    benchmark = benchmark_util.Benchmark(
+        name=module_name.split(".")[-1],
+        repeats=repeats,
+        warmup=warmup,
+        track_memory=track_memory,
+        verbose=False,
+    )
+
+    module.stages(benchmark=benchmark, **point)
+
+    queue.put(dict(benchmark.dict, point=point))
+
+
+def benchmark_in_process_from_point(
+    module_name, point, repeats=10, warmup=1, track_memory=True
+):
+    """Run a benchmark at one point in a new (spawned) Python process, returning its results as a dictionary.
+
+    Every point runs in its own process so that memory, numba compilation and caches left over from one point
+    (e.g. a large PSF's convolver) do not affect the run-time or peak memory of the next point.
+
+    Parameters
+    ----------
+    module_name : str
+        The name of the benchmark module (e.g. 'profiling.imaging.inversion_rectangular_fit').
+    point : dict
+        The parameters passed to the benchmark's 'stages' function.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+
+    process = context.Process(
+        target=_run_benchmark_point,
+        args=(module_name, point, repeats, warmup, track_memory, queue),
+    )
+
+    process.start()
+
+    while True:
+
+        try:
+            result = queue.get(timeout=1.0)
+            break
+        except queue_module.Empty:
+            if not process.is_alive():
+
+                # The process may have put its result on the queue just before it exited and the wait timed out.
+
+                try:
+                    result = queue.get(timeout=1.0)
+                    break
+                except queue_module.Empty:
+                    pass
+
+                raise RuntimeError(
+                    "The benchmark {} failed at the sweep point {}".format(
+                        module_name, point
+                    )
+                )
+
+    process.join()
+
+    return result
+
+
+def scaling_exponents_from_results(benchmark_results, size_names):
+    """Fit how the median run-time of every stage scales with the sizes of the calculation (e.g. the number of
+    sub-pixels, PSF pixels and source pixels) over the points of a sweep.
+
+    A power-law, t = c * size_0^a_0 * size_1^a_1 * ..., is fitted to every stage via linear least-squares in log
+    space, where the exponents a give the complexity of the stage (e.g. an exponent of 1.0 for sub-pixels means the
+    stage is linear in the number of sub-pixels, 2.0 that it is quadratic).
+
+    Sizes which the benchmark does not record in its metadata at every point (e.g. the source pixels of a parametric
+    fit), or which have the same value at every point, are omitted from the fit, because their exponent cannot be
+    measured.
+
+    Parameters
+    ----------
+    benchmark_results : [dict]
+        The results of the benchmark at every point of the sweep.
+    size_names : [str]
+        The names of the sizes in each benchmark's metadata which the run-times are fitted as a function of.
+    """
+
+    size_names = [
+        name
+        for name in size_names
+        if all(name in result["metadata"] for result in benchmark_results)
+        and len(set(result["metadata"][name] for result in benchmark_results)) > 1
+    ]
+
+    stage_names = [
+        name
+        for name in benchmark_results[0]["stages"]
+        if all(name in result["stages"] for result in benchmark_results)
+    ]
+
+    log_sizes = np.array(
+        [
+            [np.log(result["metadata"][name]) for name in size_names]
+            for result in benchmark_results
+        ]
+    ).reshape(len(benchmark_results), len(size_names))
+
+    design_matrix = np.hstack((np.ones((len(benchmark_results), 1)), log_sizes))
+
+    scaling_exponents = {}
+
+    for stage_name in stage_names:
+
+        log_times = np.log(
+            [
+                max(result["stages"][stage_name]["median"], 1.0e-12)
+                for result in benchmark_results
+            ]
+        )
+
+        coefficients = np.linalg.lstsq(design_matrix, log_times, rcond=None)[0]
+
+        scaling_exponents[stage_name] = {
+            name: float(exponent)
+            for name, exponent in zip(size_names, coefficients[1:])
+        }
+
+    return scaling_exponents
+
+
+def scaling_table_from_results(benchmark_results, size_names):
+    """Create a table of the median run-time of every stage at every point of a sweep, as a list of rows where the
+    first row is the header."""
+
+    stage_names = list(benchmark_results[0]["stages"].keys())
+    parameter_names = list(benchmark_results[0]["point"].keys())
+
+    rows = [parameter_names + size_names + stage_names]
+
+    for result in benchmark_results:
+        rows.append(
+            [
+                benchmark_util.tag_from_point(point={name: result["point"][name]})
+                for name in parameter_names
+            ]
+            + [str(result["metadata"].get(name, "")) for name in size_names]
+            + [
+                "{:.6f}".format(result["stages"][name]["median"])
+                if name in result["stages"]
+                else ""
+                for name in stage_names
+            ]
+        )
+
+    return rows
+
+
+def output_scaling_table_to_csv(rows, file_path):
+
+    with open(file_path, "w") as f:
+        for row in rows:
+            f.write(",".join(row) + "\n")
@@ -0,0 +1,1302 @@
+import contextlib
+import hashlib
+import os
+import socket
+import time
+import uuid
+
+import numpy as np
+
+import autoarray as aa
+from autoarray import decorator_util
+from autoarray.operators import transformer as transformer_module
+
+from tools import phase_util
+
+
+def es_kernel_from_width(kernel_width, oversampling_factor):
+    """The 'exponential of semicircle' (ES) gridding kernel of Barnett et al. (2019), as used by FINUFFT, which is
+    exp(beta * (sqrt(1 - (2t / w)^2) - 1)) for |t| < w / 2, where t is in units of the oversampled grid's pixels."""
+
+    beta = 0.97 * np.pi * (1.0 - 1.0 / (2.0 * oversampling_factor)) * kernel_width
+
+    def kernel(t):
+        s = np.clip(1.0 - (2.0 * t / kernel_width) ** 2, 0.0, None)
+        return np.where(
+            np.abs(t) < kernel_width / 2.0, np.exp(beta * (np.sqrt(s) - 1.0)), 0.0
+        )
+
+    return kernel
+
+
+def kaiser_bessel_kernel_from_width(kernel_width, oversampling_factor):
+    """The Kaiser-Bessel gridding kernel with the shape parameter beta of Beatty et al. (2005), which is
+    I0(beta * sqrt(1 - (2t / w)^2)) / I0(beta) for |t| < w / 2."""
+
+    beta = np.pi * np.sqrt(
+        (kernel_width / oversampling_factor) ** 2 * (oversampling_factor - 0.5) ** 2
+        - 0.8
+    )
+
+    def kernel(t):
+        s = np.clip(1.0 - (2.0 * t / kernel_width) ** 2, 0.0, None)
+        return np.where(
+            np.abs(t) < kernel_width / 2.0, np.i0(beta * np.sqrt(s)) / np.i0(beta), 0.0
+        )
+
+    return kernel
+
+
+kernels = {
+    "exponential_semicircle": es_kernel_from_width,
+    "kaiser_bessel": kaiser_bessel_kernel_from_width,
+}
+
+
+def kernel_fourier_transform_from_kernel(kernel, kernel_width, frequencies):
+    """The Fourier transform of a (real and symmetric) gridding kernel at the given frequencies, in cycles per
+    oversampled pixel, computed via Gauss-Legendre quadrature over the kernel's support."""
+
+    nodes, weights = np.polynomial.legendre.leggauss(100)
+
+    t = 0.5 * kernel_width * nodes
+    weights = 0.5 * kernel_width * weights * kernel(t)
+
+    return np.cos(2.0 * np.pi * np.outer(frequencies, t)) @ weights
+
+
+def fast_fft_length_from_length(length):
+    """The smallest even integer greater than or equal to *length* whose only prime factors are 2, 3 and 5, for
+    which the FFT is fastest."""
+
+    fft_length = max(int(np.ceil(length)), 2)
+
+    while True:
+
+        if fft_length % 2 == 0:
+
+            remainder = fft_length
+
+            for factor in (2, 3, 5):
+                while remainder % factor == 0:
+                    remainder //= factor
+
+            if remainder == 1:
+                return fft_length
+
+        fft_length += 1
+
+
+def pixel_indexes_from_coordinates(coordinates):
+    """Compute the integer index of every pixel of a uniform grid along one axis from its coordinates, returning the
+    indexes, the number of pixels along the axis, the pixel scale and the coordinate of the index 0."""
+
+    minimum = np.min(coordinates)
+    differences = np.diff(np.unique(coordinates))
+
+    # Coordinates of the same row or column may differ by round-off, which is far smaller than the pixel scale.
+
+    differences = differences[differences > 1.0e-6 * (np.ptp(coordinates) + 1.0e-300)]
+
+    if differences.shape[0] == 0:
+        return np.zeros(coordinates.shape[0], dtype="int"), 1, 1.0, minimum
+
+    pixel_scale = np.min(differences)
+    indexes = (coordinates - minimum) / pixel_scale
+
+    if np.max(np.abs(indexes - np.round(indexes))) > 1.0e-4:
+        raise ValueError(
+            "The NUFFT transformer requires a grid whose pixels lie on a uniform grid."
+        )
+
+    indexes = np.round(indexes).astype("int")
+
+    return indexes, np.max(indexes) + 1, pixel_scale, minimum
+
+
+def interpolation_starts_and_weights_from_frequencies(
+    frequencies, oversampled_length, kernel, kernel_width
+):
+    """For every visibility, compute the first oversampled FFT pixel its kernel overlaps along one axis and the
+    kernel's weight for each of the *kernel_width* pixels it overlaps, where *frequencies* are in cycles per pixel of
+    the (non-oversampled) image."""
+
+    positions = oversampled_length * frequencies
+
+    starts = np.floor(positions - kernel_width / 2.0).astype("int") + 1
+
+    weights = kernel(
+        positions[:, None] - (starts[:, None] + np.arange(kernel_width)[None, :])
+    )
+
+    return starts % oversampled_length, weights
+
+
+@decorator_util.jit()
+def visibilities_from_oversampled_fft_jit(
+    oversampled_fft, y_starts, y_weights, x_starts, x_weights, phase_shifts
+):
+    """Interpolate the visibilities from the FFT of the oversampled image by convolving it with the gridding kernel
+    at every uv-wavelength."""
+
+    visibilities = np.zeros(y_starts.shape[0], dtype=np.complex128)
+
+    y_length = oversampled_fft.shape[0]
+    x_length = oversampled_fft.shape[1]
+
+    for vis_1d_index in range(y_starts.shape[0]):
+
+        value = 0.0j
+
+        for y_kernel_index in range(y_weights.shape[1]):
+
+            y = (y_starts[vis_1d_index] + y_kernel_index) % y_length
+
+            row_value = 0.0j
+
+            for x_kernel_index in range(x_weights.shape[1]):
+
+                x = (x_starts[vis_1d_index] + x_kernel_index) % x_length
+
+                row_value += (
+                    x_weights[vis_1d_index, x_kernel_index] * oversampled_fft[y, x]
+                )
+
+            value += y_weights[vis_1d_index, y_kernel_index] * row_value
+
+        visibilities[vis_1d_index] = value * phase_shifts[vis_1d_index]
+
+    return visibilities
+
+
+@decorator_util.jit()
+def transformed_columns_from_oversampled_ffts_jit(
+    oversampled_ffts, y_starts, y_weights, x_starts, x_weights, phase_shifts
+):
+    """Interpolate the visibilities of many images (e.g. the columns of a mapping matrix) from their oversampled FFTs,
+    which are stacked along the last axis, returning a (total_visibilities, total_columns) matrix."""
+
+    total_columns = oversampled_ffts.shape[2]
+
+    transformed_columns = np.zeros(
+        (y_starts.shape[0], total_columns), dtype=np.complex128
+    )
+
+    y_length = oversampled_ffts.shape[0]
+    x_length = oversampled_ffts.shape[1]
+
+    for vis_1d_index in range(y_starts.shape[0]):
+
+        for y_kernel_index in range(y_weights.shape[1]):
+
+            y = (y_starts[vis_1d_index] + y_kernel_index) % y_length
+
+            for x_kernel_index in range(x_weights.shape[1]):
+
+                x = (x_starts[vis_1d_index] + x_kernel_index) % x_length
+
+                weight = (
+                    y_weights[vis_1d_index, y_kernel_index]
+                    * x_weights[vis_1d_index, x_kernel_index]
+                )
+
+                for column_index in range(total_columns):
+                    transformed_columns[vis_1d_index, column_index] += (
+                        weight * oversampled_ffts[y, x, column_index]
+                    )
+
+        for column_index in range(total_columns):
+            transformed_columns[vis_1d_index, column_index] *= phase_shifts[
+                vis_1d_index
+            ]
+
+    return transformed_columns
+
+
+class TransformerNUFFT:
+    def __init__(
+        self,
+        uv_wavelengths,
+        grid_radians,
+        kernel="exponential_semicircle",
+        kernel_width=7,
+        oversampling_factor=2.0,
+        columns_per_chunk=64,
+    ):
+        """Computes the visibilities of an image via a non-uniform fast Fourier transform (NUFFT), which has the same
+        interface as the PyAutoLens transformer (*al.transformer*) and can be used in its place.
+
+        The image is divided by the Fourier transform of a gridding kernel, zero-padded to a grid *oversampling_factor*
+        times larger, transformed via an FFT and then interpolated to every uv-wavelength by convolving it with the
+        kernel. This takes O(N log N + M * kernel_width^2) operations for N image pixels and M visibilities, compared
+        to O(N * M) for the direct transform, and the only memory it preloads is the kernel's weights for every
+        visibility, compared to the two (N, M) matrices of *preload_transform=True*.
+
+        The NUFFT agrees with the direct transform to a relative tolerance set by the kernel width. For an
+        oversampling factor of 2 and the ES kernel, the maximum error of the visibilities relative to the largest
+        visibility is ~1e-4 for kernel_width=5, ~1e-6 for kernel_width=7 (the default) and ~1e-9 for
+        kernel_width=10, which 'profiling/funcs/interferometer/transforms/visibilities_via_nufft.py' checks.
+
+        Parameters
+        ----------
+        uv_wavelengths : np.ndarray
+            The (u, v) wavelengths of the visibilities, with shape (total_visibilities, 2).
+        grid_radians : al.grid
+            The (y, x) coordinates of the image pixels in radians, which must lie on a uniform grid.
+        kernel : str
+            The gridding kernel, 'exponential_semicircle' or 'kaiser_bessel'.
+        kernel_width : int
+            The width of the gridding kernel in oversampled pixels, which sets the accuracy of the NUFFT.
+        oversampling_factor : float
+            The factor the image is zero-padded by before the FFT.
+        columns_per_chunk : int
+            The number of mapping matrix columns transformed together, which bounds the memory used by the FFTs of
+            the transformed mapping matrices.
+        """
+
+        if kernel not in kernels:
+            raise ValueError(
+                "The NUFFT kernel must be one of {}, not {}".format(
+                    list(kernels.keys()), kernel
+                )
+            )
+
+        self.uv_wavelengths = uv_wavelengths.astype("float")
+        self.grid_radians = grid_radians.in_1d_binned
+
+        self.total_visibilities = uv_wavelengths.shape[0]
+        self.total_image_pixels = grid_radians.shape_1d
+
+        self.preload_transform = False
+
+        self.kernel = kernel
+        self.kernel_width = kernel_width
+        self.oversampling_factor = oversampling_factor
+        self.columns_per_chunk = columns_per_chunk
+
+        kernel_func = kernels[kernel](
+            kernel_width=kernel_width, oversampling_factor=oversampling_factor
+        )
+
+        y_indexes, y_pixels, y_pixel_scale, y_minimum = pixel_indexes_from_coordinates(
+            coordinates=np.asarray(self.grid_radians)[:, 0]
+        )
+        x_indexes, x_pixels, x_pixel_scale, x_minimum = pixel_indexes_from_coordinates(
+            coordinates=np.asarray(self.grid_radians)[:, 1]
+        )
+
+        self.oversampled_shape = (
+            fast_fft_length_from_length(
+                max(oversampling_factor * y_pixels, 2 * kernel_width)
+            ),
+            fast_fft_length_from_length(
+                max(oversampling_factor * x_pixels, 2 * kernel_width)
+            ),
+        )
+
+        # Pixel indexes are taken relative to the centre of the image, so that the kernel's Fourier transform, which
+        # is largest at zero frequency, divides the image symmetrically.
+
+        y_indexes = y_indexes - y_pixels // 2
+        x_indexes = x_indexes - x_pixels // 2
+
+        self.oversampled_indexes = (y_indexes % self.oversampled_shape[0]) * (
+            self.oversampled_shape[1]
+        ) + (x_indexes % self.oversampled_shape[1])
+
+        self.grid_correction = 1.0 / (
+            kernel_fourier_transform_from_kernel(
+                kernel=kernel_func,
+                kernel_width=kernel_width,
+                frequencies=y_indexes / self.oversampled_shape[0],
+            )
+            * kernel_fourier_transform_from_kernel(
+                kernel=kernel_func,
+                kernel_width=kernel_width,
+                frequencies=x_indexes / self.oversampled_shape[1],
+            )
+        )
+
+        self.y_starts, self.y_weights = interpolation_starts_and_weights_from_frequencies(
+            frequencies=self.uv_wavelengths[:, 1] * y_pixel_scale,
+            oversampled_length=self.oversampled_shape[0],
+            kernel=kernel_func,
+            kernel_width=kernel_width,
+        )
+
+        self.x_starts, self.x_weights = interpolation_starts_and_weights_from_frequencies(
+            frequencies=self.uv_wavelengths[:, 0] * x_pixel_scale,
+            oversampled_length=self.oversampled_shape[1],
+            kernel=kernel_func,
+            kernel_width=kernel_width,
+        )
+
+        y_centre = y_minimum + (y_pixels // 2) * y_pixel_scale
+        x_centre = x_minimum + (x_pixels // 2) * x_pixel_scale
+
+        self.phase_shifts = np.exp(
+            -2.0j
+            * np.pi
+            * (
+                self.uv_wavelengths[:, 0] * x_centre
+                + self.uv_wavelengths[:, 1] * y_centre
+            )
+        )
+
+    def complex_visibilities_from_image(self, image):
+
+        oversampled_image = np.zeros(
+            self.oversampled_shape[0] * self.oversampled_shape[1], dtype="complex"
+        )
+
+        oversampled_image[self.oversampled_indexes] = (
+            np.asarray(image.in_1d_binned) * self.grid_correction
+        )
+
+        return visibilities_from_oversampled_fft_jit(
+            oversampled_fft=np.fft.fft2(oversampled_image.reshape(self.oversampled_shape)),
+            y_starts=self.y_starts,
+            y_weights=self.y_weights,
+            x_starts=self.x_starts,
+            x_weights=self.x_weights,
+            phase_shifts=self.phase_shifts,
+        )
+
+    def real_visibilities_from_image(self, image):
+        return self.complex_visibilities_from_image(image=image).real
+
+    def imag_visibilities_from_image(self, image):
+        return self.complex_visibilities_from_image(image=image).imag
+
+    def visibilities_from_image(self, image):
+
+        visibilities = self.complex_visibilities_from_image(image=image)
+
+        return aa.visibilities.manual_1d(
+            visibilities=np.stack((visibilities.real, visibilities.imag), axis=-1)
+        )
+
+    def complex_transformed_mapping_matrix_from_mapping_matrix(self, mapping_matrix):
+
+        total_columns = mapping_matrix.shape[1]
+
+        transformed_mapping_matrix = np.zeros(
+            (self.total_visibilities, total_columns), dtype="complex"
+        )
+
+        for column_start in range(0, total_columns, self.columns_per_chunk):
+
+            columns = slice(
+                column_start, min(column_start + self.columns_per_chunk, total_columns)
+            )
+
+            oversampled_images = np.zeros(
+                (
+                    self.oversampled_shape[0] * self.oversampled_shape[1],
+                    columns.stop - columns.start,
+                ),
+                dtype="complex",
+            )
+
+            oversampled_images[self.oversampled_indexes, :] = (
+                mapping_matrix[:, columns] * self.grid_correction[:, None]
+            )
+
+            oversampled_ffts = np.fft.fft2(
+                oversampled_images.reshape(self.oversampled_shape + (-1,)), axes=(0, 1)
+            )
+
+            transformed_mapping_matrix[
+                :, columns
+            ] = transformed_columns_from_oversampled_ffts_jit(
+                oversampled_ffts=oversampled_ffts,
+                y_starts=self.y_starts,
+                y_weights=self.y_weights,
+                x_starts=self.x_starts,
+                x_weights=self.x_weights,
+                phase_shifts=self.phase_shifts,
+            )
+
+        return transformed_mapping_matrix
+
+    def real_transformed_mapping_matrix_from_mapping_matrix(self, mapping_matrix):
+        return self.complex_transformed_mapping_matrix_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        ).real
+
+    def imag_transformed_mapping_matrix_from_mapping_matrix(self, mapping_matrix):
+        return self.complex_transformed_mapping_matrix_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        ).imag
+
+    def transformed_mapping_matrices_from_mapping_matrix(self, mapping_matrix):
+
+        transformed_mapping_matrix = self.complex_transformed_mapping_matrix_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        )
+
+        return [transformed_mapping_matrix.real, transformed_mapping_matrix.imag]
+
+
+@decorator_util.jit()
+def complex_visibilities_jit(image_1d, grid_radians, uv_wavelengths):
+    """Compute the complex visibilities of an image via the direct transform, evaluating the phase and its sine and
+    cosine once for every (pixel, visibility) pair instead of separately for the real and imaginary visibilities."""
+
+    visibilities = np.zeros(uv_wavelengths.shape[0], dtype=np.complex128)
+
+    for vis_1d_index in range(uv_wavelengths.shape[0]):
+
+        real_value = 0.0
+        imag_value = 0.0
+
+        for image_1d_index in range(image_1d.shape[0]):
+
+            phase = (
+                -2.0
+                * np.pi
+                * (
+                    grid_radians[image_1d_index, 1] * uv_wavelengths[vis_1d_index, 0]
+                    + grid_radians[image_1d_index, 0] * uv_wavelengths[vis_1d_index, 1]
+                )
+            )
+
+            real_value += image_1d[image_1d_index] * np.cos(phase)
+            imag_value += image_1d[image_1d_index] * np.sin(phase)
+
+        visibilities[vis_1d_index] = real_value + 1.0j * imag_value
+
+    return visibilities
+
+
+@decorator_util.jit()
+def preload_complex_transforms_jit(grid_radians, uv_wavelengths):
+    """Preload the complex transforms exp(-2 pi i (x u + y v)) of every (pixel, visibility) pair as one
+    (total_image_pixels, total_visibilities) complex matrix, evaluating the phase once for its real and imaginary
+    parts."""
+
+    preloaded_transforms = np.zeros(
+        (grid_radians.shape[0], uv_wavelengths.shape[0]), dtype=np.complex128
+    )
+
+    for image_1d_index in range(grid_radians.shape[0]):
+        for vis_1d_index in range(uv_wavelengths.shape[0]):
+
+            phase = (
+                -2.0
+                * np.pi
+                * (
+                    grid_radians[image_1d_index, 1] * uv_wavelengths[vis_1d_index, 0]
+                    + grid_radians[image_1d_index, 0] * uv_wavelengths[vis_1d_index, 1]
+                )
+            )
+
+            preloaded_transforms[image_1d_index, vis_1d_index] = np.cos(
+                phase
+            ) + 1.0j * np.sin(phase)
+
+    return preloaded_transforms
+
+
+@decorator_util.jit()
+def complex_transformed_mapping_matrix_jit(mapping_matrix, grid_radians, uv_wavelengths):
+    """Compute the complex transformed mapping matrix via the direct transform, evaluating the phase of every
+    (pixel, visibility) pair once for all source pixels the image pixel maps to and for the real and imaginary
+    parts."""
+
+    transformed_mapping_matrix = np.zeros(
+        (uv_wavelengths.shape[0], mapping_matrix.shape[1]), dtype=np.complex128
+    )
+
+    for image_1d_index in range(mapping_matrix.shape[0]):
+
+        for vis_1d_index in range(uv_wavelengths.shape[0]):
+
+            phase = (
+                -2.0
+                * np.pi
+                * (
+                    grid_radians[image_1d_index, 1] * uv_wavelengths[vis_1d_index, 0]
+                    + grid_radians[image_1d_index, 0] * uv_wavelengths[vis_1d_index, 1]
+                )
+            )
+
+            transform = np.cos(phase) + 1.0j * np.sin(phase)
+
+            for pix_1d_index in range(mapping_matrix.shape[1]):
+
+                value = mapping_matrix[image_1d_index, pix_1d_index]
+
+                if value > 0:
+                    transformed_mapping_matrix[vis_1d_index, pix_1d_index] += (
+                        value * transform
+                    )
+
+    return transformed_mapping_matrix
+
+
+class TransformerFused:
+    def __init__(self, uv_wavelengths, grid_radians, preload_transform=True):
+        """The PyAutoLens transformer (*al.transformer*), but computing the real and imaginary visibilities (and
+        transformed mapping matrices) together in one pass, so that the phase of every (pixel, visibility) pair and
+        its sine and cosine are evaluated once rather than twice. It has the same interface as *al.transformer* and
+        can be used in its place.
+
+        If *preload_transform* is True, the transforms are preloaded as one complex matrix (the same memory as the
+        separate real and imaginary matrices of *al.transformer*), and the visibilities and transformed mapping
+        matrices are computed from it via complex matrix multiplications.
+
+        Parameters
+        ----------
+        uv_wavelengths : np.ndarray
+            The (u, v) wavelengths of the visibilities, with shape (total_visibilities, 2).
+        grid_radians : al.grid
+            The (y, x) coordinates of the image pixels in radians.
+        preload_transform : bool
+            If True, the complex transforms of every (pixel, visibility) pair are preloaded.
+        """
+
+        self.uv_wavelengths = uv_wavelengths.astype("float")
+        self.grid_radians = grid_radians.in_1d_binned
+
+        self.total_visibilities = uv_wavelengths.shape[0]
+        self.total_image_pixels = grid_radians.shape_1d
+
+        self.preload_transform = preload_transform
+
+        if preload_transform:
+
+            self.preload_transforms = preload_complex_transforms_jit(
+                grid_radians=np.asarray(self.grid_radians),
+                uv_wavelengths=self.uv_wavelengths,
+            )
+
+    def complex_visibilities_from_image(self, image):
+
+        if self.preload_transform:
+            return np.asarray(image.in_1d_binned) @ self.preload_transforms
+
+        return complex_visibilities_jit(
+            image_1d=np.asarray(image.in_1d_binned),
+            grid_radians=np.asarray(self.grid_radians),
+            uv_wavelengths=self.uv_wavelengths,
+        )
+
+    def real_visibilities_from_image(self, image):
+        return self.complex_visibilities_from_image(image=image).real
+
+    def imag_visibilities_from_image(self, image):
+        return self.complex_visibilities_from_image(image=image).imag
+
+    def visibilities_from_image(self, image):
+
+        visibilities = self.complex_visibilities_from_image(image=image)
+
+        return aa.visibilities.manual_1d(
+            visibilities=np.stack((visibilities.real, visibilities.imag), axis=-1)
+        )
+
+    def complex_transformed_mapping_matrix_from_mapping_matrix(self, mapping_matrix):
+
+        if self.preload_transform:
+            return self.preload_transforms.T @ mapping_matrix
+
+        return complex_transformed_mapping_matrix_jit(
+            mapping_matrix=mapping_matrix,
+            grid_radians=np.asarray(self.grid_radians),
+            uv_wavelengths=self.uv_wavelengths,
+        )
+
+    def real_transformed_mapping_matrix_from_mapping_matrix(self, mapping_matrix):
+        return self.complex_transformed_mapping_matrix_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        ).real
+
+    def imag_transformed_mapping_matrix_from_mapping_matrix(self, mapping_matrix):
+        return self.complex_transformed_mapping_matrix_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        ).imag
+
+    def transformed_mapping_matrices_from_mapping_matrix(self, mapping_matrix):
+
+        transformed_mapping_matrix = self.complex_transformed_mapping_matrix_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        )
+
+        return [transformed_mapping_matrix.real, transformed_mapping_matrix.imag]
+
+
+def mask_1d_index_for_sub_mask_1d_index_from_mask(mask):
+    """The index of the unmasked image pixel every unmasked sub-pixel of a mask is in, via the public mask util of
+    autoarray (the mask's regions memoize the same array, but only as a private attribute)."""
+
+    return aa.util.mask.mask_1d_index_for_sub_mask_1d_index_via_mask_2d(
+        mask_2d=mask, sub_size=mask.sub_size
+    ).astype("int")
+
+
+def sparse_mapping_from_mapper(mapper):
+    """Compute the mappings of a mapper between the image pixels and source pixels in compressed sparse row (CSR)
+    form, which holds only the non-zero entries of its mapping matrix.
+
+    Every sub-pixel maps to one source pixel, so an image pixel maps to at most sub_size^2 source pixels and the
+    dense (total_image_pixels, total_source_pixels) mapping matrix is almost entirely zeros. The sub-pixels of an image
+    pixel which map to the same source pixel are combined into one entry.
+
+    Returns
+    -------
+    image_pixel_starts : np.ndarray
+        The entries of image pixel i are image_pixel_starts[i]:image_pixel_starts[i + 1].
+    source_indexes : np.ndarray
+        The source pixel of every entry.
+    weights : np.ndarray
+        The value of every entry, which is the fraction of the image pixel's sub-pixels mapping to the source pixel.
+    """
+
+    image_indexes = mask_1d_index_for_sub_mask_1d_index_from_mask(
+        mask=mapper.grid.mask
+    )
+    source_indexes = np.asarray(
+        mapper.pixelization_1d_index_for_sub_mask_1d_index, dtype="int"
+    )
+
+    keys, counts = np.unique(
+        image_indexes * mapper.pixels + source_indexes, return_counts=True
+    )
+
+    total_image_pixels = mapper.grid.mask.pixels_in_mask
+
+    image_pixel_starts = np.searchsorted(
+        keys // mapper.pixels, np.arange(total_image_pixels + 1)
+    )
+
+    return (
+        image_pixel_starts,
+        keys % mapper.pixels,
+        counts * mapper.grid.mask.sub_fraction,
+    )
+
+
+@decorator_util.jit()
+def transformed_mapping_matrix_from_sparse_mapping_via_preload_jit(
+    image_pixel_starts, source_indexes, weights, pixels, preloaded_transforms
+):
+    """Compute the transformed mapping matrix from the sparse mappings of a mapper (see *sparse_mapping_from_mapper*)
+    and preloaded (real, imaginary or complex) transforms, by adding the transform of every image pixel to the
+    columns of the source pixels it maps to.
+
+    This takes O(total_entries * total_visibilities) operations and never creates the dense mapping matrix. The
+    matrix is computed as (pixels, total_visibilities) so that every row is written contiguously, and the transposed
+    (total_visibilities, pixels) matrix is returned."""
+
+    transformed_mapping_matrix = np.zeros(
+        (pixels, preloaded_transforms.shape[1]), dtype=preloaded_transforms.dtype
+    )
+
+    for image_1d_index in range(image_pixel_starts.shape[0] - 1):
+        for entry_index in range(
+            image_pixel_starts[image_1d_index], image_pixel_starts[image_1d_index + 1]
+        ):
+
+            pix_1d_index = source_indexes[entry_index]
+            weight = weights[entry_index]
+
+            for vis_1d_index in range(preloaded_transforms.shape[1]):
+                transformed_mapping_matrix[pix_1d_index, vis_1d_index] += (
+                    weight * preloaded_transforms[image_1d_index, vis_1d_index]
+                )
+
+    return transformed_mapping_matrix.T
+
+
+@decorator_util.jit()
+def complex_transformed_mapping_matrix_from_sparse_mapping_jit(
+    image_pixel_starts, source_indexes, weights, pixels, grid_radians, uv_wavelengths
+):
+    """Compute the complex transformed mapping matrix from the sparse mappings of a mapper via the direct transform,
+    evaluating the phase of every (pixel, visibility) pair once, only for image pixels which map to a source pixel."""
+
+    transformed_mapping_matrix = np.zeros(
+        (pixels, uv_wavelengths.shape[0]), dtype=np.complex128
+    )
+
+    for image_1d_index in range(image_pixel_starts.shape[0] - 1):
+
+        entry_start = image_pixel_starts[image_1d_index]
+        entry_end = image_pixel_starts[image_1d_index + 1]
+
+        if entry_start == entry_end:
+            continue
+
+        for vis_1d_index in range(uv_wavelengths.shape[0]):
+
+            phase = (
+                -2.0
+                * np.pi
+                * (
+                    grid_radians[image_1d_index, 1] * uv_wavelengths[vis_1d_index, 0]
+                    + grid_radians[image_1d_index, 0] * uv_wavelengths[vis_1d_index, 1]
+                )
+            )
+
+            transform = np.cos(phase) + 1.0j * np.sin(phase)
+
+            for entry_index in range(entry_start, entry_end):
+                transformed_mapping_matrix[
+                    source_indexes[entry_index], vis_1d_index
+                ] += (weights[entry_index] * transform)
+
+    return transformed_mapping_matrix.T
+
+
+def transformed_mapping_matrices_from_mapper(transformer, mapper):
+    """Compute the real and imaginary transformed mapping matrices of a mapper from its sparse mappings (see
+    *sparse_mapping_from_mapper*), without creating its dense mapping matrix.
+
+    This gives the same result as *transformer.transformed_mapping_matrices_from_mapping_matrix(mapper.mapping_matrix)*
+    for the PyAutoLens transformer (*al.transformer*), with or without preloaded transforms, and the fused
+    transformer (*TransformerFused*).
+    """
+
+    image_pixel_starts, source_indexes, weights = sparse_mapping_from_mapper(
+        mapper=mapper
+    )
+
+    if getattr(transformer, "preload_transform", False):
+
+        if hasattr(transformer, "preload_transforms"):
+            transformed_mapping_matrix = transformed_mapping_matrix_from_sparse_mapping_via_preload_jit(
+                image_pixel_starts=image_pixel_starts,
+                source_indexes=source_indexes,
+                weights=weights,
+                pixels=mapper.pixels,
+                preloaded_transforms=transformer.preload_transforms,
+            )
+
+            return [
+                np.ascontiguousarray(transformed_mapping_matrix.real),
+                np.ascontiguousarray(transformed_mapping_matrix.imag),
+            ]
+
+        return [
+            np.ascontiguousarray(
+                transformed_mapping_matrix_from_sparse_mapping_via_preload_jit(
+                    image_pixel_starts=image_pixel_starts,
+                    source_indexes=source_indexes,
+                    weights=weights,
+                    pixels=mapper.pixels,
+                    preloaded_transforms=preloaded_transforms,
+                )
+            )
+            for preloaded_transforms in (
+                transformer.preload_real_transforms,
+                transformer.preload_imag_transforms,
+            )
+        ]
+
+    transformed_mapping_matrix = complex_transformed_mapping_matrix_from_sparse_mapping_jit(
+        image_pixel_starts=image_pixel_starts,
+        source_indexes=source_indexes,
+        weights=weights,
+        pixels=mapper.pixels,
+        grid_radians=np.asarray(transformer.grid_radians),
+        uv_wavelengths=transformer.uv_wavelengths,
+    )
+
+    return [
+        np.ascontiguousarray(transformed_mapping_matrix.real),
+        np.ascontiguousarray(transformed_mapping_matrix.imag),
+    ]
+
+
+@decorator_util.jit()
+def preload_transforms_of_chunk_jit(grid_radians, uv_wavelengths, vis_start, vis_end):
+    """Preload the real and imaginary transforms of the chunk of visibilities vis_start:vis_end, returning two
+    (total_image_pixels, vis_end - vis_start) matrices."""
+
+    preloaded_reals = np.zeros((grid_radians.shape[0], vis_end - vis_start))
+    preloaded_imags = np.zeros((grid_radians.shape[0], vis_end - vis_start))
+
+    for image_1d_index in range(grid_radians.shape[0]):
+        for vis_1d_index in range(vis_start, vis_end):
+
+            phase = (
+                -2.0
+                * np.pi
+                * (
+                    grid_radians[image_1d_index, 1] * uv_wavelengths[vis_1d_index, 0]
+                    + grid_radians[image_1d_index, 0] * uv_wavelengths[vis_1d_index, 1]
+                )
+            )
+
+            preloaded_reals[image_1d_index, vis_1d_index - vis_start] = np.cos(phase)
+            preloaded_imags[image_1d_index, vis_1d_index - vis_start] = np.sin(phase)
+
+    return preloaded_reals, preloaded_imags
+
+
+class TransformerChunked:
+    def __init__(self, uv_wavelengths, grid_radians, memory_budget_gb=1.0):
+        """Computes the visibilities of an image via the preloaded transforms of the direct transformer, but preloads
+        them for one chunk of visibilities at a time, so that the full (total_image_pixels, total_visibilities)
+        matrices are never stored. It has the same interface as the PyAutoLens transformer (*al.transformer*) and
+        can be used in its place.
+
+        The number of visibilities in a chunk is the largest for which the chunk's transforms (and, for an inversion,
+        its transformed mapping matrices) fit within *memory_budget_gb*. Every chunk is used for everything an
+        inversion needs from it, so the data vector and curvature matrix can be computed in one pass over the chunks
+        (see *data_vector_and_curvature_matrix_from_mapping_matrix*), without storing the transformed mapping
+        matrices either.
+
+        Parameters
+        ----------
+        uv_wavelengths : np.ndarray
+            The (u, v) wavelengths of the visibilities, with shape (total_visibilities, 2).
+        grid_radians : al.grid
+            The (y, x) coordinates of the image pixels in radians.
+        memory_budget_gb : float
+            The memory in GB the transforms (and transformed mapping matrices) of a chunk may use.
+        """
+
+        self.uv_wavelengths = uv_wavelengths.astype("float")
+        self.grid_radians = grid_radians.in_1d_binned
+
+        self.total_visibilities = uv_wavelengths.shape[0]
+        self.total_image_pixels = grid_radians.shape_1d
+
+        self.preload_transform = False
+
+        self.memory_budget_gb = memory_budget_gb
+
+    def visibilities_per_chunk_from_total_columns(self, total_columns=0):
+        """The number of visibilities in a chunk for which its real and imaginary transforms, and the real and
+        imaginary transformed mapping matrices of *total_columns* source pixels, fit within the memory budget."""
+
+        bytes_per_visibility = 8 * 2 * (self.total_image_pixels + total_columns)
+
+        return int(
+            min(
+                max(self.memory_budget_gb * 1.0e9 // bytes_per_visibility, 1),
+                self.total_visibilities,
+            )
+        )
+
+    def chunks_from_total_columns(self, total_columns=0):
+        """Iterate over the chunks of visibilities, yielding every chunk's slice and preloaded real and imaginary
+        transforms."""
+
+        visibilities_per_chunk = self.visibilities_per_chunk_from_total_columns(
+            total_columns=total_columns
+        )
+
+        for vis_start in range(0, self.total_visibilities, visibilities_per_chunk):
+
+            vis_end = min(vis_start + visibilities_per_chunk, self.total_visibilities)
+
+            preloaded_reals, preloaded_imags = preload_transforms_of_chunk_jit(
+                grid_radians=np.asarray(self.grid_radians),
+                uv_wavelengths=self.uv_wavelengths,
+                vis_start=vis_start,
+                vis_end=vis_end,
+            )
+
+            yield slice(vis_start, vis_end), preloaded_reals, preloaded_imags
+
+    def real_and_imag_visibilities_from_image(self, image):
+
+        image_1d = np.asarray(image.in_1d_binned)
+
+        real_visibilities = np.zeros(self.total_visibilities)
+        imag_visibilities = np.zeros(self.total_visibilities)
+
+        for chunk, preloaded_reals, preloaded_imags in self.chunks_from_total_columns():
+            real_visibilities[chunk] = image_1d @ preloaded_reals
+            imag_visibilities[chunk] = image_1d @ preloaded_imags
+
+        return real_visibilities, imag_visibilities
+
+    def real_visibilities_from_image(self, image):
+        return self.real_and_imag_visibilities_from_image(image=image)[0]
+
+    def imag_visibilities_from_image(self, image):
+        return self.real_and_imag_visibilities_from_image(image=image)[1]
+
+    def visibilities_from_image(self, image):
+
+        real_visibilities, imag_visibilities = self.real_and_imag_visibilities_from_image(
+            image=image
+        )
+
+        return aa.visibilities.manual_1d(
+            visibilities=np.stack((real_visibilities, imag_visibilities), axis=-1)
+        )
+
+    def transformed_mapping_matrices_from_mapping_matrix(self, mapping_matrix):
+
+        real_transformed_mapping_matrix = np.zeros(
+            (self.total_visibilities, mapping_matrix.shape[1])
+        )
+        imag_transformed_mapping_matrix = np.zeros(
+            (self.total_visibilities, mapping_matrix.shape[1])
+        )
+
+        for chunk, preloaded_reals, preloaded_imags in self.chunks_from_total_columns():
+            real_transformed_mapping_matrix[chunk] = preloaded_reals.T @ mapping_matrix
+            imag_transformed_mapping_matrix[chunk] = preloaded_imags.T @ mapping_matrix
+
+        return [real_transformed_mapping_matrix, imag_transformed_mapping_matrix]
+
+    def real_transformed_mapping_matrix_from_mapping_matrix(self, mapping_matrix):
+        return self.transformed_mapping_matrices_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        )[0]
+
+    def imag_transformed_mapping_matrix_from_mapping_matrix(self, mapping_matrix):
+        return self.transformed_mapping_matrices_from_mapping_matrix(
+            mapping_matrix=mapping_matrix
+        )[1]
+
+    def data_vector_and_curvature_matrix_from_mapping_matrix(
+        self, mapping_matrix, visibilities, noise_map
+    ):
+        """Compute the data vector and curvature matrix of an interferometer inversion, summed over the real and
+        imaginary visibilities, in one pass over the chunks of visibilities.
+
+        This gives the same result as computing the transformed mapping matrices and passing them to
+        *al.util.inversion.data_vector_from_transformed_mapping_matrix_and_data* and
+        *al.util.inversion.curvature_matrix_from_transformed_mapping_matrix*, but only the transformed mapping
+        matrices of one chunk are stored at a time.
+
+        Parameters
+        ----------
+        mapping_matrix : np.ndarray
+            The (total_image_pixels, total_source_pixels) mapping matrix of the inversion's mapper.
+        visibilities : al.visibilities
+            The (total_visibilities, 2) real and imaginary visibilities the inversion fits.
+        noise_map : al.visibilities
+            The (total_visibilities, 2) real and imaginary noise-map of the visibilities.
+        """
+
+        total_columns = mapping_matrix.shape[1]
+
+        data_vector = np.zeros(total_columns)
+        curvature_matrix = np.zeros((total_columns, total_columns))
+
+        for chunk, preloaded_reals, preloaded_imags in self.chunks_from_total_columns(
+            total_columns=total_columns
+        ):
+
+            for preloaded_transforms, component in (
+                (preloaded_reals, 0),
+                (preloaded_imags, 1),
+            ):
+
+                weighted_transformed_mapping_matrix = (
+                    preloaded_transforms.T @ mapping_matrix
+                ) / noise_map[chunk, component][:, None]
+
+                data_vector += weighted_transformed_mapping_matrix.T @ (
+                    visibilities[chunk, component] / noise_map[chunk, component]
+                )
+
+                curvature_matrix += (
+                    weighted_transformed_mapping_matrix.T
+                    @ weighted_transformed_mapping_matrix
+                )
+
+        return data_vector, curvature_matrix
+
+
+def preload_cache_key_from_uv_wavelengths_and_grid(uv_wavelengths, grid_radians):
+    """A hash of the uv-wavelengths and the real-space grid (which is set by the real-space mask), which identifies
+    the preloaded transforms computed from them."""
+
+    sha256 = hashlib.sha256()
+
+    for array in (uv_wavelengths, grid_radians):
+        array = np.ascontiguousarray(array, dtype="float64")
+        sha256.update(str(array.shape).encode())
+        sha256.update(array.tobytes())
+
+    return sha256.hexdigest()[:32]
+
+
+def preload_transforms_via_cache(
+    uv_wavelengths, grid_radians, cache_path, memory_budget_gb=1.0, lock_timeout=3600.0
+):
+    """Load the preloaded real and imaginary transforms of the direct transformer from a .npy file in *cache_path*,
+    named after a hash of the uv-wavelengths and real-space grid, computing and writing them first if the file does
+    not exist.
+
+    The transforms are returned as read-only memory maps of the file, so every phase of a pipeline, and every process
+    on a node (e.g. the 16 tasks of a Cosma job), which uses the same uv-wavelengths and mask shares the same
+    physical memory and only the first computes the transforms.
+
+    The file is written one chunk of visibilities at a time (see *TransformerChunked*) to a temporary file, which is
+    renamed once complete. Whilst one process writes it, a lock file holding the writer's host name, process id and a
+    unique token makes other processes wait rather than compute the same transforms. The writer refreshes the lock's
+    modification time after every chunk. A lock is taken over if its writer ran on the same host and is no longer
+    running, or if it is on another host and has not been refreshed for *lock_timeout* seconds (which must exceed the
+    time taken to compute one chunk). A process only ever removes the lock it holds.
+
+    Parameters
+    ----------
+    uv_wavelengths : np.ndarray
+        The (u, v) wavelengths of the visibilities, with shape (total_visibilities, 2).
+    grid_radians : np.ndarray
+        The (y, x) coordinates of the image pixels in radians.
+    cache_path : str
+        The folder the preloaded transforms are cached in, which should be on a filesystem all processes can read.
+    memory_budget_gb : float
+        The memory in GB used to compute each chunk of the transforms before it is written.
+    lock_timeout : float
+        The time in seconds after which the lock of a writer on another host which has not been refreshed is taken
+        over.
+    """
+
+    os.makedirs(cache_path, exist_ok=True)
+
+    key = preload_cache_key_from_uv_wavelengths_and_grid(
+        uv_wavelengths=uv_wavelengths, grid_radians=grid_radians
+    )
+
+    file_path = os.path.join(cache_path, "preload_{}.npy".format(key))
+    lock_path = file_path + ".lock"
+
+    lock_owner = "{} {} {}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+
+    while not os.path.exists(file_path):
+
+        try:
+            lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+
+            stale_lock_owner = _stale_lock_owner_from_lock_path(
+                lock_path=lock_path, lock_timeout=lock_timeout
+            )
+
+            if stale_lock_owner is not None:
+                _remove_lock_of_owner(lock_path=lock_path, lock_owner=stale_lock_owner)
+
+            time.sleep(1.0)
+            continue
+
+        try:
+            os.write(lock, lock_owner.encode())
+            os.close(lock)
+
+            if not os.path.exists(file_path):
+                _output_preload_transforms_to_file(
+                    uv_wavelengths=uv_wavelengths,
+                    grid_radians=grid_radians,
+                    file_path=file_path,
+                    memory_budget_gb=memory_budget_gb,
+                    refresh_lock=lambda: _refresh_lock_of_owner(
+                        lock_path=lock_path, lock_owner=lock_owner
+                    ),
+                )
+        finally:
+            _remove_lock_of_owner(lock_path=lock_path, lock_owner=lock_owner)
+
+    preloaded_transforms = np.load(file_path, mmap_mode="r")
+
+    return preloaded_transforms[0], preloaded_transforms[1]
+
+
+def _lock_owner_from_lock_path(lock_path):
+    """The owner written to a lock file, or None if the lock does not exist."""
+
+    try:
+        with open(lock_path, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _stale_lock_owner_from_lock_path(lock_path, lock_timeout):
+    """The owner of a lock file if it was left by a writer which is no longer running, and otherwise None.
+
+    The writer of a lock on this host is checked directly. The writer of a lock on another host is assumed to have been
+    killed if the lock has not been refreshed for *lock_timeout* seconds. A lock whose owner is not yet written (it was
+    only just created) is stale only once it is *lock_timeout* seconds old.
+    """
+
+    lock_owner = _lock_owner_from_lock_path(lock_path=lock_path)
+
+    if lock_owner is None:
+        return None
+
+    owner = lock_owner.split()
+
+    if len(owner) == 3 and owner[0] == socket.gethostname():
+
+        try:
+            os.kill(int(owner[1]), 0)
+        except ProcessLookupError:
+            return lock_owner
+        except (PermissionError, ValueError):
+            pass
+
+        return None
+
+    try:
+        if time.time() - os.path.getmtime(lock_path) > lock_timeout:
+            return lock_owner
+    except FileNotFoundError:
+        pass
+
+    return None
+
+
+def _refresh_lock_of_owner(lock_path, lock_owner):
+    """Refresh the modification time of a lock if it is still held by *lock_owner*."""
+
+    if _lock_owner_from_lock_path(lock_path=lock_path) == lock_owner:
+        try:
+            os.utime(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_lock_of_owner(lock_path, lock_owner):
+    """Remove a lock if it is held by *lock_owner*, leaving any lock another process has since taken."""
+
+    if _lock_owner_from_lock_path(lock_path=lock_path) == lock_owner:
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def _output_preload_transforms_to_file(
+    uv_wavelengths, grid_radians, file_path, memory_budget_gb, refresh_lock=None
+):
+
+    temporary_file_path = "{}.{}.{}.tmp".format(
+        file_path, socket.gethostname(), os.getpid()
+    )
+
+    preloaded_transforms = np.lib.format.open_memmap(
+        temporary_file_path,
+        mode="w+",
+        dtype="float64",
+        shape=(2, grid_radians.shape[0], uv_wavelengths.shape[0]),
+    )
+
+    visibilities_per_chunk = int(
+        min(
+            max(memory_budget_gb * 1.0e9 // (8 * 2 * grid_radians.shape[0]), 1),
+            uv_wavelengths.shape[0],
+        )
+    )
+
+    for vis_start in range(0, uv_wavelengths.shape[0], visibilities_per_chunk):
+
+        vis_end = min(vis_start + visibilities_per_chunk, uv_wavelengths.shape[0])
+
+        preloaded_reals, preloaded_imags = preload_transforms_of_chunk_jit(
+            grid_radians=grid_radians,
+            uv_wavelengths=uv_wavelengths,
+            vis_start=vis_start,
+            vis_end=vis_end,
+        )
+
+        preloaded_transforms[0, :, vis_start:vis_end] = preloaded_reals
+        preloaded_transforms[1, :, vis_start:vis_end] = preloaded_imags
+
+        if refresh_lock is not None:
+            refresh_lock()
+
+    preloaded_transforms.flush()
+
+    del preloaded_transforms
+
+    os.replace(temporary_file_path, file_path)
+
+
+class TransformerPreloadCache(transformer_module.Transformer):
+    def __init__(self, uv_wavelengths, grid_radians, cache_path, memory_budget_gb=1.0):
+        """The PyAutoLens transformer with preloaded transforms (*al.transformer* with preload_transform=True), where
+        the transforms are loaded as read-only memory maps from an on-disk cache (see *preload_transforms_via_cache*)
+        instead of being computed.
+
+        Parameters
+        ----------
+        uv_wavelengths : np.ndarray
+            The (u, v) wavelengths of the visibilities, with shape (total_visibilities, 2).
+        grid_radians : al.grid
+            The (y, x) coordinates of the image pixels in radians.
+        cache_path : str
+            The folder the preloaded transforms are cached in.
+        memory_budget_gb : float
+            The memory in GB used to compute each chunk of the transforms if they are not cached.
+        """
+
+        super(TransformerPreloadCache, self).__init__(
+            uv_wavelengths=uv_wavelengths,
+            grid_radians=grid_radians,
+            preload_transform=False,
+        )
+
+        self.preload_transform = True
+        self.cache_path = cache_path
+
+        self.preload_real_transforms, self.preload_imag_transforms = preload_transforms_via_cache(
+            uv_wavelengths=self.uv_wavelengths,
+            grid_radians=np.asarray(self.grid_radians),
+            cache_path=cache_path,
+            memory_budget_gb=memory_budget_gb,
+        )
+
+
+@contextlib.contextmanager
+def transformer_context(transformer_class=TransformerNUFFT, **kwargs):
+    """Within this context, every masked interferometer uses the given transformer class (e.g. *TransformerNUFFT*)
+    instead of the direct transformer, so that datasets with too many visibilities to preload their transforms can be
+    fitted. The keyword arguments (e.g. kernel_width=7) are passed to every transformer.
+
+    For example:
+
+        with transformer_util.transformer_context(transformer_class=TransformerNUFFT, kernel_width=7):
+            masked_interferometer = al.masked.interferometer(...)
+    """
+
+    transformer_module_class = transformer_module.Transformer
+
+    def transformer_from_uv_wavelengths(uv_wavelengths, grid_radians, **_):
+        return transformer_class(
+            uv_wavelengths=uv_wavelengths, grid_radians=grid_radians, **kwargs
+        )
+
+    transformer_module.Transformer = transformer_from_uv_wavelengths
+
+    try:
+        yield
+    finally:
+        transformer_module.Transformer = transformer_module_class
+
+
+def phase_with_transformer(phase, transformer_class=TransformerNUFFT, **kwargs):
+    """Make a phase fit its interferometer dataset using the given transformer class (see *transformer_context*), by
+    creating its masked interferometer within the *transformer_context* when the phase is run. For a phase extended
+    with hyper phases, the phase it extends uses the transformer and the extended phase is returned."""
+
+    def make_analysis_wrapper(make_analysis):
+        def make_analysis_with_transformer(*args, **analysis_kwargs):
+            with transformer_context(transformer_class=transformer_class, **kwargs):
+                return make_analysis(*args, **analysis_kwargs)
+
+        return make_analysis_with_transformer
+
+    return phase_util.phase_with_method_wrapper(
+        phase=phase, method_name="make_analysis", method_wrapper=make_analysis_wrapper
+    )
+
+
+def pipeline_with_transformer(pipeline, transformer_class=TransformerNUFFT, **kwargs):
+    """Make every phase of a pipeline use the given transformer class (see *phase_with_transformer*)."""
+
+    for phase in pipeline.phases:
+        phase_with_transformer(phase=phase, transformer_class=transformer_class, **kwargs)
+
+    return pipeline
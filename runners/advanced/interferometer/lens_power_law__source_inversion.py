@@ -123,10 +123,26 @@ from pipelines.advanced.interferometer.source.inversion.from_parametric import (
     lens_sie__source_inversion,
 )
 
+# The parametric source pipeline can fit the visibilities binned onto a uv-grid, which is the interferometer analogue
+# of the 'bin_up_factor' of imaging phases. The source inversion and mass pipelines always fit the full dataset.
+
+# Binning is off by default, so this runner's results are unchanged. To turn it on, set uv_bin_size to the cell size
+# below, which changes the phase of a visibility of any source within the real-space mask by at most 0.1 radians over
+# a cell, so that the visibilities in a cell are close to constant:
+
+# from preprocessing import uv_binning
+#
+# uv_bin_size = uv_binning.uv_bin_size_from_real_space_radius(
+#     real_space_radius=3.0, max_phase_error=0.1
+# )
+
+uv_bin_size = None
+
 pipeline_source__parametric = lens_sie__source_sersic.make_pipeline(
     setup=setup,
     real_space_mask=real_space_mask,
     phase_folders=["advanced", dataset_label, dataset_name],
+    uv_bin_size=uv_bin_size,
 )
 
 pipeline_source__inversion = lens_sie__source_inversion.make_pipeline(
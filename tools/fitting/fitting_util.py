@@ -0,0 +1,506 @@
+import contextlib
+import itertools
+import logging
+
+import emcee
+import numpy as np
+
+import autofit as af
+import autolens as al
+from autofit import exc
+from autofit.optimize.non_linear.emcee import EmceeOutput
+from autofit.optimize.non_linear.non_linear import Result
+
+from profiling import inversion_util
+
+logger = logging.getLogger(__name__)
+
+# The batched optimizers below are opt-in: a phase uses them by being created with optimizer_class=EmceeBatched or
+# optimizer_class=GridSearchBatched, in place of af.Emcee or af.GridSearch. They read the settings of the optimizer
+# they extend in 'config/non_linear.ini', and GridSearchBatched also reads the 'batch_size' of the 'GridSearch'
+# section. Phases using other optimizers are unchanged.
+
+
+class BatchFit(object):
+    def __init__(self, masked_dataset):
+        """Fit many tracers to one masked imaging dataset, returning a vector of their log likelihoods.
+
+        The image, noise-map, noise normalization and the PSF of the masked dataset, as sparse matrices which blur its
+        image and blurring image into the mask, are extracted once. The profile images of every tracer are then blurred
+        by one sparse matrix product and their chi-squareds computed by one vectorized NumPy operation for the whole
+        batch, rather than by one *al.fit* per tracer which repeats this preprocessing and allocates its blurred image,
+        residual, chi-squared and normalization maps every call.
+
+        The ray-tracing and light profiles of every tracer are still evaluated one tracer at a time, which for most
+        lens models is the larger part of the likelihood's run-time, so the speed up of a batch is limited to the
+        per-call overhead of the blurring and fit (see the 'fit_x' and 'batch_fit_x' stages of
+        'profiling/imaging/profile_image_fit.py').
+
+        The log likelihood of a tracer is -0.5 * (chi_squared + noise_normalization), the same as the figure of merit
+        of *al.fit*. Tracers with a pixelization or hyper galaxies, whose fits change the noise-map or need an
+        inversion, are fitted one at a time by *al.fit*.
+
+        Parameters
+        -----------
+        masked_dataset : al.masked.imaging
+            The masked imaging dataset every tracer is fitted to.
+        """
+
+        self.masked_dataset = masked_dataset
+
+        self.image = np.asarray(masked_dataset.image)
+        self.inverse_noise_map = 1.0 / np.asarray(masked_dataset.noise_map)
+
+        self.noise_normalization = np.sum(
+            np.log(2 * np.pi * np.asarray(masked_dataset.noise_map) ** 2.0)
+        )
+
+        self.psf_operator = inversion_util.sparse_psf_operator_from_convolver(
+            convolver=masked_dataset.convolver
+        )
+        self.blurring_psf_operator = inversion_util.sparse_blurring_psf_operator_from_convolver(
+            convolver=masked_dataset.convolver
+        )
+
+    def tracer_is_parametric(self, tracer):
+        return not tracer.has_pixelization and not tracer.has_hyper_galaxy
+
+    def model_images_from_tracers(self, tracers):
+        """The (K, total_image_pixels) stack of the blurred profile images of K tracers, whose profile images and
+        blurring images are blurred with the PSF by one sparse matrix product."""
+
+        profile_images = np.asarray(
+            [
+                tracer.profile_image_from_grid(
+                    grid=self.masked_dataset.grid
+                ).in_1d_binned
+                for tracer in tracers
+            ]
+        )
+
+        blurring_profile_images = np.asarray(
+            [
+                tracer.profile_image_from_grid(
+                    grid=self.masked_dataset.blurring_grid
+                ).in_1d_binned
+                for tracer in tracers
+            ]
+        )
+
+        return (
+            self.psf_operator @ profile_images.T
+            + self.blurring_psf_operator @ blurring_profile_images.T
+        ).T
+
+    def log_likelihoods_from_model_images(self, model_images):
+        """The log likelihoods of a (K, total_image_pixels) stack of model images."""
+
+        chi_squareds = np.sum(
+            np.square((self.image - np.asarray(model_images)) * self.inverse_noise_map),
+            axis=1,
+        )
+
+        return -0.5 * (chi_squareds + self.noise_normalization)
+
+    def log_likelihoods_from_tracers(self, tracers):
+        """The log likelihoods (or, for tracers with an inversion, Bayesian evidences) of a list of tracers."""
+
+        log_likelihoods = np.zeros(len(tracers))
+
+        parametric_indexes = [
+            index
+            for index, tracer in enumerate(tracers)
+            if self.tracer_is_parametric(tracer=tracer)
+        ]
+
+        if len(parametric_indexes) > 0:
+
+            log_likelihoods[
+                parametric_indexes
+            ] = self.log_likelihoods_from_model_images(
+                model_images=self.model_images_from_tracers(
+                    tracers=[tracers[index] for index in parametric_indexes]
+                )
+            )
+
+        for index, tracer in enumerate(tracers):
+            if index not in parametric_indexes:
+                log_likelihoods[index] = al.fit(
+                    masked_dataset=self.masked_dataset, tracer=tracer
+                ).figure_of_merit
+
+        return log_likelihoods
+
+
+def log_likelihoods_from_analysis_and_instances(analysis, instances, batch_fit=None):
+    """The figure of merit *analysis.fit* returns for every instance of a list, computed as one batch.
+
+    Every instance is checked and turned into a tracer as *analysis.fit* does. Instances fitted with a hyper image sky
+    or hyper background noise are fitted one at a time by *analysis.fit*, and instances whose fit raises a
+    FitException (e.g. because their positions do not trace within the threshold) have a log likelihood of -inf.
+    """
+
+    batch_fit = batch_fit or BatchFit(masked_dataset=analysis.masked_dataset)
+
+    log_likelihoods = np.full(len(instances), -np.inf)
+
+    batch_indexes = []
+    batch_tracers = []
+
+    for index, instance in enumerate(instances):
+
+        try:
+
+            analysis.associate_hyper_images(instance=instance)
+            tracer = analysis.tracer_for_instance(instance=instance)
+
+            if (
+                analysis.hyper_image_sky_for_instance(instance=instance) is None
+                and analysis.hyper_background_noise_for_instance(instance=instance)
+                is None
+            ):
+
+                analysis.masked_dataset.check_positions_trace_within_threshold_via_tracer(
+                    tracer=tracer
+                )
+                analysis.masked_dataset.check_inversion_pixels_are_below_limit_via_tracer(
+                    tracer=tracer
+                )
+
+                batch_indexes.append(index)
+                batch_tracers.append(tracer)
+
+            else:
+
+                log_likelihoods[index] = analysis.fit(instance)
+
+        except exc.FitException:
+            pass
+
+    if len(batch_tracers) > 0:
+        log_likelihoods[batch_indexes] = batch_fit.log_likelihoods_from_tracers(
+            tracers=batch_tracers
+        )
+
+    return log_likelihoods
+
+
+class PrefetchedAnalysis(object):
+    def __init__(self, analysis):
+        """Wrap the *fit* of an analysis so that the log likelihoods of a batch of instances can be computed at once
+        (see *log_likelihoods_from_analysis_and_instances*) and are then returned by *fit* when the non-linear search
+        fits each instance, keeping its own bookkeeping (the maximum likelihood, visualization and output) unchanged.
+        """
+
+        self.analysis = analysis
+        self.fit = analysis.fit
+        self.batch_fit = BatchFit(masked_dataset=analysis.masked_dataset)
+        self.prefetched = {}
+
+        analysis.fit = self.prefetched_fit
+        analysis.fit_batch = self.fit_batch
+
+    def fit_batch(self, instances):
+        return log_likelihoods_from_analysis_and_instances(
+            analysis=self.analysis, instances=instances, batch_fit=self.batch_fit
+        )
+
+    def prefetched_fit(self, instance):
+
+        if id(instance) in self.prefetched:
+
+            log_likelihood = self.prefetched[id(instance)]
+
+            if log_likelihood == -np.inf:
+                raise exc.FitException
+
+            return log_likelihood
+
+        return self.fit(instance)
+
+    @contextlib.contextmanager
+    def prefetch(self, instances):
+        """Within this context, *analysis.fit* returns the log likelihood of every instance of the list from one batch.
+        The instances are held until the context exits, so their ids are unique."""
+
+        instances = [instance for instance in instances if instance is not None]
+
+        self.prefetched = dict(
+            zip(map(id, instances), self.fit_batch(instances=instances))
+        )
+
+        try:
+            yield
+        finally:
+            self.prefetched = {}
+
+
+def unit_vectors_from_dimensions_and_step_size(no_dimensions, step_size):
+    """The points of a grid search in unit hypercube space, at the centres of steps of *step_size* in every dimension,
+    in the order *af.GridSearch* visits them."""
+
+    values = [
+        step_size * value + 0.5 * step_size for value in range(int(1 / step_size))
+    ]
+
+    return list(itertools.product(values, repeat=no_dimensions))
+
+
+class BatchedGrid(object):
+    def __init__(self, batch_size):
+        """A grid function for *af.GridSearch* (its 'grid' argument), which visits the same points as its default grid
+        and fits them in batches of *batch_size* points via a *PrefetchedAnalysis* of the analysis being fitted.
+
+        Every point is still passed to the grid search's fitness function, which keeps its checkpoints, results and
+        best fit unchanged. When a grid search is resumed, the points before its checkpoint are still fitted by the
+        batch, although the fitness function does not use them.
+        """
+
+        self.batch_size = batch_size
+
+    def __call__(self, fitness_function, no_dimensions, step_size):
+
+        best_fitness = float("-inf")
+        best_arguments = None
+
+        prefetched_analysis = PrefetchedAnalysis(analysis=fitness_function.analysis)
+
+        cubes = unit_vectors_from_dimensions_and_step_size(
+            no_dimensions=no_dimensions, step_size=step_size
+        )
+
+        instance_from_unit_vector = fitness_function.instance_from_unit_vector
+
+        for start in range(0, len(cubes), self.batch_size):
+
+            batch_cubes = cubes[start : start + self.batch_size]
+
+            instances = {}
+
+            for cube in batch_cubes:
+                try:
+                    instances[cube] = instance_from_unit_vector(cube)
+                except exc.FitException:
+                    pass
+
+            def prefetched_instance_from_unit_vector(cube):
+
+                if cube in instances:
+                    return instances[cube]
+
+                return instance_from_unit_vector(cube)
+
+            fitness_function.instance_from_unit_vector = (
+                prefetched_instance_from_unit_vector
+            )
+
+            try:
+                with prefetched_analysis.prefetch(instances=list(instances.values())):
+                    for cube in batch_cubes:
+                        fitness = fitness_function(cube)
+                        if fitness > best_fitness:
+                            best_fitness = fitness
+                            best_arguments = cube
+            finally:
+                fitness_function.instance_from_unit_vector = instance_from_unit_vector
+
+        return best_arguments
+
+    def __eq__(self, other):
+        return isinstance(other, BatchedGrid) and self.batch_size == other.batch_size
+
+
+class GridSearchBatched(af.GridSearch):
+    def __init__(self, paths, step_size=None, grid=None):
+        """An *af.GridSearch* which fits its grid in batches of points (see *BatchedGrid*), whose size is the
+        'batch_size' of the 'GridSearch' section of 'config/non_linear.ini'."""
+
+        super().__init__(
+            paths,
+            step_size=step_size
+            or af.conf.instance.non_linear.get("GridSearch", "step_size", float),
+            grid=grid
+            or BatchedGrid(
+                batch_size=af.conf.instance.non_linear.get(
+                    "GridSearch", "batch_size", int
+                )
+            ),
+        )
+
+
+# The autofit version whose *af.Emcee.fit* the *fit* method of *EmceeBatched* follows. That method constructs its
+# fitness function and sampler inline, so *EmceeBatched.fit* must repeat it, and must be compared to it again whenever
+# autofit is upgraded.
+emcee_batched_autofit_version = "0.53.0"
+
+
+class EmceeBatched(af.Emcee):
+    """An *af.Emcee* whose sampler proposes its whole ensemble of walkers as one batch (emcee's vectorize option), which
+    is fitted via a *PrefetchedAnalysis* of the analysis being fitted.
+
+    Only the fitness function and sampler differ from *af.Emcee* (see *fitness_function_from_analysis_and_model* and
+    *sampler_from_model_and_fitness_function*), but as *af.Emcee.fit* constructs them inline its *fit* is repeated, for
+    the autofit version *emcee_batched_autofit_version* only.
+    """
+
+    def __init__(self, paths, sigma=3):
+
+        if af.__version__ != emcee_batched_autofit_version:
+            raise RuntimeError(
+                "EmceeBatched follows af.Emcee.fit of autofit {}, but autofit {} is installed".format(
+                    emcee_batched_autofit_version, af.__version__
+                )
+            )
+
+        super().__init__(paths, sigma=sigma)
+
+    class Fitness(af.Emcee.Fitness):
+        def __init__(
+            self,
+            paths,
+            analysis,
+            instance_from_vector,
+            output_results,
+            prefetched_analysis,
+        ):
+            super().__init__(
+                paths=paths,
+                analysis=analysis,
+                instance_from_vector=self.prefetched_instance_from_vector,
+                output_results=output_results,
+            )
+
+            self.model_instance_from_vector = instance_from_vector
+            self.prefetched_analysis = prefetched_analysis
+            self.instances = {}
+
+        def prefetched_instance_from_vector(self, vector):
+
+            key = np.asarray(vector, dtype="float64").tobytes()
+
+            if key in self.instances:
+                return self.instances[key]
+
+            return self.model_instance_from_vector(vector)
+
+        def __call__(self, params):
+            """The log likelihoods of a (nwalkers, ndim) array of walkers, fitted as one batch and then passed one at a
+            time to the Emcee fitness function."""
+
+            self.instances = {}
+
+            for walker_params in params:
+                try:
+                    self.instances[
+                        np.asarray(walker_params, dtype="float64").tobytes()
+                    ] = self.model_instance_from_vector(walker_params)
+                except exc.FitException:
+                    pass
+
+            try:
+                with self.prefetched_analysis.prefetch(
+                    instances=list(self.instances.values())
+                ):
+                    return np.asarray(
+                        [
+                            super(EmceeBatched.Fitness, self).__call__(walker_params)
+                            for walker_params in params
+                        ]
+                    )
+            finally:
+                self.instances = {}
+
+    def fitness_function_from_analysis_and_model(self, analysis, model, output):
+        return EmceeBatched.Fitness(
+            paths=self.paths,
+            analysis=analysis,
+            instance_from_vector=model.instance_from_vector,
+            output_results=output.output_results,
+            prefetched_analysis=PrefetchedAnalysis(analysis=analysis),
+        )
+
+    def sampler_from_model_and_fitness_function(self, model, fitness_function):
+        """The emcee sampler of *af.Emcee.fit*, which passes the walkers of every step to its fitness function as one
+        (nwalkers, ndim) array."""
+
+        return emcee.EnsembleSampler(
+            nwalkers=self.nwalkers,
+            ndim=model.prior_count,
+            log_prob_fn=fitness_function.__call__,
+            backend=emcee.backends.HDFBackend(filename=self.paths.path + "/emcee.hdf"),
+            vectorize=True,
+        )
+
+    def fit(self, analysis, model):
+        """*af.Emcee.fit* of autofit *emcee_batched_autofit_version*, with its fitness function and sampler
+        constructed by the methods above."""
+
+        output = EmceeOutput(
+            model=model,
+            paths=self.paths,
+            auto_correlation_check_size=self.auto_correlation_check_size,
+            auto_correlation_required_length=self.auto_correlation_required_length,
+            auto_correlation_change_threshold=self.auto_correlation_change_threshold,
+        )
+
+        fitness_function = self.fitness_function_from_analysis_and_model(
+            analysis=analysis, model=model, output=output
+        )
+
+        emcee_sampler = self.sampler_from_model_and_fitness_function(
+            model=model, fitness_function=fitness_function
+        )
+
+        output.save_model_info()
+
+        try:
+            emcee_state = emcee_sampler.get_last_sample()
+            previous_run_converged = output.converged
+
+        except AttributeError:
+
+            emcee_state = np.zeros(shape=(emcee_sampler.nwalkers, emcee_sampler.ndim))
+
+            for walker_index in range(emcee_sampler.nwalkers):
+                emcee_state[walker_index, :] = np.asarray(
+                    model.random_vector_from_priors
+                )
+
+            previous_run_converged = False
+
+        logger.info("Running Emcee Sampling...")
+
+        if self.nsteps - emcee_sampler.iteration > 0 and not previous_run_converged:
+
+            for sample in emcee_sampler.sample(
+                initial_state=emcee_state,
+                iterations=self.nsteps - emcee_sampler.iteration,
+                progress=True,
+                skip_initial_state_check=True,
+                store=True,
+            ):
+
+                if emcee_sampler.iteration % self.auto_correlation_check_size:
+                    continue
+
+                if output.converged and self.check_auto_correlation:
+                    break
+
+        logger.info("Emcee complete")
+
+        self.paths.backup()
+
+        instance = output.most_likely_instance
+
+        analysis.visualize(instance=instance, during_analysis=False)
+        output.output_results(during_analysis=False)
+        output.output_pdf_plots()
+        result = Result(
+            instance=instance,
+            likelihood=output.maximum_log_likelihood,
+            output=output,
+            previous_model=model,
+            gaussian_tuples=output.gaussian_priors_at_sigma(self.sigma),
+        )
+        self.paths.backup_zip_remove()
+        return result
@@ -0,0 +1,382 @@
+import logging
+
+import autolens as al
+import numpy as np
+from scipy.spatial import Delaunay
+
+from tools import phase_util
+
+logger = logging.getLogger(__name__)
+
+# The deflection angles of a mass profile are interpolated from an 'interpolation grid' to the sub-grid of a mask (see
+# 'pipelines/beginner/features/interpolating_deflections.py'). A uniform interpolation grid must be fine everywhere to
+# be accurate where the deflection angles curve most, near the centre of the lens and its critical curves, so most of
+# its points are wasted where the deflection angles are smooth.
+
+# The adaptive interpolation grid below starts from a coarse uniform grid of square cells over the mask and splits
+# every cell whose deflection angles are not reproduced by linear interpolation from its corners to within a maximum
+# deflection error, until no cell exceeds it or cells reach a minimum pixel scale. The deflection angles are then
+# interpolated from the corners, edge midpoints and centres of all cells via a Delaunay triangulation.
+
+# The refinement criterion is only an estimate of the error of the Delaunay interpolation that is used, so the error is
+# also measured with the final triangulation, at the centres of the quadrants of every cell (which are not points of the
+# interpolation grid).
+
+
+def deflections_from_mass_profiles_and_points(mass_profiles, points):
+    """The summed deflection angles of a list of mass profiles at an (N, 2) array of (y,x) points, which are passed to
+    the mass profiles as an irregular grid."""
+
+    grid = al.grid_irregular.manual_1d(grid=np.asarray(points))
+
+    deflections = np.zeros(grid.shape)
+
+    for mass_profile in mass_profiles:
+        deflections += np.asarray(mass_profile.deflections_from_grid(grid=grid))
+
+    return deflections
+
+
+def occupied_keys_from_points_and_cell_size(points, origin, cell_size):
+    """The integer (y,x) indexes of the cells of size *cell_size*, with a corner at *origin*, which contain at least
+    one point, returned as the set of their integer keys."""
+
+    indexes = np.floor((points - origin) / cell_size).astype("int64")
+
+    return set(map(tuple, np.unique(indexes, axis=0)))
+
+
+class AdaptiveInterpolator(object):
+    def __init__(self, grid, interp_grid):
+        """Interpolate values computed on an irregular interpolation grid to a grid, using the barycentric weights of
+        the Delaunay triangle of the interpolation grid that every grid point lies in.
+
+        This has the same interface as *al.Interpolator*, so it can be set as the interpolator of a grid and used by
+        every mass profile's deflection angle calculation (see *phase_with_adaptive_interpolation*).
+
+        Parameters
+        -----------
+        grid : ndarray
+            The (y,x) coordinates the values are interpolated to.
+        interp_grid : al.grid_irregular
+            The (y,x) coordinates of the interpolation grid, whose convex hull contains every point of *grid*.
+        """
+
+        self.grid = grid
+        self.interp_grid = interp_grid
+
+        grid = np.asarray(grid)
+
+        triangulation = Delaunay(np.asarray(interp_grid))
+
+        simplices = triangulation.find_simplex(grid)
+
+        if np.any(simplices < 0):
+            raise ValueError(
+                "The adaptive interpolation grid does not contain every point of the grid"
+            )
+
+        self.vertices = triangulation.simplices[simplices]
+
+        transforms = triangulation.transform[simplices]
+
+        barycentric = np.einsum(
+            "njk,nk->nj", transforms[:, :2], grid - transforms[:, 2]
+        )
+
+        self.weights = np.hstack(
+            (barycentric, 1.0 - np.sum(barycentric, axis=1, keepdims=True))
+        )
+
+    def interpolated_values_from_values(self, values):
+        """Interpolate 1D values computed on the interpolation grid to the grid."""
+
+        return np.einsum(
+            "nj,nj->n", np.take(np.asarray(values), self.vertices), self.weights
+        )
+
+    @classmethod
+    def from_grid_and_mass_profiles(
+        cls,
+        grid,
+        mass_profiles,
+        max_deflection_error,
+        pixel_scale_coarse=0.2,
+        pixel_scale_minimum=0.0125,
+    ):
+        """Build an adaptive interpolation grid for a grid (e.g. the sub-grid of a masked dataset), refined until the
+        deflection angles of a list of reference mass profiles are linearly interpolated to within
+        *max_deflection_error*.
+
+        Every cell of the interpolation grid is checked by computing the deflection angles at its centre and edge
+        midpoints and comparing them to the mean of the deflection angles at its corners, which is their bilinear
+        interpolation. A cell is split into four if the largest difference exceeds *max_deflection_error*, unless it is
+        already *pixel_scale_minimum* across. Only cells which contain points of the grid are kept, and the deflection
+        angles of every point are computed once, so the number of deflection angle calculations is the size of the
+        final interpolation grid.
+
+        Deflection angles are evaluated by Delaunay interpolation, not bilinear interpolation, so the largest error of
+        the refinement criterion is only an estimate, stored as *max_error_estimate*. The error of the Delaunay
+        interpolation itself is measured at the centres of the four quadrants of every final cell, using the
+        triangulation that is returned, and stored as *max_error*. This costs four more deflection angle calculations
+        per cell. *max_error* can exceed *max_deflection_error* (e.g. when cells reach *pixel_scale_minimum*), in which
+        case a warning is logged, and it is itself measured only at these test points.
+
+        The reference mass profiles are typically the lens model of a previous phase. Mass models close to them have
+        deflection angles curving in the same regions, so the same interpolation grid is accurate for them.
+
+        Parameters
+        -----------
+        grid : ndarray
+            The (y,x) coordinates the deflection angles are interpolated to.
+        mass_profiles : [MassProfile]
+            The mass profiles whose summed deflection angles set where the interpolation grid is refined.
+        max_deflection_error : float
+            The maximum error of the linearly interpolated deflection angles of a cell, in arc-seconds.
+        pixel_scale_coarse : float
+            The size of the cells of the initial uniform interpolation grid, in arc-seconds.
+        pixel_scale_minimum : float
+            The smallest size of a cell, in arc-seconds.
+        """
+
+        points = np.asarray(grid)
+
+        levels = max(
+            int(np.ceil(np.log2(pixel_scale_coarse / pixel_scale_minimum))), 0
+        )
+
+        # Every corner, edge midpoint and centre of every cell at every level lies on a lattice with this spacing, so
+        # its integer lattice coordinates are used as the key its deflection angles are stored under.
+
+        unit = pixel_scale_coarse / 2 ** (levels + 1)
+
+        # The lattice is offset by a third of its spacing so its points avoid the round coordinates mass profiles are
+        # usually centred on, where their deflection angles can be singular.
+
+        origin = np.min(points, axis=0) - 0.5 * pixel_scale_coarse - unit / 3.0
+
+        deflections = {}
+
+        def deflections_from_keys(keys):
+
+            new_keys = [key for key in set(keys) if key not in deflections]
+
+            if len(new_keys) > 0:
+
+                new_deflections = deflections_from_mass_profiles_and_points(
+                    mass_profiles=mass_profiles,
+                    points=origin + unit * np.asarray(new_keys, dtype="float64"),
+                )
+
+                deflections.update(zip(new_keys, new_deflections))
+
+            return np.asarray([deflections[key] for key in keys])
+
+        leaf_errors = [0.0]
+        leaf_cells = []
+
+        cells = sorted(
+            occupied_keys_from_points_and_cell_size(
+                points=points, origin=origin, cell_size=pixel_scale_coarse
+            )
+        )
+
+        for level in range(levels + 1):
+
+            # The cell size and the lattice keys of a cell's corners, edge midpoints and centre at this level.
+
+            size = 2 ** (levels + 1 - level)
+            half = size // 2
+
+            corner_offsets = [(0, 0), (0, size), (size, 0), (size, size)]
+            test_offsets = [
+                (half, half),
+                (0, half),
+                (half, 0),
+                (size, half),
+                (half, size),
+            ]
+            test_corners = [[0, 1, 2, 3], [0, 1], [0, 2], [2, 3], [1, 3]]
+
+            keys = [
+                (cell[0] * size + offset[0], cell[1] * size + offset[1])
+                for cell in cells
+                for offset in corner_offsets + test_offsets
+            ]
+
+            cell_deflections = deflections_from_keys(keys=keys).reshape(
+                len(cells), len(corner_offsets) + len(test_offsets), 2
+            )
+
+            errors = np.zeros(len(cells))
+
+            for test_index, corners in enumerate(test_corners):
+
+                interpolated_deflections = np.mean(
+                    cell_deflections[:, corners, :], axis=1
+                )
+
+                errors = np.maximum(
+                    errors,
+                    np.max(
+                        np.abs(
+                            cell_deflections[:, len(corner_offsets) + test_index, :]
+                            - interpolated_deflections
+                        ),
+                        axis=1,
+                    ),
+                )
+
+            split = ~(errors <= max_deflection_error) & (level < levels)
+
+            leaf_errors.extend(errors[~split])
+            leaf_cells.extend(
+                (cell, size) for cell, is_split in zip(cells, split) if not is_split
+            )
+
+            split_cells = [cell for cell, is_split in zip(cells, split) if is_split]
+
+            if len(split_cells) == 0:
+                break
+
+            occupied = occupied_keys_from_points_and_cell_size(
+                points=points, origin=origin, cell_size=unit * half
+            )
+
+            cells = [
+                (2 * cell[0] + y, 2 * cell[1] + x)
+                for cell in split_cells
+                for y in range(2)
+                for x in range(2)
+                if (2 * cell[0] + y, 2 * cell[1] + x) in occupied
+            ]
+
+        keys = sorted(deflections.keys())
+
+        interp_grid = al.grid_irregular.manual_1d(
+            grid=origin + unit * np.asarray(keys, dtype="float64")
+        )
+
+        interpolator = cls(grid=grid, interp_grid=interp_grid)
+
+        interpolator.max_error_estimate = float(np.max(leaf_errors))
+
+        # The error of the Delaunay interpolation is measured at the centre of every quadrant of every final cell.
+
+        test_points = origin + unit * np.asarray(
+            [
+                (cell[0] * size + offset_y * size, cell[1] * size + offset_x * size)
+                for cell, size in leaf_cells
+                for offset_y in (0.25, 0.75)
+                for offset_x in (0.25, 0.75)
+            ],
+            dtype="float64",
+        ).reshape(-1, 2)
+
+        interpolator.max_error = 0.0
+
+        if len(test_points) > 0:
+
+            test_interpolator = cls(grid=test_points, interp_grid=interp_grid)
+
+            interp_deflections = deflections_from_keys(keys=keys)
+
+            test_deflections = np.stack(
+                [
+                    test_interpolator.interpolated_values_from_values(
+                        values=interp_deflections[:, index]
+                    )
+                    for index in range(2)
+                ],
+                axis=1,
+            )
+
+            interpolator.max_error = float(
+                np.max(
+                    np.abs(
+                        test_deflections
+                        - deflections_from_mass_profiles_and_points(
+                            mass_profiles=mass_profiles, points=test_points
+                        )
+                    )
+                )
+            )
+
+        if not interpolator.max_error <= max_deflection_error:
+            logger.warning(
+                "The measured maximum error of the adaptive interpolation grid, {}, exceeds the maximum deflection "
+                "error {} (estimated maximum error {}). Reduce pixel_scale_minimum ({}) to refine it further.".format(
+                    interpolator.max_error,
+                    max_deflection_error,
+                    interpolator.max_error_estimate,
+                    pixel_scale_minimum,
+                )
+            )
+
+        return interpolator
+
+
+def mass_profiles_from_results(results):
+    """The mass profiles of the most likely lens model of the previous phase."""
+
+    return [
+        mass_profile
+        for galaxy in results.last.most_likely_tracer.galaxies
+        for mass_profile in galaxy.mass_profiles
+    ]
+
+
+def tag_from_max_deflection_error(max_deflection_error):
+    """Tag a phase name with the maximum deflection error of its adaptive interpolation grid, so phases using different
+    errors have unique output paths, e.g. 0.001 -> '__interp_adaptive_0.001'."""
+
+    if max_deflection_error is None:
+        return ""
+
+    return "__interp_adaptive_{}".format(max_deflection_error)
+
+
+def phase_with_adaptive_interpolation(
+    phase,
+    max_deflection_error,
+    mass_profiles=None,
+    pixel_scale_coarse=0.2,
+    pixel_scale_minimum=0.0125,
+):
+    """Make a phase interpolate the deflection angles of its mass profiles from an adaptive interpolation grid (see
+    *AdaptiveInterpolator.from_grid_and_mass_profiles*), built once when the phase is run.
+
+    The interpolation grid is refined for the reference mass profiles *mass_profiles* or, if they are None, the mass
+    profiles of the most likely lens model of the previous phase, so it must not be the first phase of a pipeline. The
+    phase passed in is returned, unchanged if *max_deflection_error* is None.
+    """
+
+    if max_deflection_error is None:
+        return phase
+
+    def make_analysis_wrapper(make_analysis):
+        def make_analysis_with_adaptive_interpolation(
+            dataset, mask, results=None, **kwargs
+        ):
+
+            analysis = make_analysis(dataset, mask, results=results, **kwargs)
+
+            grid = analysis.masked_dataset.grid
+
+            grid.interpolator = AdaptiveInterpolator.from_grid_and_mass_profiles(
+                grid=grid,
+                mass_profiles=mass_profiles
+                if mass_profiles is not None
+                else mass_profiles_from_results(results=results),
+                max_deflection_error=max_deflection_error,
+                pixel_scale_coarse=pixel_scale_coarse,
+                pixel_scale_minimum=pixel_scale_minimum,
+            )
+
+            return analysis
+
+        return make_analysis_with_adaptive_interpolation
+
+    return phase_util.phase_with_method_wrapper(
+        phase=phase, method_name="make_analysis", method_wrapper=make_analysis_wrapper
+    )
@@ -0,0 +1,177 @@
+import autofit as af
+import autolens as al
+import numpy as np
+
+import os
+import time
+
+from tools.interpolation import interpolation_util
+
+# Setup the path to the autolens_workspace, using a relative directory name.
+workspace_path = "{}/../../".format(os.path.dirname(os.path.realpath(__file__)))
+
+# Use this path to explicitly set the config path and output path.
+af.conf.instance = af.conf.Config(
+    config_path=workspace_path + "config", output_path=workspace_path + "output"
+)
+
+# This tool compares the precision and number of deflection angle calculations of uniform interpolation grids (see
+# 'tools/interpolation/precision.py') to adaptive interpolation grids, which are refined only where the deflection
+# angles curve until a maximum deflection error is met (see 'tools/interpolation/interpolation_util.py'). It uses mass
+# profiles which need numerical integration, for which the number of points the deflection angles are computed at
+# sets the run-time.
+dataset_label = "imaging"
+dataset_name = "lens_sie__source_sersic"
+pixel_scales = 0.1
+
+sub_size = 2
+inner_radius = 0.0
+outer_radius = 3.0
+
+pixel_scale_interpolation_grids = [0.1, 0.05, 0.025]
+max_deflection_errors = [1.0e-2, 1.0e-3, 1.0e-4]
+
+print("sub grid size = " + str(sub_size))
+print("annular inner mask radius = " + str(inner_radius) + "\n")
+print("annular outer mask radius = " + str(outer_radius) + "\n")
+
+dataset_path = af.path_util.make_and_return_path_from_path_and_folder_names(
+    path=workspace_path, folder_names=["dataset", dataset_label, dataset_name]
+)
+
+imaging = al.imaging.from_fits(
+    image_path=dataset_path + "/image.fits",
+    psf_path=dataset_path + "/psf.fits",
+    noise_map_path=dataset_path + "/noise_map.fits",
+    pixel_scales=pixel_scales,
+)
+
+mask = al.mask.circular_annular(
+    shape_2d=imaging.shape_2d,
+    pixel_scales=imaging.pixel_scales,
+    inner_radius=inner_radius,
+    outer_radius=outer_radius,
+    sub_size=sub_size,
+)
+
+masked_imaging = al.masked.imaging(imaging=imaging, mask=mask)
+
+print("Number of sub-grid points = " + str(masked_imaging.grid.shape[0]) + "\n")
+
+mass_profiles = [
+    al.mp.EllipticalCoredPowerLaw(
+        centre=(0.0, 0.0),
+        axis_ratio=0.8,
+        phi=45.0,
+        einstein_radius=1.0,
+        slope=2.2,
+        core_radius=0.05,
+    ),
+    al.mp.EllipticalNFW(
+        centre=(0.0, 0.0), axis_ratio=0.8, phi=45.0, kappa_s=0.2, scale_radius=10.0
+    ),
+]
+
+
+def print_errors(interp_grid, deflections, true_deflections, run_time):
+
+    difference = np.abs(deflections - true_deflections)
+
+    print("Number of interpolation points = " + str(np.asarray(interp_grid).shape[0]))
+    print("Time to compute deflections = {}".format(run_time))
+    print("interpolation mean error: ", np.mean(difference))
+    print("interpolation max error: ", np.max(difference))
+    print()
+
+
+for mass_profile in mass_profiles:
+
+    print("########################")
+    print()
+    print(mass_profile.__class__.__name__ + "\n")
+
+    true_deflections = np.asarray(
+        mass_profile.deflections_from_grid(grid=masked_imaging.grid)
+    )
+
+    for pixel_scale_interpolation_grid in pixel_scale_interpolation_grids:
+
+        print(
+            "Uniform interpolation grid, pixel scale = "
+            + str(pixel_scale_interpolation_grid)
+        )
+
+        # The uniform interpolator of a copy of the grid, so the grid itself keeps no interpolator.
+
+        interpolator = masked_imaging.grid.copy().new_grid_with_interpolator(
+            pixel_scale_interpolation_grid=pixel_scale_interpolation_grid
+        ).interpolator
+
+        start = time.time()
+        interp_deflections = np.asarray(
+            mass_profile.deflections_from_grid(grid=interpolator.interp_grid)
+        )
+        deflections = np.stack(
+            [
+                interpolator.interpolated_values_from_values(
+                    values=interp_deflections[:, index]
+                )
+                for index in range(2)
+            ],
+            axis=1,
+        )
+        diff = time.time() - start
+
+        print_errors(
+            interp_grid=interpolator.interp_grid,
+            deflections=deflections,
+            true_deflections=true_deflections,
+            run_time=diff,
+        )
+
+    for max_deflection_error in max_deflection_errors:
+
+        print("Adaptive interpolation grid, max error = " + str(max_deflection_error))
+
+        start = time.time()
+        interpolator = interpolation_util.AdaptiveInterpolator.from_grid_and_mass_profiles(
+            grid=masked_imaging.grid,
+            mass_profiles=[mass_profile],
+            max_deflection_error=max_deflection_error,
+        )
+        diff = time.time() - start
+        print("Time to build adaptive interpolation grid = {}".format(diff))
+        print("Estimated max error = {}".format(interpolator.max_error_estimate))
+        print("Measured max error = {}".format(interpolator.max_error))
+
+        start = time.time()
+        interp_deflections = np.asarray(
+            mass_profile.deflections_from_grid(grid=interpolator.interp_grid)
+        )
+        deflections = np.stack(
+            [
+                interpolator.interpolated_values_from_values(
+                    values=interp_deflections[:, index]
+                )
+                for index in range(2)
+            ],
+            axis=1,
+        )
+        diff = time.time() - start
+
+        print_errors(
+            interp_grid=interpolator.interp_grid,
+            deflections=deflections,
+            true_deflections=true_deflections,
+            run_time=diff,
+        )
+
+        # The deflection angles of the mass profile of a grid with the adaptive interpolator, as a phase computes them
+        # (see 'phase_with_adaptive_interpolation'), must be the interpolated deflection angles above.
+
+        grid = masked_imaging.grid.copy()
+        grid.interpolator = interpolator
+
+        assert np.allclose(
+            np.asarray(mass_profile.deflections_from_grid(grid=grid)), deflections
+        )
@@ -0,0 +1,416 @@
+import collections
+import contextlib
+import hashlib
+
+import numpy as np
+import scipy.linalg
+
+from autoarray import exc
+from autoarray.operators.inversion import inversions
+from autoarray.operators.inversion import regularization as reg
+from autoarray.util import inversion_util
+from autoarray.util import regularization_util
+
+from tools import phase_util
+
+# An imaging inversion whose lens model and pixelization are fixed, and which only changes its regularization
+# coefficient between likelihood evaluations, is eigendecomposed once (see *FixedGeometryInversion*). The phase wrapper
+# below detects this case in every likelihood evaluation of a phase (see *FixedGeometryInversionCache*). The run-times
+# of the fixed geometry inversion are profiled in 'profiling/imaging/inversion_voronoi_magnification_fit.py'.
+
+
+class FixedGeometryInversion(object):
+    def __init__(
+        self,
+        data_vector,
+        curvature_matrix,
+        pixel_neighbors,
+        pixel_neighbors_size,
+        image,
+        noise_map,
+        reference_coefficient=1.0,
+        blurred_mapping_matrix=None,
+    ):
+        """An inversion with constant regularization whose mapper, blurred mapping matrix, data vector and curvature
+        matrix are fixed, so that only its regularization coefficient changes (e.g. a hyper phase or a phase fitting
+        only the regularization of a fixed lens model and pixelization).
+
+        The constant regularization matrix is H = coefficient^2 L + 1e-8 I, where L only depends on the pixelization's
+        neighbours (see *al.util.regularization.constant_regularization_matrix_from_pixel_neighbors*). Writing the
+        curvature + regularization matrix at a reference coefficient c_0 as G = F + c_0^2 L + 1e-8 I = R R^T and the
+        eigendecomposition R^-1 L R^-T = Q diag(mu) Q^T, for every coefficient c:
+
+            F + H = R Q (I + (c^2 - c_0^2) diag(mu)) Q^T R^T
+
+        so the reconstruction costs O(N^2) and the log determinants and Bayesian evidence O(N), instead of forming and
+        factorising F + H for every coefficient at a cost of O(N^3).
+
+        Adaptive regularization weights every pixel's neighbours differently for every coefficient, so this does not
+        apply to it.
+
+        Parameters
+        -----------
+        data_vector : ndarray
+            The data vector *D* of the inversion.
+        curvature_matrix : ndarray
+            The curvature matrix *F* of the inversion.
+        pixel_neighbors : ndarray
+            The neighbours of every pixel of the pixelization (see *mapper.pixelization_grid.pixel_neighbors*).
+        pixel_neighbors_size : ndarray
+            The number of neighbours of every pixel of the pixelization.
+        image : ndarray
+            Flattened 1D array of the image fitted by the inversion.
+        noise_map : ndarray
+            Flattened 1D array of the noise-map used by the inversion during the fit.
+        reference_coefficient : float
+            The coefficient c_0 the eigendecomposition is computed at, which keeps G well conditioned.
+        blurred_mapping_matrix : ndarray
+            The blurred mapping matrix the data vector and curvature matrix were computed from, which is stored so
+            that the model image of every reconstruction can be computed.
+        """
+
+        self.data_vector = np.asarray(data_vector)
+        self.curvature_matrix = np.asarray(curvature_matrix)
+        self.blurred_mapping_matrix = blurred_mapping_matrix
+        self.pixels = self.data_vector.shape[0]
+        self.reference_coefficient = reference_coefficient
+
+        # The regularization matrix for a coefficient of 1 without its 1e-8 diagonal, L.
+
+        regularization_matrix = regularization_util.constant_regularization_matrix_from_pixel_neighbors(
+            coefficient=1.0,
+            pixel_neighbors=pixel_neighbors,
+            pixel_neighbors_size=pixel_neighbors_size,
+        )
+
+        self.regularization_matrix_unit = regularization_matrix - 1.0e-8 * np.eye(
+            self.pixels
+        )
+
+        reference_matrix = (
+            np.asarray(curvature_matrix)
+            + reference_coefficient ** 2.0 * self.regularization_matrix_unit
+            + 1.0e-8 * np.eye(self.pixels)
+        )
+
+        try:
+            reference_factor = scipy.linalg.cholesky(reference_matrix, lower=True)
+        except np.linalg.LinAlgError:
+            raise exc.InversionException()
+
+        inverse_factor = scipy.linalg.solve_triangular(
+            reference_factor, np.eye(self.pixels), lower=True
+        )
+
+        self.eigenvalues, eigenvectors = np.linalg.eigh(
+            inverse_factor @ self.regularization_matrix_unit @ inverse_factor.T
+        )
+
+        self.eigenvalues = np.clip(self.eigenvalues, 0.0, None)
+
+        self.log_det_reference = 2.0 * np.sum(np.log(np.diagonal(reference_factor)))
+
+        self.transform = inverse_factor.T @ eigenvectors
+        self.transformed_data_vector = self.transform.T @ self.data_vector
+
+        self.regularization_eigenvalues = np.clip(
+            np.linalg.eigvalsh(self.regularization_matrix_unit), 0.0, None
+        )
+
+        self.weighted_image_term = np.sum(
+            (np.asarray(image) / np.asarray(noise_map)) ** 2.0
+        )
+        self.noise_normalization = np.sum(
+            np.log(2 * np.pi * np.asarray(noise_map) ** 2.0)
+        )
+
+    def scalings_from_coefficient(self, coefficient):
+        return 1.0 + (coefficient ** 2.0 - self.reference_coefficient ** 2.0) * (
+            self.eigenvalues
+        )
+
+    def reconstruction_from_coefficient(self, coefficient):
+        """The reconstruction solve(F + H, D) for a regularization coefficient, at a cost of O(N^2)."""
+        return self.transform @ (
+            self.transformed_data_vector / self.scalings_from_coefficient(coefficient)
+        )
+
+    def log_det_curvature_reg_matrix_term_from_coefficient(self, coefficient):
+        """ln[det(F + H)] for a regularization coefficient, at a cost of O(N)."""
+        return self.log_det_reference + np.sum(
+            np.log(self.scalings_from_coefficient(coefficient))
+        )
+
+    def log_det_regularization_matrix_term_from_coefficient(self, coefficient):
+        """ln[det(H)] for a regularization coefficient, from the eigenvalues of L, at a cost of O(N)."""
+        return np.sum(
+            np.log(coefficient ** 2.0 * self.regularization_eigenvalues + 1.0e-8)
+        )
+
+    def evidence_from_coefficient(self, coefficient):
+        """The Bayesian evidence of the inversion for a regularization coefficient, at a cost of O(N).
+
+        Because (F + H) s = D, the chi-squared plus regularization term of the reconstruction *s* is
+        image^T N^-1 image - s^T D, where s^T D = sum((Q^T R^-1 D)^2 / scalings) needs no reconstruction.
+        """
+
+        chi_squared_and_regularization_term = self.weighted_image_term - np.sum(
+            self.transformed_data_vector ** 2.0
+            / self.scalings_from_coefficient(coefficient)
+        )
+
+        return -0.5 * (
+            chi_squared_and_regularization_term
+            + self.log_det_curvature_reg_matrix_term_from_coefficient(coefficient)
+            - self.log_det_regularization_matrix_term_from_coefficient(coefficient)
+            + self.noise_normalization
+        )
+
+
+def fixed_geometry_key_from_mapper(mapper, convolver, image, noise_map):
+    """A hash of everything the curvature matrix and data vector of an imaging inversion depend on, which are the
+    sub-pixel to source pixel mappings and source-plane pixelization of its mapper, the PSF and mask of its convolver
+    and the image and noise-map it fits."""
+
+    key = hashlib.sha256()
+
+    for array in [
+        mapper.pixelization_1d_index_for_sub_mask_1d_index,
+        mapper.pixelization_grid,
+        convolver.kernel,
+        convolver.mask,
+        image,
+        noise_map,
+    ]:
+        array = np.ascontiguousarray(array)
+        key.update(str((array.shape, array.dtype.str)).encode())
+        key.update(array.tobytes())
+
+    return key.hexdigest()
+
+
+def fixed_geometry_inversion_from_mapper(
+    mapper, convolver, regularization, image, noise_map
+):
+    """Compute the *FixedGeometryInversion* of an imaging inversion with constant regularization, from its mapper,
+    convolver, image and noise-map."""
+
+    if not isinstance(regularization, reg.Constant):
+        raise ValueError(
+            "A fixed geometry inversion requires constant regularization, not {}".format(
+                regularization.__class__.__name__
+            )
+        )
+
+    blurred_mapping_matrix = convolver.convolve_mapping_matrix(
+        mapping_matrix=mapper.mapping_matrix
+    )
+
+    return FixedGeometryInversion(
+        data_vector=inversion_util.data_vector_from_blurred_mapping_matrix_and_data(
+            blurred_mapping_matrix=blurred_mapping_matrix,
+            image=image,
+            noise_map=noise_map,
+        ),
+        curvature_matrix=inversion_util.curvature_matrix_from_blurred_mapping_matrix(
+            blurred_mapping_matrix=blurred_mapping_matrix, noise_map=noise_map
+        ),
+        pixel_neighbors=mapper.pixelization_grid.pixel_neighbors,
+        pixel_neighbors_size=mapper.pixelization_grid.pixel_neighbors_size,
+        image=image,
+        noise_map=noise_map,
+        blurred_mapping_matrix=blurred_mapping_matrix,
+    )
+
+
+class InversionImagingFixedGeometry(inversions.InversionImaging):
+    def __init__(
+        self, image, noise_map, mapper, regularization, fixed_geometry_inversion
+    ):
+        """The imaging inversion of a *FixedGeometryInversion* for the coefficient of its constant regularization,
+        which is the same inversion as *al.inversion* computes, but whose reconstruction costs O(N^2) and whose log
+        determinant terms cost O(N)."""
+
+        coefficient = regularization.coefficient
+
+        regularization_matrix = coefficient ** 2.0 * (
+            fixed_geometry_inversion.regularization_matrix_unit
+        ) + 1.0e-8 * np.eye(fixed_geometry_inversion.pixels)
+
+        super(InversionImagingFixedGeometry, self).__init__(
+            image=image,
+            noise_map=noise_map,
+            mapper=mapper,
+            regularization=regularization,
+            blurred_mapping_matrix=fixed_geometry_inversion.blurred_mapping_matrix,
+            regularization_matrix=regularization_matrix,
+            curvature_reg_matrix=fixed_geometry_inversion.curvature_matrix
+            + regularization_matrix,
+            reconstruction=fixed_geometry_inversion.reconstruction_from_coefficient(
+                coefficient=coefficient
+            ),
+        )
+
+        self.fixed_geometry_inversion = fixed_geometry_inversion
+
+    @property
+    def log_det_curvature_reg_matrix_term(self):
+        return self.fixed_geometry_inversion.log_det_curvature_reg_matrix_term_from_coefficient(
+            coefficient=self.regularization.coefficient
+        )
+
+    @property
+    def log_det_regularization_matrix_term(self):
+        return self.fixed_geometry_inversion.log_det_regularization_matrix_term_from_coefficient(
+            coefficient=self.regularization.coefficient
+        )
+
+
+class FixedGeometryInversionCache(object):
+    def __init__(self, max_size=4, max_keys=1000):
+        """A bounded cache of the *FixedGeometryInversion* of every mapper geometry, convolver and data (see
+        *fixed_geometry_key_from_mapper*) which an imaging inversion with constant regularization is computed for
+        more than once.
+
+        This detects the fixed-geometry case automatically. When the lens model and pixelization are fixed and only
+        the regularization coefficient changes (e.g. hyper phases fitting the inversion of a fixed lens model), every
+        mapper gives the same key and every inversion after the first two is computed in O(N^2). A geometry seen only
+        once costs one hash and the standard inversion, so phases whose geometry changes every likelihood evaluation
+        are not slowed down by eigendecompositions they never reuse.
+
+        Parameters
+        -----------
+        max_size : int
+            The maximum number of fixed geometry inversions stored, after which the least recently used are removed.
+        max_keys : int
+            The maximum number of keys seen once which are remembered.
+        """
+
+        self.max_size = max_size
+        self.max_keys = max_keys
+        self.fixed_geometry_inversions = collections.OrderedDict()
+        self.keys = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def fixed_geometry_inversion_from_mapper(
+        self, mapper, convolver, regularization, image, noise_map
+    ):
+        """The *FixedGeometryInversion* of a mapper, or None if its geometry has not been seen before."""
+
+        key = fixed_geometry_key_from_mapper(
+            mapper=mapper, convolver=convolver, image=image, noise_map=noise_map
+        )
+
+        if key in self.fixed_geometry_inversions:
+            self.hits += 1
+            self.fixed_geometry_inversions.move_to_end(key)
+            return self.fixed_geometry_inversions[key]
+
+        self.misses += 1
+
+        if key not in self.keys:
+
+            self.keys[key] = True
+
+            if len(self.keys) > self.max_keys:
+                self.keys.popitem(last=False)
+
+            return None
+
+        del self.keys[key]
+
+        self.fixed_geometry_inversions[key] = fixed_geometry_inversion_from_mapper(
+            mapper=mapper,
+            convolver=convolver,
+            regularization=regularization,
+            image=image,
+            noise_map=noise_map,
+        )
+
+        if len(self.fixed_geometry_inversions) > self.max_size:
+            self.fixed_geometry_inversions.popitem(last=False)
+
+        return self.fixed_geometry_inversions[key]
+
+
+@contextlib.contextmanager
+def fixed_geometry_inversion_context(cache):
+    """Within this context, every imaging inversion with constant regularization whose geometry is in the given
+    *FixedGeometryInversionCache* is an *InversionImagingFixedGeometry*. All other inversions are unchanged."""
+
+    from_data_mapper_and_regularization = inversions.InversionImaging.__dict__[
+        "from_data_mapper_and_regularization"
+    ]
+
+    def fixed_geometry_from_data_mapper_and_regularization(
+        cls, image, noise_map, convolver, mapper, regularization
+    ):
+
+        if isinstance(regularization, reg.Constant):
+
+            fixed_geometry_inversion = cache.fixed_geometry_inversion_from_mapper(
+                mapper=mapper,
+                convolver=convolver,
+                regularization=regularization,
+                image=image,
+                noise_map=noise_map,
+            )
+
+            if fixed_geometry_inversion is not None:
+                return InversionImagingFixedGeometry(
+                    image=image,
+                    noise_map=noise_map,
+                    mapper=mapper,
+                    regularization=regularization,
+                    fixed_geometry_inversion=fixed_geometry_inversion,
+                )
+
+        return from_data_mapper_and_regularization.__func__(
+            cls,
+            image=image,
+            noise_map=noise_map,
+            convolver=convolver,
+            mapper=mapper,
+            regularization=regularization,
+        )
+
+    inversions.InversionImaging.from_data_mapper_and_regularization = classmethod(
+        fixed_geometry_from_data_mapper_and_regularization
+    )
+
+    try:
+        yield cache
+    finally:
+        inversions.InversionImaging.from_data_mapper_and_regularization = (
+            from_data_mapper_and_regularization
+        )
+
+
+def phase_with_fixed_geometry_inversion(phase, max_size=4):
+    """Make every likelihood evaluation of an imaging phase with constant regularization compute its inversion via a
+    *FixedGeometryInversionCache*, so that inversions whose lens model and pixelization are fixed and only their
+    regularization coefficient changes are computed in O(N^2).
+
+    The hyper phases of the phase (e.g. its 'inversion' hyper phase, which fixes the lens model) use the cache too. For
+    a phase extended with hyper phases, the extended phase is returned.
+    """
+
+    def analysis_with_fixed_geometry_inversion(analysis):
+
+        cache = FixedGeometryInversionCache(max_size=max_size)
+
+        fit = analysis.fit
+
+        def fit_with_fixed_geometry_inversion(instance):
+            with fixed_geometry_inversion_context(cache=cache):
+                return fit(instance)
+
+        analysis.fit = fit_with_fixed_geometry_inversion
+        analysis.fixed_geometry_inversion_cache = cache
+
+        return analysis
+
+    return phase_util.phase_with_analysis_wrapper(
+        phase=phase, analysis_wrapper=analysis_with_fixed_geometry_inversion
+    )
@@ -0,0 +1,69 @@
+import functools
+import types
+
+
+def extended_phase_from_phase(phase):
+    """The phase that a phase extended with hyper phases (e.g. via *extend_with_multiple_hyper_phases*) extends, or the
+    phase itself if it is not extended."""
+
+    return getattr(phase, "phase", phase)
+
+
+def phase_with_method_wrapper(phase, method_name, method_wrapper):
+    """Replace a method of a phase (e.g. 'make_analysis' or 'run_analysis') with *method_wrapper(method)*, where
+    *method* is the original method bound to the phase being run (which is *method.__self__*).
+
+    For a phase extended with hyper phases, the method of the phase it extends is replaced, as that is the phase whose
+    analysis fits the lens model. The method is replaced on a subclass of the phase's class, so the copies of the phase
+    which its hyper phases run (e.g. the 'inversion' hyper phase, see *HyperPhase.make_hyper_phase*) are also wrapped
+    and call the method of the copy, not of the original phase.
+
+    The phase that is passed in is always returned, so that a pipeline can reassign its phases to the returned phases
+    without removing their hyper phases.
+
+    Parameters
+    ----------
+    phase : af.Phase
+        The phase, which may be extended with hyper phases.
+    method_name : str
+        The name of the method of the phase which is replaced.
+    method_wrapper : func
+        A function which is passed the bound method and returns the function that replaces it.
+    """
+
+    extended_phase = extended_phase_from_phase(phase=phase)
+
+    phase_class = extended_phase.__class__
+
+    method = getattr(phase_class, method_name)
+
+    @functools.wraps(method)
+    def wrapped_method(self, *args, **kwargs):
+        return method_wrapper(types.MethodType(method, self))(*args, **kwargs)
+
+    extended_phase.__class__ = type(
+        phase_class.__name__,
+        (phase_class,),
+        {
+            method_name: wrapped_method,
+            "__module__": phase_class.__module__,
+            "__qualname__": phase_class.__qualname__,
+        },
+    )
+
+    return phase
+
+
+def phase_with_analysis_wrapper(phase, analysis_wrapper):
+    """Apply *analysis_wrapper(analysis)* to every analysis that a phase creates when it is run, e.g. to wrap the
+    analysis's *fit* or *visualize* methods, using the analysis it returns (see *phase_with_method_wrapper*)."""
+
+    def make_analysis_wrapper(make_analysis):
+        def make_wrapped_analysis(*args, **kwargs):
+            return analysis_wrapper(make_analysis(*args, **kwargs))
+
+        return make_wrapped_analysis
+
+    return phase_with_method_wrapper(
+        phase=phase, method_name="make_analysis", method_wrapper=make_analysis_wrapper
+    )
@@ -0,0 +1,850 @@
+import collections
+import contextlib
+import functools
+import hashlib
+import inspect
+import json
+import os
+import weakref
+
+import numpy as np
+
+import autoconf.named
+import autofit as af
+import autolens as al
+
+from tools import phase_util
+
+
+def value_key_from_value(value):
+    """A hashable key of a value stored by a mass profile, or None if its type is not one whose state can be read.
+
+    Arrays are keyed on their dtype, shape and a hash of their bytes, tuples, lists and dicts on the keys of their
+    entries, and numbers and strings on their type and repr. Subclasses with attributes (e.g. the *dim.Position* of a
+    profile's centre or the *dim.Length* of its Einstein radius, which have units) are keyed on their attributes as
+    well, so the same value in different units has a different key.
+    """
+
+    if value is None or isinstance(value, (bool, str)):
+        return (type(value).__name__, repr(value))
+
+    if isinstance(value, np.ndarray):
+
+        array = np.ascontiguousarray(value)
+
+        return (
+            "ndarray",
+            array.dtype.str,
+            array.shape,
+            hashlib.sha1(array.view("uint8")).hexdigest(),
+        )
+
+    if isinstance(value, dict):
+        keys = tuple(
+            (repr(name), value_key_from_value(value=entry))
+            for name, entry in sorted(value.items(), key=lambda item: repr(item[0]))
+        )
+        return None if any(key is None for name, key in keys) else ("dict", keys)
+
+    if isinstance(value, (tuple, list)):
+        keys = tuple(value_key_from_value(value=entry) for entry in value)
+        value_key = None if None in keys else keys
+    elif isinstance(value, (int, float, complex, np.number)):
+        value_key = repr(value)
+    else:
+        return None
+
+    attributes = getattr(value, "__dict__", None)
+
+    attributes_key = value_key_from_value(value=attributes) if attributes else ()
+
+    if value_key is None or attributes_key is None:
+        return None
+
+    return (type(value).__name__, value_key, attributes_key)
+
+
+def mass_profile_key_from_mass_profile(mass_profile):
+    """A hashable key of a mass profile's class and all of the attributes it stores (e.g. its centre, axis-ratio, phi
+    and Einstein radius, and any values derived from them when it is constructed), or None if one of its attributes
+    is not a type whose state can be read (see *value_key_from_value*), in which case it is not cached."""
+
+    attributes_key = value_key_from_value(value=vars(mass_profile))
+
+    if attributes_key is None:
+        return None
+
+    return (
+        mass_profile.__class__.__module__,
+        mass_profile.__class__.__qualname__,
+        attributes_key,
+    )
+
+
+def planes_key_from_tracer(tracer):
+    """A hashable key of everything the traced grids of a tracer depend on, which is its cosmology, the redshift of
+    every plane and the mass profiles of the galaxies in every plane. Light profiles, pixelizations and hyper galaxies
+    do not change the traced grids, so tracers differing only in them share a key. If a mass profile has no key (see
+    *mass_profile_key_from_mass_profile*), the tracer has no key and is not cached."""
+
+    mass_profile_keys = [
+        [
+            mass_profile_key_from_mass_profile(mass_profile=mass_profile)
+            for galaxy in plane.galaxies
+            for mass_profile in galaxy.mass_profiles
+        ]
+        for plane in tracer.planes
+    ]
+
+    if any(None in plane_keys for plane_keys in mass_profile_keys):
+        return None
+
+    return (
+        repr(tracer.cosmology),
+        tuple(
+            (plane.redshift, tuple(plane_keys))
+            for plane, plane_keys in zip(tracer.planes, mass_profile_keys)
+        ),
+    )
+
+
+class TracedGridCache(object):
+    def __init__(self, max_size=8):
+        """A bounded least-recently-used cache of the traced grids of the planes of a tracer, keyed on a hash of the
+        mass profiles and redshifts of its planes and of the grid they are traced from.
+
+        In a phase whose lens mass is fixed to the result of a previous phase (e.g. phases fitting only a source
+        inversion or hyper parameters), every likelihood evaluation traces the same grids, so after the first
+        evaluation the ray-tracing is skipped entirely. The hits and misses of the cache are counted.
+
+        Parameters
+        -----------
+        max_size : int
+            The maximum number of traced grids of planes stored, after which the least recently used are removed.
+        """
+
+        self.max_size = max_size
+        self.traced_grids = collections.OrderedDict()
+        self.grid_digests = {}
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    def grid_digest_from_grid(self, grid):
+        """A hash of a grid's coordinates, which is computed once for every grid object (e.g. the grid and blurring
+        grid of a masked dataset) that is still alive."""
+
+        grid_id = id(grid)
+
+        if grid_id in self.grid_digests:
+
+            grid_ref, digest = self.grid_digests[grid_id]
+
+            if grid_ref() is grid:
+                return digest
+
+        grid_array = np.ascontiguousarray(grid)
+
+        digest = hashlib.sha1(grid_array.view("uint8")).hexdigest() + str(
+            (grid_array.shape, id(getattr(grid, "interpolator", None)))
+        )
+
+        try:
+            self.grid_digests[grid_id] = (weakref.ref(grid), digest)
+        except TypeError:
+            pass
+
+        return digest
+
+    def key_from_tracer_and_grid(self, tracer, grid):
+
+        planes_key = planes_key_from_tracer(tracer=tracer)
+
+        if planes_key is None:
+            return None
+
+        return hashlib.sha1(
+            repr(
+                (
+                    planes_key,
+                    self.grid_digest_from_grid(grid=grid),
+                )
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def traced_grids_of_planes_from_tracer_and_grid(
+        self, tracer, grid, traced_grids_of_planes_from_grid, plane_index_limit=None
+    ):
+        """The traced grids of the planes of a tracer, from the cache if the same mass profiles, redshifts and grid
+        were traced before and otherwise by calling *traced_grids_of_planes_from_grid*. Tracers without a key are
+        traced every time and counted as uncached.
+
+        The traced grids of every plane are cached, and those up to *plane_index_limit* are returned, so that the
+        traces of a fit's profile images and blurring images (which stop at the last plane with a light profile) and of
+        its mappers share the same entry.
+        """
+
+        key = self.key_from_tracer_and_grid(tracer=tracer, grid=grid)
+
+        if key is None:
+            self.uncached += 1
+            return traced_grids_of_planes_from_grid(
+                tracer, grid, plane_index_limit=plane_index_limit
+            )
+
+        if key in self.traced_grids:
+            self.hits += 1
+            self.traced_grids.move_to_end(key)
+            traced_grids = self.traced_grids[key]
+        else:
+            self.misses += 1
+
+            traced_grids = traced_grids_of_planes_from_grid(tracer, grid)
+
+            self.traced_grids[key] = traced_grids
+
+            if len(self.traced_grids) > self.max_size:
+                self.traced_grids.popitem(last=False)
+
+        if plane_index_limit is None:
+            return list(traced_grids)
+
+        return traced_grids[: plane_index_limit + 1]
+
+    @property
+    def dict(self):
+        calls = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncached": self.uncached,
+            "hit_rate": self.hits / calls if calls > 0 else 0.0,
+            "size": len(self.traced_grids),
+            "max_size": self.max_size,
+        }
+
+    def output_to_json(self, file_path):
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        with open(file_path, "w") as f:
+            json.dump(self.dict, f, indent=4)
+
+
+@contextlib.contextmanager
+def traced_grid_cache_context(cache):
+    """Within this context, every tracer's traced grids of planes are looked up in and stored to the given
+    *TracedGridCache*."""
+
+    traced_grids_of_planes_from_grid = al.Tracer.traced_grids_of_planes_from_grid
+
+    @functools.wraps(traced_grids_of_planes_from_grid)
+    def cached_traced_grids_of_planes_from_grid(tracer, grid, plane_index_limit=None):
+
+        return cache.traced_grids_of_planes_from_tracer_and_grid(
+            tracer=tracer,
+            grid=grid,
+            traced_grids_of_planes_from_grid=traced_grids_of_planes_from_grid,
+            plane_index_limit=plane_index_limit,
+        )
+
+    al.Tracer.traced_grids_of_planes_from_grid = (
+        cached_traced_grids_of_planes_from_grid
+    )
+
+    try:
+        yield cache
+    finally:
+        al.Tracer.traced_grids_of_planes_from_grid = traced_grids_of_planes_from_grid
+
+
+def phase_with_traced_grid_cache(
+    phase, max_size=8, file_name="traced_grid_cache.json"
+):
+    """Make every likelihood evaluation of a phase look up its traced grids in a *TracedGridCache*, which skips the
+    ray-tracing of phases whose lens mass is fixed to the result of a previous phase.
+
+    The hits and misses of the cache are output to a .json file in the phase's output folder whenever the phase is
+    visualized. For a phase extended with hyper phases, the phase it extends and the copies of it run by its hyper
+    phases use the cache, and the extended phase is returned.
+    """
+
+    def make_analysis_wrapper(make_analysis):
+        def make_analysis_with_traced_grid_cache(*args, **kwargs):
+
+            analysis = make_analysis(*args, **kwargs)
+
+            cache = TracedGridCache(max_size=max_size)
+
+            fit = analysis.fit
+            visualize = analysis.visualize
+
+            def fit_with_traced_grid_cache(instance):
+                with traced_grid_cache_context(cache=cache):
+                    return fit(instance)
+
+            def visualize_with_traced_grid_cache(
+                instance, *visualize_args, **visualize_kwargs
+            ):
+
+                cache.output_to_json(
+                    file_path=os.path.join(
+                        make_analysis.__self__.paths.phase_output_path, file_name
+                    )
+                )
+
+                with traced_grid_cache_context(cache=cache):
+                    return visualize(instance, *visualize_args, **visualize_kwargs)
+
+            analysis.fit = fit_with_traced_grid_cache
+            analysis.visualize = visualize_with_traced_grid_cache
+            analysis.traced_grid_cache = cache
+
+            return analysis
+
+        return make_analysis_with_traced_grid_cache
+
+    return phase_util.phase_with_method_wrapper(
+        phase=phase, method_name="make_analysis", method_wrapper=make_analysis_wrapper
+    )
+
+
+def parameter_names_from_mass_profile_class(mass_profile_class):
+    """The names of the parameters a mass profile class is constructed from, with tuple parameters such as the centre
+    expanded into one parameter per entry (e.g. centre_0, centre_1), as they are named by a model."""
+
+    parameter_names = []
+
+    for name, parameter in inspect.signature(
+        mass_profile_class.__init__
+    ).parameters.items():
+
+        if name == "self":
+            continue
+
+        if isinstance(parameter.default, tuple):
+            parameter_names += [
+                "{}_{}".format(name, index) for index in range(len(parameter.default))
+            ]
+        else:
+            parameter_names.append(name)
+
+    return parameter_names
+
+
+def values_from_mass_profile_and_names(mass_profile, names):
+    """The values of a mass profile's parameters, for the expanded names of *parameter_names_from_mass_profile_class*."""
+
+    values = []
+
+    for name in names:
+
+        if hasattr(mass_profile, name):
+            values.append(getattr(mass_profile, name))
+        else:
+            base_name, _, index = name.rpartition("_")
+            values.append(getattr(mass_profile, base_name)[int(index)])
+
+    return values
+
+
+def kwargs_from_names_and_values(names, values):
+    """The constructor arguments of a mass profile from its expanded parameter names and values, collecting tuple
+    parameters such as centre_0 and centre_1 back into a tuple."""
+
+    kwargs = {}
+
+    for name, value in zip(names, values):
+
+        base_name, _, index = name.rpartition("_")
+
+        if base_name and index.isdigit():
+            kwargs[base_name] = kwargs.get(base_name, ()) + (value,)
+        else:
+            kwargs[name] = value
+
+    return kwargs
+
+
+def radial_minimum_from_mass_profile_class(mass_profile_class):
+    """The radial minimum of a mass profile class in the 'radial_minimum.ini' config, which every coordinate closer
+    to the centre of one of its profiles is moved out to (see *move_grid_to_radial_minimum* of autoastro)."""
+
+    radial_minimum_config = autoconf.named.NamedConfig(
+        "{}/radial_minimum.ini".format(af.conf.instance.config_path)
+    )
+
+    return radial_minimum_config.get(
+        "radial_minimum", mass_profile_class.__name__, float
+    )
+
+
+def grids_moved_to_radial_minimum(y, x, radial_minimum):
+    """Move the (K, N) coordinates of transformed grids which are within *radial_minimum* of their profile's centre
+    out to that radius, as *move_grid_to_radial_minimum* of autoastro does, so that the deflection angles of a profile
+    are finite at its centre. Coordinates at the centre itself are moved to (radial_minimum, radial_minimum)."""
+
+    with np.errstate(all="ignore"):
+        radii = np.sqrt(y ** 2 + x ** 2)
+        radial_scale = np.where(radii < radial_minimum, radial_minimum / radii, 1.0)
+        y = y * radial_scale
+        x = x * radial_scale
+
+    y[np.isnan(y)] = radial_minimum
+    x[np.isnan(x)] = radial_minimum
+
+    return y, x
+
+
+def transformed_grids_from_grid_centres_and_phis(
+    grid, centre_0, centre_1, phi=None, radial_minimum=None
+):
+    """Shift an (N, 2) grid to K centres and, if phis are input, rotate it to the K reference frames of elliptical
+    profiles with those position angles (in degrees counter-clockwise from the positive x-axis), returning the (K, N)
+    y and x coordinates of every transformed grid. If a radial minimum is input, the coordinates are moved to it (see
+    *grids_moved_to_radial_minimum*)."""
+
+    y = grid[None, :, 0] - centre_0[:, None]
+    x = grid[None, :, 1] - centre_1[:, None]
+
+    if phi is not None:
+
+        cos_phi = np.cos(np.radians(phi))[:, None]
+        sin_phi = np.sin(np.radians(phi))[:, None]
+
+        y, x = y * cos_phi - x * sin_phi, x * cos_phi + y * sin_phi
+
+    if radial_minimum is not None:
+        y, x = grids_moved_to_radial_minimum(y=y, x=x, radial_minimum=radial_minimum)
+
+    return y, x
+
+
+def deflections_rotated_from_profiles(deflections_y, deflections_x, phi):
+    """Rotate the (K, N) deflection angles computed in the reference frames of K elliptical profiles back to the
+    frame of the grid."""
+
+    cos_phi = np.cos(np.radians(phi))[:, None]
+    sin_phi = np.sin(np.radians(phi))[:, None]
+
+    return (
+        deflections_x * sin_phi + deflections_y * cos_phi,
+        deflections_x * cos_phi - deflections_y * sin_phi,
+    )
+
+
+def batch_deflections_of_spherical_isothermal(
+    grid, centre_0, centre_1, einstein_radius, radial_minimum
+):
+
+    y, x = transformed_grids_from_grid_centres_and_phis(
+        grid=grid, centre_0=centre_0, centre_1=centre_1, radial_minimum=radial_minimum
+    )
+
+    factor = einstein_radius[:, None] / np.sqrt(y ** 2 + x ** 2)
+
+    return factor * y, factor * x
+
+
+def batch_deflections_of_elliptical_isothermal(
+    grid, centre_0, centre_1, axis_ratio, phi, einstein_radius, radial_minimum
+):
+
+    y, x = transformed_grids_from_grid_centres_and_phis(
+        grid=grid,
+        centre_0=centre_0,
+        centre_1=centre_1,
+        phi=phi,
+        radial_minimum=radial_minimum,
+    )
+
+    axis_ratio = axis_ratio[:, None]
+    einstein_radius_rescaled = einstein_radius[:, None] / (1.0 + axis_ratio)
+
+    root = np.sqrt(1.0 - axis_ratio ** 2)
+    factor = 2.0 * einstein_radius_rescaled * axis_ratio / root
+
+    psi = np.sqrt(axis_ratio ** 2 * x ** 2 + y ** 2)
+
+    return deflections_rotated_from_profiles(
+        deflections_y=factor * np.arctanh(root * y / psi),
+        deflections_x=factor * np.arctan(root * x / psi),
+        phi=phi,
+    )
+
+
+def batch_deflections_of_external_shear(grid, magnitude, phi, radial_minimum):
+
+    zeros = np.zeros(magnitude.shape)
+
+    y, x = transformed_grids_from_grid_centres_and_phis(
+        grid=grid,
+        centre_0=zeros,
+        centre_1=zeros,
+        phi=phi,
+        radial_minimum=radial_minimum,
+    )
+
+    return deflections_rotated_from_profiles(
+        deflections_y=-magnitude[:, None] * y,
+        deflections_x=magnitude[:, None] * x,
+        phi=phi,
+    )
+
+
+batch_deflection_functions = {
+    "SphericalIsothermal": batch_deflections_of_spherical_isothermal,
+    "EllipticalIsothermal": batch_deflections_of_elliptical_isothermal,
+    "ExternalShear": batch_deflections_of_external_shear,
+}
+
+
+class BatchTracer(object):
+    def __init__(self, mass_profile_classes, grid):
+        """Trace a grid from a lens plane to the source plane for K mass models at once, where every mass model has
+        the same mass profile classes (e.g. an EllipticalIsothermal and ExternalShear) and differs only in their
+        parameters.
+
+        The parameters of the K mass models are input as a (K, total_parameters) array, whose columns are the
+        parameters of every mass profile in turn, ordered as *parameter_names*. The deflection angles of the
+        isothermal profiles and external shear are computed for all K models by vectorized NumPy kernels, which share
+        the grid and its memory traffic between the models, rather than by K tracers each making its own calls. Like
+        the mass profiles, they move coordinates within the radial minimum of their class in 'radial_minimum.ini' out
+        to it, so their deflection angles are finite at the centre of every profile. Other mass profile classes are
+        computed one model at a time.
+
+        All mass profiles are in one lens plane, so the traced grids are the grid minus the summed deflection angles
+        and do not depend on the redshifts of the lens and source.
+
+        Parameters
+        -----------
+        mass_profile_classes : [type]
+            The classes of the mass profiles of every mass model (e.g. [al.mp.EllipticalIsothermal,
+            al.mp.ExternalShear]).
+        grid : ndarray
+            The (N, 2) image-plane (y,x) coordinates that are traced.
+        """
+
+        self.mass_profile_classes = mass_profile_classes
+        self.grid = grid
+
+        self.parameter_names_of_profiles = [
+            parameter_names_from_mass_profile_class(
+                mass_profile_class=mass_profile_class
+            )
+            for mass_profile_class in mass_profile_classes
+        ]
+
+    @property
+    def parameter_names(self):
+        return [
+            "{}.{}".format(mass_profile_class.__name__, name)
+            for mass_profile_class, names in zip(
+                self.mass_profile_classes, self.parameter_names_of_profiles
+            )
+            for name in names
+        ]
+
+    @property
+    def total_parameters(self):
+        return len(self.parameter_names)
+
+    def parameters_from_mass_profiles(self, mass_profiles_of_models):
+        """The (K, total_parameters) parameter array of K mass models, each input as a list of mass profiles of the
+        tracer's mass profile classes (e.g. the mass profiles of K model instances)."""
+
+        return np.asarray(
+            [
+                [
+                    value
+                    for mass_profile, names in zip(
+                        mass_profiles, self.parameter_names_of_profiles
+                    )
+                    for value in values_from_mass_profile_and_names(
+                        mass_profile=mass_profile, names=names
+                    )
+                ]
+                for mass_profiles in mass_profiles_of_models
+            ],
+            dtype="float64",
+        )
+
+    def deflections_from_parameters(self, parameters):
+        """The (K, N, 2) summed deflection angles of the K mass models of a (K, total_parameters) parameter array."""
+
+        parameters = np.atleast_2d(np.asarray(parameters, dtype="float64"))
+
+        if parameters.shape[1] != self.total_parameters:
+            raise ValueError(
+                "The parameters of the batch tracer must have {} columns ({}), not {}".format(
+                    self.total_parameters, self.parameter_names, parameters.shape[1]
+                )
+            )
+
+        grid = np.asarray(self.grid)
+
+        deflections = np.zeros((parameters.shape[0], grid.shape[0], 2))
+
+        column = 0
+
+        for mass_profile_class, names in zip(
+            self.mass_profile_classes, self.parameter_names_of_profiles
+        ):
+
+            profile_parameters = parameters[:, column : column + len(names)]
+            column += len(names)
+
+            batch_deflections = batch_deflection_functions.get(
+                mass_profile_class.__name__
+            )
+
+            if batch_deflections is not None:
+
+                deflections_y, deflections_x = batch_deflections(
+                    grid=grid,
+                    radial_minimum=radial_minimum_from_mass_profile_class(
+                        mass_profile_class=mass_profile_class
+                    ),
+                    **dict(zip(names, profile_parameters.T))
+                )
+
+                deflections[:, :, 0] += deflections_y
+                deflections[:, :, 1] += deflections_x
+
+            else:
+
+                for index, values in enumerate(profile_parameters):
+
+                    mass_profile = mass_profile_class(
+                        **kwargs_from_names_and_values(names=names, values=values)
+                    )
+
+                    deflections[index] += np.asarray(
+                        mass_profile.deflections_from_grid(grid=self.grid)
+                    )
+
+        return deflections
+
+    def traced_grids_from_parameters(self, parameters):
+        """The (K, N, 2) source-plane grids traced by the K mass models of a (K, total_parameters) parameter array."""
+
+        return np.asarray(self.grid)[None, :, :] - self.deflections_from_parameters(
+            parameters=parameters
+        )
+
+
+# The scaling factors of multi-plane ray-tracing, the ratios of angular diameter distances by which the deflection
+# angles of one plane are scaled to trace a grid to a later plane, of every set of plane redshifts and cosmology.
+
+scaling_factors_of_plane_redshifts = {}
+
+
+def scaling_factors_from_plane_redshifts_and_cosmology(plane_redshifts, cosmology):
+    """The (P, P) array of the scaling factors by which the deflection angles of plane i are scaled to trace a grid to
+    plane j > i, for P plane redshifts.
+
+    They depend only on the plane redshifts and cosmology, so they are computed once for every set of plane redshifts
+    and cached, whereas a tracer recomputes all P(P-1)/2 of them, each from four angular diameter distances, every time
+    it traces a grid.
+    """
+
+    key = (repr(cosmology), tuple(plane_redshifts))
+
+    if key not in scaling_factors_of_plane_redshifts:
+
+        total_planes = len(plane_redshifts)
+
+        scaling_factors = np.zeros((total_planes, total_planes))
+
+        for plane_index in range(1, total_planes):
+            for previous_plane_index in range(plane_index):
+                scaling_factors[
+                    previous_plane_index, plane_index
+                ] = al.util.cosmology.scaling_factor_between_redshifts_from_redshifts_and_cosmology(
+                    redshift_0=plane_redshifts[previous_plane_index],
+                    redshift_1=plane_redshifts[plane_index],
+                    redshift_final=plane_redshifts[-1],
+                    cosmology=cosmology,
+                )
+
+        scaling_factors_of_plane_redshifts[key] = scaling_factors
+
+    return scaling_factors_of_plane_redshifts[key]
+
+
+class MultiPlaneTracer(object):
+    def __init__(self):
+        """Trace grids through the planes of a tracer with many planes, e.g. a lens and a dozen line-of-sight galaxies
+        at different redshifts (see 'simulators/imaging/lens_multi_plane.py').
+
+        This gives the same traced grids as *al.Tracer.traced_grids_of_planes_from_grid*, but:
+
+        - The scaling factors between planes are cached for every set of plane redshifts (see
+          *scaling_factors_from_plane_redshifts_and_cosmology*).
+        - The grids of every plane are traced in place, into buffers allocated once for every grid (e.g. the grid and
+          blurring grid of a masked dataset), rather than copying the grid for every plane.
+        - Planes whose galaxies have no mass profile are skipped when tracing later planes, as are the deflection
+          angles of the final plane, which no plane is traced with.
+
+        The traced grids returned are the buffers, so they are overwritten when the same grid is next traced.
+        """
+
+        self.buffers = {}
+
+    def buffers_from_grid_and_total_planes(self, grid, total_planes):
+        """The traced grid buffers of a grid, which are copies of it and therefore share its mask and interpolator, and
+        a buffer for the scaled deflection angles of a plane."""
+
+        grid_id = id(grid)
+
+        if grid_id in self.buffers:
+
+            grid_ref, traced_grids, scaled_deflections = self.buffers[grid_id]
+
+            if (
+                grid_ref() is grid
+                and len(traced_grids) >= total_planes
+                and getattr(traced_grids[0], "interpolator", None)
+                is getattr(grid, "interpolator", None)
+            ):
+                return traced_grids, scaled_deflections
+
+        traced_grids = [grid.copy() for plane_index in range(total_planes)]
+        scaled_deflections = np.zeros(grid.shape)
+
+        self.buffers[grid_id] = (
+            weakref.ref(grid, lambda grid_ref: self.buffers.pop(grid_id, None)),
+            traced_grids,
+            scaled_deflections,
+        )
+
+        return traced_grids, scaled_deflections
+
+    def traced_grids_of_planes_from_tracer_and_grid(
+        self, tracer, grid, plane_index_limit=None
+    ):
+        """The traced grids of every plane of a tracer, or of every plane up to and including *plane_index_limit*."""
+
+        planes = tracer.planes
+
+        scaling_factors = scaling_factors_from_plane_redshifts_and_cosmology(
+            plane_redshifts=tracer.plane_redshifts, cosmology=tracer.cosmology
+        )
+
+        traced_grids, scaled_deflections = self.buffers_from_grid_and_total_planes(
+            grid=grid, total_planes=len(planes)
+        )
+
+        if plane_index_limit is None or not 0 <= plane_index_limit < len(planes):
+            plane_index_limit = len(planes) - 1
+
+        deflections_of_planes = {}
+
+        for plane_index in range(plane_index_limit + 1):
+
+            traced_grid = traced_grids[plane_index]
+
+            np.copyto(traced_grid, grid)
+
+            for previous_plane_index, deflections in deflections_of_planes.items():
+
+                np.multiply(
+                    deflections,
+                    scaling_factors[previous_plane_index, plane_index],
+                    out=scaled_deflections,
+                )
+                np.subtract(traced_grid, scaled_deflections, out=traced_grid)
+
+            if plane_index < plane_index_limit and planes[plane_index].has_mass_profile:
+                deflections_of_planes[plane_index] = planes[
+                    plane_index
+                ].deflections_from_grid(grid=traced_grid)
+
+        return traced_grids[: plane_index_limit + 1]
+
+
+def grid_uses_multi_plane_tracer(grid):
+    """Whether a grid is traced via a *MultiPlaneTracer*, which computes the deflection angles of every coordinate of a
+    regular *Grid* (or a subclass of it) directly.
+
+    Irregular grids (*GridIrregular* and *GridVoronoi*, e.g. the positions of a masked dataset), rectangular grids
+    (*GridRectangular*, whose coordinates are a pixelization's, not a dataset's) and grids with an interpolator (whose
+    deflection angles the tracer interpolates) are not.
+    """
+
+    return (
+        isinstance(grid, al.grid)
+        and not isinstance(grid, (al.grid_irregular, al.grid_rectangular))
+        and getattr(grid, "interpolator", None) is None
+    )
+
+
+@contextlib.contextmanager
+def multi_plane_tracer_context(multi_plane_tracer):
+    """Within this context, every tracer traces its grids via the given *MultiPlaneTracer*.
+
+    Grids which do not use the multi-plane tracer (see *grid_uses_multi_plane_tracer*) are traced by the tracer as
+    before, and the traced grids of planes with a pixelization, which their mappers keep, are copied. It should not be
+    used with a *TracedGridCache*, which would store buffers that are later overwritten.
+    """
+
+    traced_grids_of_planes_from_grid = al.Tracer.traced_grids_of_planes_from_grid
+
+    @functools.wraps(traced_grids_of_planes_from_grid)
+    def multi_plane_traced_grids_of_planes_from_grid(
+        tracer, grid, plane_index_limit=None
+    ):
+
+        if not grid_uses_multi_plane_tracer(grid=grid):
+            return traced_grids_of_planes_from_grid(
+                tracer, grid, plane_index_limit=plane_index_limit
+            )
+
+        traced_grids = multi_plane_tracer.traced_grids_of_planes_from_tracer_and_grid(
+            tracer=tracer, grid=grid, plane_index_limit=plane_index_limit
+        )
+
+        return [
+            traced_grid.copy() if plane.has_pixelization else traced_grid
+            for plane, traced_grid in zip(tracer.planes, traced_grids)
+        ]
+
+    al.Tracer.traced_grids_of_planes_from_grid = (
+        multi_plane_traced_grids_of_planes_from_grid
+    )
+
+    try:
+        yield multi_plane_tracer
+    finally:
+        al.Tracer.traced_grids_of_planes_from_grid = traced_grids_of_planes_from_grid
+
+
+def phase_with_multi_plane_tracer(phase):
+    """Make every likelihood evaluation of a phase trace its grids via a *MultiPlaneTracer*, for phases modeling many
+    line-of-sight galaxies at fixed redshifts.
+
+    Each analysis the phase creates has its own multi-plane tracer, which is its *multi_plane_tracer* attribute.
+    Visualization, which keeps the traced grids of its fits, is unchanged. For a phase extended with hyper phases, the
+    phase it extends and the copies of it which its hyper phases run use the multi-plane tracer, and the phase passed in
+    is returned (see *phase_util.phase_with_method_wrapper*).
+    """
+
+    def analysis_with_multi_plane_tracer(analysis):
+
+        multi_plane_tracer = MultiPlaneTracer()
+
+        fit = analysis.fit
+
+        def fit_with_multi_plane_tracer(instance):
+            with multi_plane_tracer_context(multi_plane_tracer=multi_plane_tracer):
+                return fit(instance)
+
+        analysis.fit = fit_with_multi_plane_tracer
+        analysis.multi_plane_tracer = multi_plane_tracer
+
+        return analysis
+
+    return phase_util.phase_with_analysis_wrapper(
+        phase=phase, analysis_wrapper=analysis_with_multi_plane_tracer
+    )